@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VideoForge 性能基准测试
+
+使用 ffmpeg 的 lavfi testsrc2 生成合成视频（无需网络和样本文件），测量：
+- 目录扫描（iter_video_files 与旧的逐扩展名 rglob 对比）
+- get_video_info（冷启动 / 探测缓存命中）及不同并发度下的 probe_many
+- should_skip_video / decide_action 决策
+- transcode_directory 端到端吞吐（不同并发任务数）
+
+结果写入 JSON，可通过 --compare 与之前的结果对比，发现性能回退。
+
+用法:
+    python3 tests/benchmark.py --output bench.json
+    python3 tests/benchmark.py --quick --compare bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from videoforge import VideoForge, iter_video_files  # noqa: E402
+
+
+def generate_clip(path: Path, duration: float = 2, size: str = '640x360'):
+    """用 lavfi testsrc2 + sine 生成一个带音频的 H.264 测试视频"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=1000:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '4M',
+        '-c:a', 'aac', '-shortest',
+        '-y', str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def build_media_corpus(root: Path, count: int) -> list:
+    """生成 count 个测试视频（分布在多个子目录中），已存在的文件直接复用"""
+    template = root / 'template.mp4'
+    if not template.exists():
+        generate_clip(template)
+    files = []
+    for i in range(count):
+        path = root / f'media_{count}' / f'dir{i % 10}' / f'clip_{i:05d}.mp4'
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(template, path)
+        files.append(path)
+    return files
+
+
+def build_scan_tree(root: Path, count: int) -> Path:
+    """生成只含空文件的目录树，用于测量纯扫描开销"""
+    tree = root / f'scan_{count}'
+    if not tree.exists():
+        extensions = ['.mp4', '.MP4', '.mov', '.mkv', '.txt', '.jpg']
+        for i in range(count):
+            path = tree / f'd{i % 50}' / f's{i % 7}' / f'f{i:06d}{extensions[i % len(extensions)]}'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+    return tree
+
+
+def timed(func, repeat: int = 3) -> float:
+    """多次运行取中位数（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def result(name: str, seconds: float, items: int, **params) -> dict:
+    entry = {
+        'name': name,
+        'params': params,
+        'seconds': round(seconds, 6),
+        'items': items,
+        'items_per_second': round(items / seconds, 2) if seconds > 0 else None
+    }
+    print(f"  {name:<28} {str(params):<40} {seconds:9.4f}s  {entry['items_per_second']} /s")
+    return entry
+
+
+def reset_stats(forge: VideoForge):
+    forge.stats = {k: ({a: 0 for a in v} if isinstance(v, dict) else 0)
+                   for k, v in forge.stats.items()}
+
+
+def bench_scan(work: Path, sizes: list, forge: VideoForge) -> list:
+    print("\n📂 目录扫描")
+    results = []
+    extensions = forge.config['video_extensions']
+    for size in sizes:
+        tree = build_scan_tree(work, size * 10)
+        found = sum(1 for _ in iter_video_files(tree, extensions))
+        results.append(result('scan.iter_video_files',
+                              timed(lambda: sum(1 for _ in iter_video_files(tree, extensions))),
+                              found, files=size * 10))
+        results.append(result('scan.rglob_per_extension',
+                              timed(lambda: sum(len(list(tree.rglob(f'*{e}'))) for e in extensions)),
+                              found, files=size * 10))
+    return results
+
+
+def bench_probe(work: Path, sizes: list, concurrency: list, forge: VideoForge) -> list:
+    print("\n🔍 探测与决策")
+    results = []
+    for size in sizes:
+        files = [str(f) for f in build_media_corpus(work, size)]
+
+        forge.config['probe_cache'] = False
+        results.append(result('probe.get_video_info.cold',
+                              timed(lambda: [forge.get_video_info(f) for f in files], repeat=1),
+                              size, files=size))
+        for n in concurrency:
+            results.append(result('probe.probe_many.cold',
+                                  timed(lambda: list(forge.probe_many(files, concurrency=n)), repeat=1),
+                                  size, files=size, concurrency=n))
+
+        forge.config['probe_cache'] = True
+        forge.probe_cache.get_many(files)
+        for f in files:
+            forge.get_video_info(f)
+        results.append(result('probe.get_video_info.cached',
+                              timed(lambda: [forge.get_video_info(f) for f in files]),
+                              size, files=size))
+        results.append(result('decide.should_skip_video',
+                              timed(lambda: [forge.should_skip_video(f, 'h265', 'medium') for f in files]),
+                              size, files=size))
+        results.append(result('decide.decide_action',
+                              timed(lambda: [forge.decide_action(f, f, 'h265', 'medium') for f in files]),
+                              size, files=size))
+    return results
+
+
+def bench_transcode(work: Path, sizes: list, concurrency: list, forge: VideoForge) -> list:
+    print("\n🔄 批量转码（端到端）")
+    results = []
+    size = min(sizes)
+    build_media_corpus(work, size)
+    for n in concurrency:
+        output = work / f'out_{n}'
+        shutil.rmtree(output, ignore_errors=True)
+        reset_stats(forge)
+
+        def run():
+            forge.transcode_directory(str(work / f'media_{size}'), str(output),
+                                      codec='h264', quality='low', preset='ultrafast',
+                                      max_workers=n, smart_skip=False)
+
+        results.append(result('transcode_directory', timed(run, repeat=1),
+                              size, files=size, workers=n))
+    return results
+
+
+def compare(current: dict, baseline_file: str, threshold: float) -> int:
+    """与基线结果对比，返回回退项数量"""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def key(entry):
+        return entry['name'], json.dumps(entry['params'], sort_keys=True)
+
+    old = {key(e): e for e in baseline['results']}
+    regressions = 0
+    print(f"\n📊 与基线对比: {baseline_file} ({baseline['meta']['timestamp']})")
+    for entry in current['results']:
+        before = old.get(key(entry))
+        if not before or not before['seconds']:
+            continue
+        change = (entry['seconds'] - before['seconds']) / before['seconds'] * 100
+        status = "✅"
+        if change > threshold:
+            status = "❌"
+            regressions += 1
+        print(f"  {status} {entry['name']:<28} {str(entry['params']):<40} "
+              f"{before['seconds']:.4f}s → {entry['seconds']:.4f}s ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VideoForge 性能基准测试')
+    parser.add_argument('--sizes', default='20,100', help='测试文件数量（逗号分隔）')
+    parser.add_argument('--concurrency', default='1,4,8', help='并发度（逗号分隔）')
+    parser.add_argument('--work-dir', help='测试数据目录（默认临时目录，指定后可复用生成的视频）')
+    parser.add_argument('--output', help='结果 JSON 文件')
+    parser.add_argument('--compare', help='对比的基线 JSON 文件')
+    parser.add_argument('--threshold', type=float, default=10.0, help='视为回退的耗时增幅（%%，默认 10）')
+    parser.add_argument('--quick', action='store_true', help='快速模式（少量文件，跳过端到端转码）')
+    args = parser.parse_args()
+
+    if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+        print("❌ 需要 ffmpeg 和 ffprobe")
+        sys.exit(1)
+
+    sizes = [int(x) for x in args.sizes.split(',')]
+    concurrency = [int(x) for x in args.concurrency.split(',')]
+    if args.quick:
+        sizes = [min(sizes)]
+
+    work = Path(args.work_dir or tempfile.mkdtemp(prefix='videoforge-bench-'))
+    work.mkdir(parents=True, exist_ok=True)
+
+    forge = VideoForge()
+    forge.logger.setLevel(logging.WARNING)
+    forge.config['probe_cache_path'] = str(work / 'probe_cache.sqlite')
+
+    ffmpeg_version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.split('\n')[0]
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': ffmpeg_version,
+            'sizes': sizes,
+            'concurrency': concurrency
+        },
+        'results': []
+    }
+
+    print("🔥 VideoForge 基准测试\n" + "=" * 60)
+    report['results'] += bench_scan(work, sizes, forge)
+    report['results'] += bench_probe(work, sizes, concurrency, forge)
+    if not args.quick:
+        report['results'] += bench_transcode(work, sizes, concurrency, forge)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+    regressions = compare(report, args.compare, args.threshold) if args.compare else 0
+
+    if not args.work_dir:
+        shutil.rmtree(work, ignore_errors=True)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试资源准入：磁盘空间（含暂存时的最终目标）、内存不足时的放弃、等待与获准
+"""
+
+import logging
+import shutil
+import threading
+import time
+from collections import namedtuple
+
+import videoforge
+from videoforge import VideoForge
+
+MB = 1024 * 1024
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+def test_admission():
+    """用假的 shutil.disk_usage / _memory_available 测试准入决策"""
+    print("🧪 测试资源准入\n" + "=" * 60)
+
+    free = {'/scratch': 10000 * MB, '/nas/videos': 10000 * MB}
+    memory = {'available': 8000 * MB}
+    forge = VideoForge(config={'min_free_space': 1000, 'min_free_memory': 500,
+                               'load_check_interval': 0.05},
+                       logger=logging.getLogger('test.admission'))
+    forge._memory_available = lambda: memory['available']
+    original_disk_usage = shutil.disk_usage
+    videoforge.shutil.disk_usage = lambda path: DiskUsage(0, 0, free[path])
+
+    def acquire(name, need_disk, need_memory=100 * MB, destination=None):
+        return forge._acquire_resources(f'/in/{name}.mkv', f'/scratch/{name}.mp4', None, 'encode',
+                                        'h265', 23, 'medium', None, need_disk=need_disk,
+                                        need_memory=need_memory, destination=destination)
+
+    try:
+        assert acquire('a', 2000 * MB, destination='/nas/videos/a.mp4') is None
+        forge._release_resources('/in/a.mkv')
+        print("✅ 暂存区和最终目标都放得下时获准")
+
+        # 暂存区空间充足，最终目标不足：没有其他任务时直接放弃
+        free['/nas/videos'] = 2000 * MB
+        problem = acquire('b', 2000 * MB, destination='/nas/videos/b.mp4')
+        assert problem and '/nas/videos' in problem
+        assert forge.stats['admission_rejected'] == 1
+        assert acquire('b', 2000 * MB) is None
+        forge._release_resources('/in/b.mkv')
+        print(f"✅ 最终目标空间不足时放弃: {problem}")
+
+        # 有其他任务运行时等待，它们结束后获准（暂存区充足，等待的是最终目标）
+        free['/scratch'] = 100000 * MB
+        free['/nas/videos'] = 10000 * MB
+        assert acquire('c', 5000 * MB, destination='/nas/videos/c.mp4') is None
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(
+            acquire('d', 5000 * MB, destination='/nas/videos/d.mp4')))
+        waiter.start()
+        time.sleep(0.3)
+        assert not admitted and forge.stats['admission_waits'] == 1
+        forge._release_resources('/in/c.mkv')
+        waiter.join(timeout=5)
+        assert admitted == [None]
+        forge._release_resources('/in/d.mkv')
+        print("✅ 运行中任务的预留占满最终目标时等待，结束后获准")
+
+        # 内存不足：有其他任务时等待，没有时仍然启动
+        assert acquire('e', 100 * MB) is None
+        memory['available'] = 600 * MB
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(acquire('f', 100 * MB, 200 * MB)))
+        waiter.start()
+        time.sleep(0.3)
+        assert not admitted
+        memory['available'] = 8000 * MB
+        forge._release_resources('/in/e.mkv')
+        waiter.join(timeout=5)
+        assert admitted == [None]
+        forge._release_resources('/in/f.mkv')
+        memory['available'] = 100 * MB
+        assert acquire('g', 100 * MB, 200 * MB) is None
+        forge._release_resources('/in/g.mkv')
+        print("✅ 内存不足时等待其他任务，没有其他任务时仍然启动")
+
+        # 样本编码不预留磁盘
+        free['/scratch'] = 0
+        assert acquire('h', 0) is None
+        forge._release_resources('/in/h.mkv')
+        print("✅ need_disk=0 时不检查磁盘")
+    finally:
+        videoforge.shutil.disk_usage = original_disk_usage
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_admission()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 asyncio API 的子进程驱动（进度队列与取消）
+
+用 Python 子进程模拟 ffmpeg 的 -progress 输出，不需要安装 ffmpeg。
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from videoforge import VideoForge
+
+PROGRESS_SCRIPT = """
+import sys
+for frame in (30, 60):
+    print(f"frame={frame}\\nout_time_us={frame * 100000}\\nspeed=2.0x\\nprogress=continue", flush=True)
+print("frame=90\\nout_time_us=9000000\\nspeed=2.0x\\nprogress=end", flush=True)
+print("done", file=sys.stderr)
+"""
+
+
+def test_async_api():
+    """测试进度事件、返回码和取消时结束子进程"""
+    print("🧪 测试 asyncio API\n" + "=" * 60)
+
+    forge = VideoForge(config={'nice': 0, 'ionice': None}, logger=logging.getLogger('test.async'))
+
+    async def run_progress():
+        queue = asyncio.Queue()
+        cmd = [sys.executable, '-c', PROGRESS_SCRIPT, 'out.mp4']
+        returncode, stderr_tail = await forge._run_ffmpeg_async(cmd, 'in.mp4', 'out.mp4', 9, queue)
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        return returncode, stderr_tail, events
+
+    returncode, stderr_tail, events = asyncio.run(run_progress())
+    assert returncode == 0 and stderr_tail == 'done'
+    assert [e['out_time'] for e in events] == [3.0, 6.0, 9.0, 9.0]
+    assert events[-1]['state'] == 'done' and events[-1]['percent'] == 100.0
+    print(f"✅ 进度事件写入队列: {len(events)} 个，最后一个 state=done")
+
+    async def run_cancel():
+        cmd = [sys.executable, '-c', 'import time; time.sleep(60)', 'out.mp4']
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(forge._run_ffmpeg_async(cmd, 'in.mp4', 'out.mp4', 60, queue))
+        await asyncio.sleep(0.5)
+        pids = list(forge._processes)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return pids, queue.get_nowait()
+
+    started = time.monotonic()
+    pids, final = asyncio.run(run_cancel())
+    assert len(pids) == 1 and not forge._processes
+    assert final['state'] == 'cancelled'
+    assert time.monotonic() - started < 10
+    try:
+        os.kill(pids[0], 0)
+        alive = True
+    except ProcessLookupError:
+        alive = False
+    assert not alive
+    print("✅ 取消后子进程已结束，最后一个事件 state=cancelled")
+
+    # 与同步版本相同的资源准入：磁盘空间不足直接放弃，预留随任务结束释放
+    info = {'width': 1920, 'height': 1080, 'codec': 'h264', 'bit_rate': 8000000,
+            'duration': 60.0, 'size': 60000000, 'fps': 30.0}
+    forge.config['min_free_space'] = 1024 ** 4
+    result = asyncio.run(forge._transcode_file_async('in.mp4', 'out.mp4', smart_skip=False, info=info))
+    assert result['state'] == 'failed' and result['reason'].startswith('磁盘空间不足')
+    assert forge.stats['admission_rejected'] == 1
+    print(f"✅ 准入拒绝: {result['reason']}")
+
+    forge.config['min_free_space'] = 0
+    result = asyncio.run(forge._transcode_file_async('missing.mp4', 'out.mp4', smart_skip=False, info=info))
+    assert result['state'] == 'failed' and not forge._reservations
+    print("✅ 转码失败后释放资源预留")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_async_api()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试内容指纹索引（相同内容改名/移动后复用已有输出）
+"""
+
+import os
+import shutil
+import tempfile
+
+from videoforge import ContentIndex
+
+
+def test_content_index():
+    """测试部分内容指纹、输出记录与失效"""
+    print("🧪 测试内容指纹索引\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'a.mp4')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(3 * ContentIndex.BLOCK_SIZE + 123))
+        moved = os.path.join(tmp, 'moved', 'b.mp4')
+        os.makedirs(os.path.dirname(moved))
+        shutil.copyfile(source, moved)
+
+        index = ContentIndex(os.path.join(tmp, 'index.sqlite'))
+        fingerprint = index.source_fingerprint(source)
+        assert index.source_fingerprint(moved) == fingerprint
+        print(f"✅ 复制/移动后指纹相同: {fingerprint}")
+
+        # 中间块变化
+        with open(moved, 'r+b') as f:
+            f.seek(os.path.getsize(moved) // 2)
+            f.write(b'changed')
+        assert index.source_fingerprint(moved) != fingerprint
+        print("✅ 中间内容变化后指纹不同")
+
+        output = os.path.join(tmp, 'out.mp4')
+        index.record(fingerprint, 'h265|crf23|medium', source, output)
+        assert index.lookup(fingerprint, 'h265|crf23|medium') is None
+        print("✅ 输出不存在时不复用")
+
+        with open(output, 'wb') as f:
+            f.write(b'encoded')
+        index.record(fingerprint, 'h265|crf23|medium', source, output)
+        entry = index.lookup(fingerprint, 'h265|crf23|medium')
+        assert entry == {'source': os.path.abspath(source), 'output': os.path.abspath(output)}
+        assert index.lookup(fingerprint, 'h264|crf23|medium') is None
+        print("✅ 按 (指纹, 转码参数) 查找已有输出")
+
+        with open(output, 'ab') as f:
+            f.write(b' modified')
+        assert index.lookup(fingerprint, 'h265|crf23|medium') is None
+        print("✅ 输出被修改后记录失效")
+
+        # 同一路径被其他内容的输出覆盖
+        index.record(fingerprint, 'h265|crf23|medium', source, output)
+        index.record('other', 'h265|crf23|medium', moved, output)
+        assert index.lookup(fingerprint, 'h265|crf23|medium') is None
+        assert index.lookup('other', 'h265|crf23|medium')['source'] == os.path.abspath(moved)
+        index.close()
+        print("✅ 输出路径被覆盖后旧记录失效")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_content_index()
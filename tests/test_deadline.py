@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试截止时间模式：截止时间解析与按实测速度选择编码速度预设
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from videoforge import DeadlinePlanner, parse_deadline
+
+
+def test_deadline():
+    """测试预设随剩余时间和实测速度调整"""
+    print("🧪 测试截止时间模式\n" + "=" * 60)
+
+    now = datetime(2026, 1, 1, 22, 0)
+    assert parse_deadline('06:30', now) == datetime(2026, 1, 2, 6, 30)
+    assert parse_deadline('23:15', now) == datetime(2026, 1, 1, 23, 15)
+    assert parse_deadline('2026-01-03 08:00', now) == datetime(2026, 1, 3, 8, 0)
+    # 带时区的时间换算为本地时间后再比较
+    local = datetime(2026, 1, 3, 8, 0, tzinfo=timezone(timedelta(hours=2))).astimezone().replace(tzinfo=None)
+    assert parse_deadline('2026-01-03T08:00+02:00', now) == local
+    for bad in ('25:00', 'tomorrow', '2025-12-31 08:00', '2025-12-31T08:00+02:00'):
+        try:
+            parse_deadline(bad, now)
+            assert False, bad
+        except ValueError:
+            pass
+    print("✅ HH:MM 已过时顺延到明天，带时区的时间换算为本地时间，格式错误或已过期时报错")
+
+    t0 = time.monotonic()
+    costs = {'a': 100.0, 'b': 100.0, 'c': 100.0, 'd': 100.0}
+    planner = DeadlinePlanner(datetime.now() + timedelta(seconds=1000), costs, workers=1,
+                              base_preset='medium', presets=['veryfast', 'fast', 'medium', 'slow', 'slower'],
+                              durations={path: 60 for path in costs})
+    assert planner.start('a', now=t0) == 'medium'
+    projection = planner.complete('a', encode_seconds=100, now=t0 + 100)
+    # medium 实测 1 单位/秒：剩余 300 单位，slow 约 500 秒、slower 约 1000 秒，可用约 810 秒
+    assert projection['preset'] == 'medium' and projection['next'] == 'slow'
+    assert not projection['late'] and projection['remaining_files'] == 3
+    assert projection['remaining_duration'] == 180
+    print(f"✅ 时间充裕时换用更慢的预设: medium → {projection['next']}")
+
+    assert planner.start('b', now=t0 + 100) == 'slow'
+    projection = planner.complete('b', encode_seconds=600, now=t0 + 700)
+    order = DeadlinePlanner.PRESETS
+    assert order.index(projection['next']) < order.index('slow')
+    print(f"✅ 实测比预期慢时换用更快的预设: slow → {projection['next']}")
+
+    # 跳过/换封装/失败的任务只移除工作量，不影响速度估计
+    rates = dict(planner._rates)
+    planner.start('c', now=t0 + 700)
+    projection = planner.complete('c', now=t0 + 701)
+    assert planner._rates == rates and 'c' not in planner._running
+    assert projection['remaining_files'] == 1
+    print("✅ 非编码任务结束时只移除工作量")
+
+    planner.start('d', now=t0 + 701)
+    planner._pending['e'] = 1000.0
+    projection = planner.complete('d', encode_seconds=289, now=t0 + 990)
+    assert projection['late'] and projection['next'] == 'veryfast'
+    assert projection['finish'] > planner.deadline
+    print("✅ 来不及时使用最快的预设并标记超时")
+
+    # 速度只按 ffmpeg 编码耗时计算，等待资源、暂存和移动的时间不计入
+    planner = DeadlinePlanner(datetime.now() + timedelta(seconds=1000), {'a': 100.0}, workers=1)
+    planner.start('a', now=t0)
+    planner.complete('a', encode_seconds=50, now=t0 + 400)
+    assert planner._rates['medium'] == 2.0
+    print("✅ 速度 = 工作量 / 编码耗时（墙钟 400 秒，编码 50 秒）")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_deadline()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试处理方式决策（跳过 / 换封装 / 仅转音频 / 完整编码）
+"""
+
+import logging
+
+from videoforge import VideoForge
+
+
+def clip(**overrides):
+    """60 秒 1080p 的合成视频信息（不需要真实文件）"""
+    info = {'codec': 'hevc', 'width': 1920, 'height': 1080, 'bit_rate': 1000000,
+            'duration': 60.0, 'size': 8000000, 'fps': 30.0,
+            'audio_codec': 'aac', 'audio_sample_rate': 48000, 'audio_channels': 2}
+    info.update(overrides)
+    return info
+
+
+# (说明, 视频信息, 输出路径, 参数, skip_action, 预期处理方式)
+CASES = [
+    ('已是 HEVC 且码率低', clip(), 'out.mp4', {}, 'remux', 'remux'),
+    ('skip_action=skip 时不输出', clip(), 'out.mp4', {}, 'skip', 'skip'),
+    ('PCM 音频无法放入 MP4', clip(audio_codec='pcm_s16le'), 'out.mp4', {}, 'remux', 'audio'),
+    ('MKV 输出可保留 PCM 音频', clip(audio_codec='pcm_s16le'), 'out.mkv', {}, 'remux', 'remux'),
+    ('没有音频', clip(audio_codec=None), 'out.mp4', {}, 'remux', 'remux'),
+    ('H.264 高码率', clip(codec='h264', bit_rate=8000000, size=62000000), 'out.mp4', {}, 'remux', 'encode'),
+    ('H.264 码率已很低（预估会变大）', clip(codec='h264', bit_rate=1000000, size=8000000),
+     'out.mp4', {}, 'remux', 'remux'),
+    ('目标为 H.264 时 HEVC 高码率需编码', clip(bit_rate=8000000, size=62000000), 'out.mp4',
+     {'codec': 'h264'}, 'remux', 'encode'),
+    ('4K 源需要缩小到 1080p', clip(width=3840, height=2160, bit_rate=4000000, size=31000000),
+     'out.mp4', {'resolution': '1080p'}, 'remux', 'encode'),
+    ('WMV3 码率已很低但无法放入 MP4', clip(codec='wmv3'), 'out.mp4', {}, 'remux', 'encode'),
+    ('WMV3 无法放入 MP4，skip_action=skip 时不输出', clip(codec='wmv3'), 'out.mp4', {}, 'skip', 'skip'),
+    ('MKV 输出可直接复制 WMV3', clip(codec='wmv3'), 'out.mkv', {}, 'remux', 'remux'),
+    ('禁用智能跳过', clip(), 'out.mp4', {'smart_skip': False}, 'remux', 'encode'),
+]
+
+
+def test_decide_action():
+    """按合成的视频信息逐项检查处理方式"""
+    print("🧪 测试处理方式决策\n" + "=" * 60)
+
+    forge = VideoForge(config={'predictor': False, 'sample_probe': False},
+                       logger=logging.getLogger('test.decide'))
+
+    for description, info, output, params, skip_action, expected in CASES:
+        forge.config['skip_action'] = skip_action
+        params = dict({'codec': 'h265', 'quality': 'medium'}, **params)
+        action, reason = forge.decide_action(
+            'in.mkv', output, params['codec'], params['quality'],
+            resolution=params.get('resolution'), smart_skip=params.get('smart_skip', True), info=info
+        )
+        assert action == expected, (description, action, reason)
+        print(f"✅ {description}: {action}（{reason}）")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_decide_action()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量转码任务日志（断点续传）
+"""
+
+import os
+import tempfile
+
+from videoforge import JobJournal
+
+
+def test_job_journal():
+    """测试状态记录、崩溃恢复与压缩"""
+    print("🧪 测试任务日志\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src_done = os.path.join(tmp, 'done.mp4')
+        src_running = os.path.join(tmp, 'running.mp4')
+        output = os.path.join(tmp, 'out.mp4')
+        for path in (src_done, src_running, output):
+            with open(path, 'wb') as f:
+                f.write(b'0' * 10)
+        journal_path = os.path.join(tmp, 'journal.jsonl')
+
+        journal = JobJournal(journal_path)
+        journal.record(src_done, 'running', output=output)
+        journal.record(src_done, 'done', output=output)
+        journal.record(src_running, 'running', output=output)
+        journal.close()
+
+        # 模拟崩溃：最后一行只写了一半
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"path": "/x.mp4", "sta')
+
+        journal = JobJournal(journal_path)
+        assert journal.is_finished(src_done)
+        assert not journal.is_finished(src_running)
+        assert journal.state_of(src_running)['state'] == 'running'
+        print("✅ 重新加载后：已完成的文件跳过，运行中的文件重做")
+
+        # 源文件变化后不再视为已完成
+        with open(src_done, 'ab') as f:
+            f.write(b'1')
+        assert not journal.is_finished(src_done)
+        print("✅ 源文件变化后重新处理")
+
+        journal.compact()
+        journal.close()
+        with open(journal_path, encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+        print("✅ 压缩后每个文件只保留一条记录")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_job_journal()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试嵌入模式：延迟初始化、日志只配置一次、注入 logger 与配置
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+from videoforge import VideoForge, setup_logging
+
+
+def test_library_mode():
+    """测试多实例不重复添加日志处理器"""
+    print("🧪 测试嵌入模式\n" + "=" * 60)
+
+    shared = logging.getLogger('VideoForge')
+    forge = VideoForge()
+    forge.logger.info("first instance")
+    handlers = len(shared.handlers)
+    for _ in range(5):
+        VideoForge().logger.info("another instance")
+    assert len(shared.handlers) == handlers
+    assert setup_logging() is shared and len(shared.handlers) == handlers
+    print(f"✅ 创建多个实例后处理器数量不变: {handlers}")
+
+    injected = logging.getLogger('test.embedded')
+    forge = VideoForge(logger=injected)
+    assert forge.logger is injected
+    forge.enable_tracing()
+    assert not injected.handlers
+    print("✅ 使用注入的 logger，不修改其处理器")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = os.path.join(tmp, 'config.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({'max_threads': 4, 'skip_action': 'skip'}, f)
+        forge = VideoForge(config_file, config={'skip_action': 'remux'}, logger=injected)
+        assert forge._config is None
+        assert forge.config['max_threads'] == 4
+        assert forge.config['skip_action'] == 'remux'
+        forge.config['max_threads'] = 8
+        assert VideoForge(config_file, logger=injected).config['max_threads'] == 4
+        print("✅ 配置首次访问时加载，覆盖项优先，实例之间互不影响")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_library_mode()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 LPT 调度（按工作量从大到小排序）与整批进度、剩余时间估算
+"""
+
+import logging
+import time
+from pathlib import Path
+
+from videoforge import VideoForge
+
+# 文件名 -> 视频信息（None 表示探测失败）
+INFOS = {
+    'short.mp4': {'width': 1920, 'height': 1080, 'duration': 60.0},
+    'long.mp4': {'width': 1920, 'height': 1080, 'duration': 3600.0},
+    'broken.mp4': None,
+    '4k.mp4': {'width': 3840, 'height': 2160, 'duration': 600.0},
+    'no_duration.mp4': {'width': 1920, 'height': 1080},
+    'medium.mp4': {'width': 1920, 'height': 1080, 'duration': 600.0},
+}
+
+
+def test_lpt():
+    """测试最长任务优先、未知时长任务排在最后，以及批次进度"""
+    print("🧪 测试 LPT 调度与批次进度\n" + "=" * 60)
+
+    forge = VideoForge(logger=logging.getLogger('test.lpt'))
+    forge.probe_many = lambda paths: [(path, INFOS[Path(path).name]) for path in paths]
+
+    jobs = [(i, Path('/in') / name, Path('/out') / name, None) for i, name in enumerate(INFOS, 1)]
+    scheduled = forge._schedule_lpt(jobs, workers=2)
+    order = [job[1].name for job in scheduled]
+    # 4K 600 秒的工作量（像素 × 时长）等于 1080p 2400 秒
+    assert order == ['long.mp4', '4k.mp4', 'medium.mp4', 'short.mp4', 'broken.mp4', 'no_duration.mp4']
+    assert scheduled[0][3] == INFOS['long.mp4']
+    print(f"✅ 按工作量从大到小: {order}")
+    print("✅ 探测失败或没有时长的任务工作量为 0，保持原顺序排在最后")
+
+    batch = forge._batch
+    assert batch['total'] == 6 and batch['done'] == 0
+    assert batch['costs']['/in/broken.mp4'] == 0 and batch['costs']['/in/no_duration.mp4'] == 0
+    pixels = 1920 * 1080
+    assert batch['total_work'] == pixels * (3600 + 4 * 600 + 600 + 60)
+
+    # 100 秒完成了 long.mp4（3600 × 像素）和运行中 4k.mp4 的一半
+    batch['started'] = time.monotonic() - 100
+    batch['done'] = 1
+    batch['done_work'] = batch['costs']['/in/long.mp4']
+    forge._active_jobs['/in/4k.mp4'] = {'input': '/in/4k.mp4', 'percent': 50.0}
+    progress = forge._batch_progress()
+    work = pixels * (3600 + 1200)
+    assert abs(progress['percent'] - work / batch['total_work'] * 100) < 1e-9
+    assert abs(progress['eta'] - (batch['total_work'] - work) * progress['elapsed'] / work) < 1e-6
+    print(f"✅ 进度 {progress['percent']:.1f}%，按实测吞吐预计剩余 {progress['eta']:.0f} 秒")
+
+    # 有工作量的任务都完成后，只剩未知时长的任务：进度 100%，剩余时间为 0
+    forge._active_jobs.clear()
+    batch['done'] = 4
+    batch['done_work'] = batch['total_work']
+    progress = forge._batch_progress()
+    assert progress['percent'] == 100.0 and progress['eta'] == 0.0
+    assert progress['done'] == 4 and progress['total'] == 6
+    print("✅ 只剩未知时长的任务时进度 100%、剩余 0 秒（按文件数仍显示 4/6）")
+
+    # 全部任务时长未知：不估算剩余时间，也不会除以 0
+    forge._schedule_lpt([(1, Path('/in/broken.mp4'), Path('/out/broken.mp4'), None),
+                         (2, Path('/in/no_duration.mp4'), Path('/out/no_duration.mp4'), None)], workers=2)
+    progress = forge._batch_progress()
+    assert progress['percent'] == 0.0 and progress['eta'] is None
+    print("✅ 全部时长未知时不估算剩余时间")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_lpt()
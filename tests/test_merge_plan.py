@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试合并前的流参数分组（只重新编码与多数片段不一致的片段）
+"""
+
+import logging
+import os
+import tempfile
+
+from videoforge import VideoForge
+
+
+def clip(**overrides):
+    info = {'codec': 'h264', 'width': 1920, 'height': 1080, 'pix_fmt': 'yuv420p',
+            'fps': 30000 / 1001, 'frame_rate': '30000/1001', 'time_base': '1/30000', 'duration': 60,
+            'audio_codec': 'aac', 'audio_sample_rate': 48000, 'audio_channels': 2}
+    info.update(overrides)
+    return info
+
+
+def test_merge_plan():
+    """测试基准选择与不一致片段识别"""
+    print("🧪 测试合并分组\n" + "=" * 60)
+
+    infos = [clip(), clip(), clip(width=1280, height=720), clip(), clip(audio_codec=None)]
+    reference, mismatched = VideoForge._merge_plan(infos)
+    assert reference == VideoForge._stream_signature(clip())
+    assert mismatched == [2, 4]
+    print(f"✅ 多数片段为基准，需要重新编码: {mismatched}")
+
+    # 帧率按 ffprobe 的有理数比较：29.97（2997/100）与 NTSC 的 30000/1001 不同
+    reference, mismatched = VideoForge._merge_plan([clip(), clip(frame_rate='60000/2002'),
+                                                    clip(fps=29.97, frame_rate='2997/100')])
+    assert mismatched == [2]
+    print("✅ 帧率按精确的有理数比较")
+
+    # 没有 frame_rate 时由 fps 换算
+    assert VideoForge._stream_signature(clip(frame_rate=None)) == VideoForge._stream_signature(clip())
+
+    forge = VideoForge(logger=logging.getLogger('test.merge'))
+    reference = dict(zip(VideoForge.MERGE_SIGNATURE, VideoForge._stream_signature(clip())))
+    cmd = forge._conform_command('in.mp4', 'out.mp4', clip(width=1280, height=720), reference, 23, 'medium')
+    assert cmd[cmd.index('-vf') + 1].split(',')[3] == 'fps=30000/1001'
+    print("✅ 重新编码时原样使用基准帧率: fps=30000/1001")
+
+    # 数量相同时取总时长更长的一组
+    reference, mismatched = VideoForge._merge_plan([clip(duration=10), clip(codec='hevc', duration=600)])
+    assert reference[0] == 'hevc' and mismatched == [0]
+    print("✅ 数量相同时按总时长选基准")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        list_file = os.path.join(tmp, 'list.txt')
+        VideoForge._write_concat_list(list_file, ["/videos/it's.mp4", '/videos/b.mp4'])
+        with open(list_file, encoding='utf-8') as f:
+            assert f.read() == "file '/videos/it'\\''s.mp4'\nfile '/videos/b.mp4'\n"
+        print("✅ 文件列表转义单引号")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_merge_plan()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试指标导出（Prometheus 文本格式与 JSON 快照）
+"""
+
+from videoforge import Metrics
+
+
+def test_metrics():
+    """测试计数器、仪表、直方图及两种导出格式"""
+    print("🧪 测试指标导出\n" + "=" * 60)
+
+    metrics = Metrics()
+    metrics.describe('files_total', 'counter', '文件数')
+    metrics.describe('active_jobs', 'gauge', '运行中任务数')
+    metrics.describe('probe_seconds', 'histogram', '探测耗时', (0.1, 1, 10))
+
+    metrics.inc('files_total', state='done', action='encode')
+    metrics.inc('files_total', state='done', action='encode')
+    metrics.inc('files_total', state='skipped', action='skip')
+    metrics.set('active_jobs', 3)
+    for value in (0.05, 0.5, 0.7, 20):
+        metrics.observe('probe_seconds', value)
+    metrics.record_file(path='a.mp4', action='encode', state='done')
+
+    text = metrics.render_prometheus()
+    assert '# TYPE videoforge_files_total counter' in text
+    assert 'videoforge_files_total{action="encode",state="done"} 2' in text
+    assert 'videoforge_active_jobs 3' in text
+    assert 'videoforge_probe_seconds_bucket{le="0.1"} 1' in text
+    assert 'videoforge_probe_seconds_bucket{le="1"} 3' in text
+    assert 'videoforge_probe_seconds_bucket{le="+Inf"} 4' in text
+    assert 'videoforge_probe_seconds_count 4' in text
+    print("✅ Prometheus 文本格式（累积桶）")
+
+    metrics.inc('files_total', state='failed', action='say "hi"\n')
+    assert 'action="say \\"hi\\"\\n"' in metrics.render_prometheus()
+    print("✅ 标签值转义")
+
+    snapshot = metrics.snapshot()
+    assert snapshot['probe_seconds']['series'][0]['buckets'] == {'0.1': 1, '1': 3, '10': 3}
+    assert snapshot['active_jobs']['series'][0]['value'] == 3
+    assert snapshot['recent_files'][0]['path'] == 'a.mp4'
+    print("✅ JSON 快照")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_metrics()
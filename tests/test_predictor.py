@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试输出码率预测模型（分桶均值 + 95% 预测区间）
+"""
+
+import logging
+import math
+import os
+import tempfile
+
+from videoforge import BitratePredictor, VideoForge
+
+
+def test_bitrate_predictor():
+    """测试样本记录、粗分桶回退与样本不足"""
+    print("🧪 测试码率预测模型\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        predictor = BitratePredictor(os.path.join(tmp, 'model.sqlite'), min_samples=3)
+        info = {'codec': 'h264', 'bit_rate': 8000000, 'width': 1920, 'height': 1080,
+                'fps': 29.97, 'duration': 60}
+
+        assert predictor.predict(info, 'h265', 28, 'medium', 1080) is None
+        predictor.record(info, 'h265', 28, 'medium', 1080, 2000000)
+        predictor.record(info, 'h265', 28, 'medium', 1080, 2200000)
+        assert predictor.predict(info, 'h265', 28, 'medium', 1080) is None
+        print("✅ 样本不足时不预测")
+
+        predictor.record(info, 'h265', 28, 'medium', 1080, 2400000)
+        prediction = predictor.predict(info, 'h265', 28, 'medium', 1080)
+        assert prediction['samples'] == 3
+        assert abs(prediction['bitrate'] - 2200000) < 1
+        # 预测区间：mean ± t(2)·s·√(1 + 1/3)，s = 200 kbps
+        half_width = 4.303 * 200000 * math.sqrt(1 + 1 / 3)
+        assert abs(prediction['high'] - (2200000 + half_width)) < 1
+        assert abs(prediction['low'] - (2200000 - half_width)) < 1
+        assert '|h264|30fps|' in prediction['bucket']
+        print(f"✅ 细分桶预测: {prediction['bitrate']/1e6:.2f} Mbps "
+              f"({prediction['low']/1e6:.2f}-{prediction['high']/1e6:.2f})")
+
+        # 不同源编码/帧率落在同一个粗分桶
+        other = dict(info, codec='mpeg4', fps=60)
+        prediction = predictor.predict(other, 'h265', 28, 'medium', 1080)
+        assert prediction['bucket'] == 'h265|crf28|medium|1080'
+        assert prediction['samples'] == 3
+        print("✅ 细分桶无样本时回退到粗分桶")
+
+        assert predictor.predict(info, 'h265', 23, 'medium', 1080) is None
+        predictor.close()
+        print("✅ 不同 CRF 互不影响")
+
+        # 均值相同，区间宽度不同：按预测上限判断，区间宽时改为跳过
+        source = {'codec': 'h264', 'bit_rate': 3000000, 'width': 1920, 'height': 1080,
+                  'fps': 30, 'duration': 60, 'size': 22500000}
+        decisions = {}
+        for name, bitrates in (('narrow', (1900000, 2000000, 2100000)),
+                               ('wide', (1000000, 2000000, 3000000))):
+            forge = VideoForge(config={'predictor_path': os.path.join(tmp, f'{name}.sqlite'),
+                                       'predictor_min_samples': 3},
+                               logger=logging.getLogger('test.predictor'))
+            for bitrate in bitrates:
+                forge.predictor.record(source, 'h265', 28, 'fast', 1080, bitrate)
+            decisions[name] = forge.should_skip_video('a.mp4', 'h265', 'low', info=source)
+            forge.predictor.close()
+        assert decisions['narrow'][0] is False
+        assert decisions['wide'][0] is True
+        print(f"✅ 区间宽时跳过: {decisions['wide'][1]}")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_bitrate_predictor()
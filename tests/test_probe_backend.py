@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试探测后端：ffprobe 精简输出的解析与后端选择
+"""
+
+import json
+import logging
+import threading
+import time
+
+import videoforge
+from videoforge import FFprobeProbe, PyAVProbe, VideoForge
+
+
+def test_probe_backend():
+    """测试 -show_entries 输出解析、帧率解析和 PyAV 缺失时的回退"""
+    print("🧪 测试探测后端\n" + "=" * 60)
+
+    probe = FFprobeProbe()
+    cmd = probe.command('/videos/a.mp4')
+    assert '-show_entries' in cmd and '-show_streams' not in cmd and cmd[-1] == '/videos/a.mp4'
+    print(f"✅ 只请求需要的字段: {FFprobeProbe.ENTRIES}")
+
+    output = json.dumps({
+        'streams': [
+            {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000', 'channels': 2},
+            {'codec_type': 'video', 'codec_name': 'hevc', 'width': 1920, 'height': 1080,
+             'bit_rate': '4000000', 'r_frame_rate': '30000/1001', 'pix_fmt': 'yuv420p',
+             'time_base': '1/30000'},
+        ],
+        'format': {'duration': '60.5', 'size': '31000000'}
+    })
+    info = probe.parse(output)
+    assert info == {
+        'width': 1920, 'height': 1080, 'codec': 'hevc', 'bit_rate': 4000000,
+        'duration': 60.5, 'size': 31000000, 'fps': 30000 / 1001, 'frame_rate': '30000/1001',
+        'pix_fmt': 'yuv420p',
+        'time_base': '1/30000', 'audio_codec': 'aac', 'audio_sample_rate': 48000, 'audio_channels': 2
+    }
+    print("✅ 解析结果与 VideoInfo 字段一致")
+
+    # 缺失的码率、无效帧率（0/0）、N/A 时长
+    info = probe.parse(json.dumps({
+        'streams': [{'codec_type': 'video', 'codec_name': 'mjpeg', 'r_frame_rate': '0/0'}],
+        'format': {'duration': 'N/A'}
+    }))
+    assert info['bit_rate'] == 0 and info['fps'] == 0.0 and info['duration'] == 0.0
+    assert info['frame_rate'] is None
+    assert info['audio_codec'] is None
+    assert probe.parse(json.dumps({'streams': [{'codec_type': 'audio'}], 'format': {}})) is None
+    print("✅ 缺失/无效字段使用默认值，没有视频流返回 None")
+
+    # r_frame_rate 无效时使用 avg_frame_rate，并约分
+    info = probe.parse(json.dumps({
+        'streams': [{'codec_type': 'video', 'r_frame_rate': '0/0', 'avg_frame_rate': '60000/2002'}],
+        'format': {}
+    }))
+    assert info['frame_rate'] == '30000/1001' and info['fps'] == 30000 / 1001
+    print("✅ 帧率保留 ffprobe 的有理数形式")
+
+    forge = VideoForge(config={'probe_backend': 'ffprobe'}, logger=logging.getLogger('test.probe'))
+    assert isinstance(forge.probe_backend, FFprobeProbe)
+    forge.config['probe_backend'] = 'pyav'
+    expected = PyAVProbe if videoforge.av is not None else FFprobeProbe
+    assert isinstance(forge.probe_backend, expected)
+    print(f"✅ 按配置选择后端（pyav → {forge.probe_backend.name}）")
+
+    # 进程内后端卡在读取上（忽略自身超时）：超过期限产出 None，其余文件不受影响
+    release = threading.Event()
+
+    def fake_info(path, timeout=None):
+        if 'stuck' in path:
+            release.wait()
+        return {'path': path}
+
+    forge.get_video_info = fake_info
+    paths = ['stuck1.mp4', 'stuck2.mp4'] + [f'ok{i}.mp4' for i in range(6)]
+    started = time.monotonic()
+    try:
+        results = dict(forge.probe_many(paths, concurrency=2, timeout=0.2))
+    finally:
+        release.set()
+    assert time.monotonic() - started < 5
+    assert results['stuck1.mp4'] is None and results['stuck2.mp4'] is None
+    assert all(results[f'ok{i}.mp4'] == {'path': f'ok{i}.mp4'} for i in range(6))
+    print("✅ 卡住的探测超过期限后放弃，其余文件换用新线程池继续")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_probe_backend()
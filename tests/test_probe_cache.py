@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 ffprobe 结果缓存（键: 路径 + 大小 + mtime_ns）
+"""
+
+import os
+import tempfile
+
+from videoforge import ProbeCache
+
+
+def test_probe_cache():
+    """测试缓存命中、失效与批量读取"""
+    print("🧪 测试探测缓存\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, 'a.mp4')
+        other = os.path.join(tmp, 'b.mp4')
+        for path in (video, other):
+            with open(path, 'wb') as f:
+                f.write(b'0' * 100)
+
+        cache = ProbeCache(os.path.join(tmp, 'cache.sqlite'))
+        info = {'width': 1920, 'height': 1080, 'codec': 'h264'}
+
+        assert cache.get(video) is ProbeCache.MISS
+        cache.put(video, info)
+        cache.put(other, None)  # 没有视频流的文件同样缓存
+        assert cache.get(video) == info
+        assert cache.get(other) is None
+        print("✅ 写入后命中")
+
+        assert cache.get_many([video, other, os.path.join(tmp, 'missing.mp4')]) == {
+            video: info, other: None
+        }
+        print("✅ 批量读取")
+
+        # 文件内容变化（大小/mtime 改变）后自动失效
+        with open(video, 'ab') as f:
+            f.write(b'1')
+        assert cache.get(video) is ProbeCache.MISS
+        assert video not in cache.get_many([video])
+        print("✅ 文件变化后失效")
+
+        cache.invalidate(other)
+        assert cache.get(other) is ProbeCache.MISS
+        print("✅ 手动失效")
+
+        cache.put(other, info)
+        os.remove(other)
+        assert cache.prune() == 2  # 已变化的 a.mp4 和已删除的 b.mp4
+        cache.close()
+        print("✅ 清理过期记录")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_probe_cache()
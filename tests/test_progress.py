@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 ffmpeg -progress 输出解析
+"""
+
+from videoforge import parse_ffmpeg_progress
+
+
+def test_parse_ffmpeg_progress():
+    """测试进度块解析"""
+    print("🧪 测试 ffmpeg 进度解析\n" + "=" * 60)
+
+    output = """frame=120
+fps=29.97
+stream_0_0_q=28.0
+total_size=1048576
+out_time_us=4000000
+out_time_ms=4000000
+out_time=00:00:04.000000
+speed=1.5x
+progress=continue
+frame=0
+fps=0.00
+total_size=N/A
+out_time_us=N/A
+speed=N/A
+progress=continue
+frame=300
+fps=30.1
+out_time_ms=10000000
+speed=2.01x
+progress=end
+"""
+    blocks = list(parse_ffmpeg_progress(output.splitlines(keepends=True)))
+    assert len(blocks) == 3
+
+    assert blocks[0] == {'frame': 120, 'fps': 29.97, 'out_time': 4.0, 'speed': 1.5,
+                         'total_size': 1048576, 'progress': 'continue'}
+    print(f"✅ 常规进度块: {blocks[0]}")
+
+    assert blocks[1]['out_time'] is None and blocks[1]['speed'] is None
+    assert blocks[1]['total_size'] is None
+    print("✅ N/A 值解析为 None")
+
+    # 旧版本 ffmpeg 只输出 out_time_ms（单位实际为微秒）
+    assert blocks[2]['out_time'] == 10.0 and blocks[2]['progress'] == 'end'
+    print("✅ 兼容 out_time_ms 与结束标记")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_parse_ffmpeg_progress()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多输出（一次解码生成多个 rendition）的配置补全与 ffmpeg 命令构建
+"""
+
+from videoforge import VideoForge, parse_rendition
+
+
+def test_renditions():
+    """测试输出配置解析、补全和 split 滤镜命令"""
+    print("🧪 测试多输出\n" + "=" * 60)
+
+    spec = parse_rendition('codec=h264,crf=23,resolution=720p,output=/videos/h264')
+    assert spec == {'codec': 'h264', 'crf': 23, 'resolution': '720p', 'output': '/videos/h264'}
+    for bad in ('codec', 'foo=1', 'crf=high'):
+        try:
+            parse_rendition(bad)
+            assert False, bad
+        except ValueError:
+            pass
+    print("✅ 命令行输出配置解析与校验")
+
+    forge = VideoForge()
+    renditions = forge._resolve_renditions([{}, spec], '/videos/h265', 'h265', 'medium', resolution='1080p')
+    assert renditions[0]['name'] == 'h265' and renditions[0]['resolution'] == '1080p'
+    assert renditions[1]['name'] == 'h264' and renditions[1]['quality'] == 'medium'
+    print("✅ 未指定的项使用主输出参数，名称取输出目录名")
+
+    try:
+        forge._resolve_renditions([{}, {'codec': 'h264'}], '/videos/out', 'h265', 'medium')
+        assert False
+    except ValueError:
+        print("✅ 多个输出指向同一路径时报错")
+
+    # 单文件转码：输出目录（没有扩展名）对应 <目录>/<源文件名>.mp4，文件路径保持不变
+    single = forge._resolve_renditions([{}, spec, {'output': '/videos/copy.mkv'}], '/videos/a.mp4',
+                                       'h265', 'medium', input_path='/raw/a.mov')
+    assert [r['output'] for r in single] == ['/videos/a.mp4', '/videos/h264/a.mp4', '/videos/copy.mkv']
+    assert single[1]['name'] == 'h264'
+    print("✅ 单文件转码时输出目录映射为 <目录>/<源文件名>.mp4")
+
+    info = {'codec': 'h264', 'audio_codec': 'pcm_s16le'}
+    outputs = [
+        dict(renditions[0], output='/videos/h265/a.mp4', action='encode', crf=23, preset='medium'),
+        dict(renditions[1], output='/videos/h264/a.mp4', action='encode', preset='medium'),
+        dict(renditions[1], output='/videos/copy/a.mp4', action='remux'),
+    ]
+    cmd = forge._rendition_command('/in/a.mov', outputs, info, threads=8)
+    assert cmd.count('-i') == 1
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    assert graph == '[0:v:0]split=2[s0][s1];[s0]scale=-2:1080[v0];[s1]scale=-2:720[v1]'
+    assert '-vf' not in cmd
+    assert cmd.count('-threads') == 2 and cmd[cmd.index('-threads') + 1] == '4'
+    assert cmd[-1] == '/videos/copy/.a.partial.mp4'
+    copy_args = cmd[cmd.index('/videos/h264/.a.partial.mp4') + 1:]
+    assert copy_args[:6] == ['-map', '0:v', '-map', '0:a?', '-c:v', 'copy']
+    assert cmd.count('aac') == 3
+    print("✅ 一次解码：split 分给两个编码器，换封装输出直接复制视频流")
+
+    # 全部输出都跳过：每个输出各记一次，全局统计按源文件只记一次
+    forge.decide_action = lambda *args, **kwargs: ('skip', '已满足目标')
+    three = forge._resolve_renditions([{}, spec, {'output': '/videos/copy'}], '/videos/h265', 'h265', 'medium')
+    results = forge._transcode_renditions('/in/a.mov', three, info=info)
+    assert [r['state'] for r in results] == ['skipped'] * 3
+    assert forge.stats['skipped'] == 1 and forge.stats['skipped_smart'] == 1
+    assert all(forge.stats['renditions'][r['name']]['skipped'] == 1 for r in three)
+    print("✅ 全部输出跳过时全局只记一次跳过，各输出分别计数")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_renditions()
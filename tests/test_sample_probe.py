@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试样本编码的外推与节省判断（纯计算，不运行 ffmpeg）
+"""
+
+import logging
+
+from videoforge import VideoForge
+
+# 600 秒，总码率 8 Mbps（视频 7.5 Mbps + 音频约 0.5 Mbps）
+INFO = {'codec': 'h264', 'width': 1920, 'height': 1080, 'bit_rate': 7500000,
+        'duration': 600.0, 'size': 600000000, 'fps': 30.0, 'audio_codec': 'aac'}
+
+
+def test_sample_probe():
+    """测试输出大小外推、节省阈值和容器限制"""
+    print("🧪 测试样本编码预测\n" + "=" * 60)
+
+    # 3 个 10 秒样本共 7.5 MB（视频 2 Mbps），编码耗时 60 秒
+    sample = VideoForge._project_sample(INFO, 7500000, 30.0, 60.0, audio_transcode=False)
+    assert sample['video_bitrate'] == 2000000
+    assert sample['projected_size'] == (2000000 + 500000) * 600 // 8
+    assert sample['speed'] == 0.5 and sample['encode_time'] == 1200
+    print(f"✅ 外推输出 {sample['projected_size'] / 1e6:.1f} MB，速度 {sample['speed']}x")
+
+    sample = VideoForge._project_sample(INFO, 7500000, 30.0, 60.0, audio_transcode=True)
+    assert sample['projected_size'] == (2000000 + 192000) * 600 // 8
+    print("✅ 音频需要转为 AAC 时按 192 kbps 估算")
+
+    skip, saving = VideoForge._sample_skip(INFO, 'out.mp4', 600000000, 187500000, 0.1)
+    assert not skip and abs(saving - 0.6875) < 1e-9
+    skip, saving = VideoForge._sample_skip(INFO, 'out.mp4', 600000000, 570000000, 0.1)
+    assert skip and abs(saving - 0.05) < 1e-9
+    print("✅ 预计节省低于阈值时跳过")
+
+    assert VideoForge._sample_skip(dict(INFO, codec='wmv3'), 'out.mp4', 600000000, 570000000, 0.1)[0] is False
+    assert VideoForge._sample_skip(dict(INFO, codec='wmv3'), 'out.mkv', 600000000, 570000000, 0.1)[0] is True
+    print("✅ 视频流无法放入 MP4 时即使节省不多也编码")
+
+    assert VideoForge._sample_skip(INFO, 'out.mp4', 0, 570000000, 0.1) == (True, 0.0)
+
+    # 决策流程：替换样本编码，码率表判断需要编码、样本显示节省不足时换封装
+    forge = VideoForge(config={'predictor': False, 'sample_probe': True, 'min_free_space': 0},
+                       logger=logging.getLogger('test.sample'))
+    forge.sample_encode = lambda *args, **kwargs: dict(
+        VideoForge._project_sample(INFO, 28000000, 30.0, 60.0, audio_transcode=False), samples=3)
+    action, reason = forge.decide_action('in.mp4', 'out.mp4', 'h265', 'medium', info=INFO)
+    assert action == 'remux' and '节省不足' in reason
+    assert not forge._reservations
+    print(f"✅ 样本节省不足时换封装: {reason}")
+
+    # 需要缩小分辨率时不做样本编码，直接完整编码
+    calls = []
+    forge.sample_encode = lambda *args, **kwargs: calls.append(args)
+    action, reason = forge.decide_action('in.mp4', 'out.mp4', 'h265', 'medium', resolution='720p', info=INFO)
+    assert action == 'encode' and not calls, (action, reason)
+    assert not forge._reservations
+    print(f"✅ 需要缩小到 720p 时不受样本结果影响: {reason}")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_sample_probe()
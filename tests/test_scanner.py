@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试单次遍历的目录扫描（扩展名大小写、排除规则、符号链接成环）
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from videoforge import iter_video_files
+
+
+def test_iter_video_files():
+    """测试目录扫描"""
+    print("🧪 测试目录扫描\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for rel in ['a.mp4', 'b.MP4', 'c.Mkv', 'notes.txt',
+                    'sub/d.mov', 'sub/deep/e.MOV', '@eaDir/thumb.mp4', 'sub/f.part.mp4']:
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'0')
+        # 指回上层目录的符号链接，不应导致无限递归
+        os.symlink(root, root / 'sub' / 'loop')
+
+        extensions = ['.mp4', '.MP4', 'mkv', '.mov']
+        found = [p.relative_to(root).as_posix() for p in iter_video_files(root, extensions)]
+        assert sorted(found) == ['@eaDir/thumb.mp4', 'a.mp4', 'b.MP4', 'c.Mkv',
+                                 'sub/d.mov', 'sub/deep/e.MOV', 'sub/f.part.mp4'], found
+        print(f"✅ 扩展名不区分大小写且无重复: {len(found)} 个文件")
+
+        found = [p.relative_to(root).as_posix()
+                 for p in iter_video_files(root, extensions, exclude=['@eaDir', '*.part.mp4', 'sub/deep'])]
+        assert sorted(found) == ['a.mp4', 'b.MP4', 'c.Mkv', 'sub/d.mov'], found
+        print("✅ 排除规则生效")
+
+        assert list(iter_video_files(root / 'missing', extensions)) == []
+        print("✅ 目录不存在时不产出文件")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_iter_video_files()
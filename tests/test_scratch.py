@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试本地暂存区（预取、LRU 清理、空间不足时直接读取、异步移动输出）
+"""
+
+import logging
+import os
+import tempfile
+
+from videoforge import ScratchStager
+
+
+def write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'0' * size)
+
+
+def test_scratch_stager():
+    """测试暂存区容量控制与输出移动"""
+    print("🧪 测试本地暂存区\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = {}
+        for name, size in (('a.mp4', 400), ('b.mp4', 400), ('c.mp4', 400), ('huge.mp4', 5000)):
+            sources[name] = os.path.join(tmp, name)
+            write(sources[name], size)
+
+        stager = ScratchStager(os.path.join(tmp, 'scratch'), 1000, logging.getLogger('test'))
+
+        stager.prefetch(sources['a.mp4'])
+        stager.prefetch(sources['b.mp4'])
+        local_a = stager.acquire(sources['a.mp4'])
+        assert local_a != sources['a.mp4'] and os.path.basename(local_a) == 'a.mp4'
+        assert os.path.getsize(local_a) == 400
+        print("✅ 预取的输入使用本地副本（保留文件名）")
+
+        # 已预取但未使用的 b 和正在使用的 a 都不能被清理，c 放不下
+        assert stager.acquire(sources['c.mp4']) == sources['c.mp4']
+        print("✅ 空间不足时直接读取原路径")
+
+        stager.release(sources['a.mp4'])
+        local_c = stager.acquire(sources['c.mp4'])
+        assert local_c != sources['c.mp4']
+        assert not os.path.exists(local_a)
+        print("✅ 按 LRU 清理已用完的副本")
+
+        assert stager.acquire(sources['huge.mp4']) == sources['huge.mp4']
+        stager.release(sources['c.mp4'])
+
+        # 输出同样计入暂存区容量：已用完的 c 被清理，放不下时直接写目标位置
+        assert stager.output_path(os.path.join(tmp, 'out', 'big.mp4'), 2000) is None
+        local_output = stager.output_path(os.path.join(tmp, 'out', 'b.mp4'), 600)
+        assert local_output and not os.path.exists(local_c)
+        assert stager.output_path(os.path.join(tmp, 'out', 'c.mp4'), 200) is None
+        stager.discard_output(local_output)
+        assert not os.path.exists(os.path.dirname(local_output))
+        print("✅ 输出按预估大小预留空间，放不下时直接输出，未生成时归还")
+
+        local_output = stager.output_path(os.path.join(tmp, 'out', 'a.mp4'), 500)
+        write(local_output, 100)
+        os.makedirs(os.path.join(tmp, 'out'))
+        errors = []
+        stager.move_async(local_output, os.path.join(tmp, 'out', '.a.partial.mp4'),
+                          os.path.join(tmp, 'out', 'a.mp4'), errors.append)
+        # 目标目录不存在：移动失败并回调错误，暂存空间照常归还
+        failed_output = stager.output_path(os.path.join(tmp, 'missing', 'b.mp4'), 100)
+        write(failed_output, 100)
+        stager.move_async(failed_output, os.path.join(tmp, 'missing', '.b.partial.mp4'),
+                          os.path.join(tmp, 'missing', 'b.mp4'), errors.append)
+        stager.close()
+        assert errors[0] is None and errors[1]
+        assert stager._used == stager._entries.get(sources['b.mp4'], {}).get('size', 0)
+        assert os.listdir(os.path.join(tmp, 'out')) == ['a.mp4']
+        assert not os.path.exists(stager.root)
+        print("✅ 输出异步移动到目标目录，关闭后删除暂存区")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_scratch_stager()
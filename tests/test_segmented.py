@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分段并行编码：各段的线程分配与片段编码命令
+"""
+
+import logging
+import os
+
+from videoforge import VideoForge
+
+
+def test_segmented():
+    """测试任务线程预算在各段之间平均分配"""
+    print("🧪 测试分段并行编码\n" + "=" * 60)
+
+    assert VideoForge._segment_threads(8, 4) == 2
+    assert VideoForge._segment_threads(8, 3) == 2
+    assert VideoForge._segment_threads(2, 4) == 1
+    print("✅ 任务线程预算按同时编码的段数平分，至少 1 个线程")
+
+    cpus = os.cpu_count() or 1
+    assert VideoForge._segment_threads(0, 4) == max(1, cpus // 4)
+    assert VideoForge._segment_threads(0, 1) == cpus
+    print(f"✅ 未指定线程数时按 CPU 核数（{cpus}）平分")
+
+    forge = VideoForge(logger=logging.getLogger('test.segmented'))
+    cmd = forge._segment_command('src_0000.mkv', 'enc_0000.mkv', 'h265', 23, 'medium', None, 2)
+    assert cmd[:5] == ['ffmpeg', '-i', 'src_0000.mkv', '-map', '0:v:0']
+    assert cmd[cmd.index('-threads') + 1] == '2'
+    assert cmd[cmd.index('-x265-params') + 1] == 'pools=2'
+    assert cmd[-3:] == ['-an', '-y', 'enc_0000.mkv']
+    print(f"✅ 片段命令: {' '.join(cmd)}")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_segmented()
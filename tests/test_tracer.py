@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分阶段计时（Chrome trace 输出）
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from videoforge import Tracer
+
+
+def test_tracer():
+    """测试 span 记录、迭代器计时与禁用时的空操作"""
+    print("🧪 测试分阶段计时\n" + "=" * 60)
+
+    tracer = Tracer()
+    with tracer.span('probe', target='a.mp4'):
+        pass
+    assert list(tracer.iter('scan', [1, 2])) == [1, 2]
+    assert tracer._events == []
+    print("✅ 未启用时不记录")
+
+    tracer = Tracer(enabled=True)
+    with tracer.span('transcode', target='a.mp4'):
+        with tracer.span('ffmpeg'):
+            pass
+    worker = threading.Thread(target=lambda: list(tracer.iter('scan', range(3))), name='worker')
+    worker.start()
+    worker.join()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'trace.json')
+        tracer.save(path)
+        with open(path, encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+
+    spans = [e for e in events if e['ph'] == 'X']
+    assert [e['name'] for e in spans] == ['ffmpeg', 'transcode', 'scan', 'scan', 'scan', 'scan']
+    outer, inner = spans[1], spans[0]
+    assert outer['ts'] <= inner['ts'] and inner['dur'] <= outer['dur']
+    assert outer['args'] == {'target': 'a.mp4'}
+    print("✅ 嵌套 span 的时间范围正确")
+
+    names = {e['args']['name'] for e in events if e['ph'] == 'M'}
+    assert 'worker' in names
+    assert spans[-1]['args'] == {'done': True}
+    print("✅ 记录线程名与迭代器每一步")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_tracer()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试目录监听（轮询与 inotify 只产出新文件）
+"""
+
+import os
+import sys
+import tempfile
+
+from videoforge import InotifyWatcher, PollingWatcher
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'0')
+
+
+def check_watcher(watcher_class, root):
+    touch(os.path.join(root, 'old', 'existing.mp4'))
+    watcher = watcher_class(root, exclude=['@eaDir'])
+    try:
+        assert watcher.read(0.1) == []
+
+        touch(os.path.join(root, 'new.mp4'))
+        touch(os.path.join(root, 'old', 'later.mp4'))
+        touch(os.path.join(root, 'sub', 'deep', 'clip.mov'))
+        touch(os.path.join(root, '@eaDir', 'thumb.mp4'))
+
+        found = set()
+        for _ in range(5):
+            found.update(os.path.relpath(p, root) for p in watcher.read(0.2))
+        assert found == {'new.mp4', os.path.join('old', 'later.mp4'),
+                         os.path.join('sub', 'deep', 'clip.mov')}, found
+    finally:
+        watcher.close()
+
+
+def test_watchers():
+    """测试已有文件不产出、新文件和新目录中的文件被发现、排除规则生效"""
+    print("🧪 测试目录监听\n" + "=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_watcher(PollingWatcher, tmp)
+    print("✅ 轮询监听")
+
+    if sys.platform.startswith('linux'):
+        with tempfile.TemporaryDirectory() as tmp:
+            check_watcher(InotifyWatcher, tmp)
+        print("✅ inotify 监听")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_watchers()
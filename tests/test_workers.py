@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试工作线程池：顺序、并发上限、异常处理与中断
+"""
+
+import logging
+import threading
+import time
+
+from videoforge import VideoForge
+
+
+def test_run_workers():
+    """用假的任务处理函数测试 _run_workers"""
+    print("🧪 测试工作线程池\n" + "=" * 60)
+
+    forge = VideoForge(logger=logging.getLogger('test.workers'))
+
+    handled = []
+    forge._run_workers(range(5), handled.append, 1)
+    assert handled == [0, 1, 2, 3, 4]
+    print("✅ 单线程按顺序执行")
+
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+    handled = []
+
+    def slow(job):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+            handled.append(job)
+
+    forge._run_workers(range(12), slow, 3)
+    assert sorted(handled) == list(range(12))
+    assert state['peak'] == 3
+    print(f"✅ 全部任务完成，最大并发 {state['peak']}")
+
+    # 单个任务的异常不影响其他任务（单线程与多线程一致）
+    for workers in (1, 3):
+        handled = []
+
+        def failing(job):
+            if job == 2:
+                raise RuntimeError("boom")
+            handled.append(job)
+
+        forge._run_workers(range(5), failing, workers)
+        assert sorted(handled) == [0, 1, 3, 4]
+    print("✅ 任务异常记录后继续（workers=1 与 workers=3 相同）")
+
+    # 生产者中断：队列中未开始的任务被丢弃
+    started = []
+
+    def blocking(job):
+        with lock:
+            started.append(job)
+        time.sleep(0.3)
+
+    def interrupted_jobs():
+        yield from range(6)
+        raise KeyboardInterrupt
+
+    began = time.monotonic()
+    try:
+        forge._run_workers(interrupted_jobs(), blocking, 2)
+        assert False, "应抛出 KeyboardInterrupt"
+    except KeyboardInterrupt:
+        pass
+    assert len(started) == 2
+    assert time.monotonic() - began < 2
+    print(f"✅ 中断后只完成已开始的 {len(started)} 个任务，其余 4 个被丢弃")
+
+    # 中断后的新运行不受影响
+    handled = []
+    forge._run_workers(range(3), handled.append, 2)
+    assert sorted(handled) == [0, 1, 2]
+    print("✅ 中断后再次运行正常")
+
+    print(f"\n{'=' * 60}")
+    print("✅ 所有测试通过！")
+
+
+if __name__ == '__main__':
+    test_run_workers()
@@ -9,17 +9,1453 @@ License: MIT
 """
 
 import argparse
+import asyncio
+import atexit
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import functools
+import hashlib
+import itertools
 import json
 import logging
+import math
 import os
+import select
+import shutil
+import struct
+import signal
+import sqlite3
 import subprocess
 import sys
-from datetime import datetime
+import tempfile
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Callable, TypedDict
 import threading
-from queue import Queue
+from queue import Queue, Empty
 import time
+import weakref
+from collections import Counter, OrderedDict, deque
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import av  # PyAV（可选）：进程内探测，省去每个文件启动 ffprobe 的开销
+except ImportError:
+    av = None
+
+
+class VideoInfo(TypedDict, total=False):
+    """视频元数据（每个文件在一次运行中最多探测一次，随处理流程传递）"""
+    width: int
+    height: int
+    codec: str
+    bit_rate: int
+    duration: float
+    size: int
+    fps: float
+    frame_rate: Optional[str]  # 精确帧率（'30000/1001'），合并时比较并原样用于 fps 滤镜
+    pix_fmt: Optional[str]
+    time_base: Optional[str]
+    audio_codec: Optional[str]
+    audio_sample_rate: Optional[int]
+    audio_channels: Optional[int]
+
+
+def path_excluded(rel_path: str, name: str, patterns: Iterable[str]) -> bool:
+    """相对路径或文件/目录名匹配任一 glob 模式"""
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_video_files(root: str, extensions: Iterable[str],
+                     exclude: Iterable[str] = None) -> Iterable[Path]:
+    """单次遍历目录树，惰性产出匹配扩展名的视频文件
+
+    - 扩展名不区分大小写（.mp4 与 .MP4 视为同一种，不会重复产出）
+    - exclude 为 glob 模式列表，同时匹配相对路径和文件/目录名；匹配的目录整体跳过
+    - 跟随符号链接，但通过 (st_dev, st_ino) 记录已访问目录，避免链接成环
+    """
+    root = Path(root)
+    suffixes = {'.' + ext.lstrip('.').lower() for ext in extensions}
+    patterns = list(exclude or [])
+
+    try:
+        root_stat = root.stat()
+    except OSError:
+        return
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    stack = [root]
+
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            if patterns and path_excluded(rel_path, entry.name, patterns):
+                continue
+            try:
+                if entry.is_dir():
+                    st = entry.stat()
+                    key = (st.st_dev, st.st_ino)
+                    if key not in visited:
+                        visited.add(key)
+                        subdirs.append(Path(entry.path))
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in suffixes:
+                    yield Path(entry.path)
+            except OSError:
+                continue
+
+        # 逆序入栈，保证按名称顺序深度优先遍历
+        stack.extend(reversed(subdirs))
+
+
+class InotifyWatcher:
+    """基于 inotify（ctypes 调用 libc）的递归目录监听，仅 Linux
+
+    每个目录一个 watch；新建或移入的目录自动加入监听，并产出其中已有的文件。
+    事件队列溢出时 read() 返回 None，由调用方做一次全量扫描。
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root: str, exclude: Iterable[str] = None):
+        self.root = str(root)
+        self.patterns = list(exclude or [])
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self._dirs: Dict[int, str] = {}
+        self._watch_tree(self.root, collect=False)
+
+    def _watch_tree(self, directory: str, collect: bool = True) -> List[str]:
+        """监听目录及其子目录，collect 时返回其中已有的文件"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(directory):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            if rel != '.' and path_excluded(rel, os.path.basename(dirpath), self.patterns):
+                dirnames[:] = []
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch 数量已达上限（fs.inotify.max_user_watches）")
+                continue
+            self._dirs[wd] = dirpath
+            if collect:
+                files.extend(os.path.join(dirpath, name) for name in filenames)
+        return files
+
+    def read(self, timeout: float) -> Optional[List[str]]:
+        """等待最多 timeout 秒，返回新写入或移入的文件路径；事件队列溢出时返回 None"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    paths.extend(self._watch_tree(path))
+            else:
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """轮询方式的目录监听（inotify 不可用时，如 macOS、NFS/SMB 挂载）
+
+    只记录每个目录的 mtime：目录中新增、删除或重命名条目时 mtime 才会变化，
+    每轮只需 stat 所有目录，并只重新列出 mtime 变化的目录。
+    """
+
+    def __init__(self, root: str, exclude: Iterable[str] = None):
+        self.root = str(root)
+        self.patterns = list(exclude or [])
+        self._dirs: Dict[str, Tuple[int, set]] = {}
+        self._scan_dir(self.root, initial=True)
+
+    def _scan_dir(self, directory: str, initial: bool = False) -> List[str]:
+        """列出目录，返回新出现的文件（新子目录递归处理）"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            self._dirs.pop(directory, None)
+            return []
+        known = self._dirs.get(directory, (0, set()))[1]
+        names = set()
+        new_files = []
+        for entry in entries:
+            rel = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+            if path_excluded(rel, entry.name, self.patterns):
+                continue
+            names.add(entry.name)
+            try:
+                if entry.is_dir():
+                    if entry.path not in self._dirs:
+                        new_files.extend(self._scan_dir(entry.path, initial))
+                elif entry.name not in known and not initial:
+                    new_files.append(entry.path)
+            except OSError:
+                continue
+        self._dirs[directory] = (mtime, names)
+        return new_files
+
+    def read(self, timeout: float) -> Optional[List[str]]:
+        """等待 timeout 秒后检查目录变化，返回新出现的文件路径"""
+        time.sleep(timeout)
+        paths = []
+        for directory, (mtime, _) in list(self._dirs.items()):
+            try:
+                changed = os.stat(directory).st_mtime_ns != mtime
+            except OSError:
+                self._dirs.pop(directory, None)
+                continue
+            if changed:
+                paths.extend(self._scan_dir(directory))
+        return paths
+
+    def close(self):
+        pass
+
+
+def parse_ffmpeg_progress(lines: Iterable[str]) -> Iterable[Dict]:
+    """解析 ffmpeg `-progress` 输出的 key=value 块
+
+    每遇到一行 progress=continue/end 产出一个字典，数值字段已转换类型：
+    frame(int)、fps(float)、out_time(秒)、speed(倍速)、total_size(字节)、progress(str)。
+    无法解析的值（如 N/A）为 None。
+    """
+    block = {}
+    for line in lines:
+        progress = _progress_line(block, line)
+        if progress is not None:
+            yield progress
+            block = {}
+
+
+def _progress_line(block: Dict, line: str) -> Optional[Dict]:
+    """把一行 key=value 记入 block；遇到 progress 行时返回解析后的进度字典，否则返回 None"""
+    key, sep, value = line.strip().partition('=')
+    if not sep:
+        return None
+    block[key] = value.strip()
+    if key != 'progress':
+        return None
+
+    def number(name, cast=float):
+        try:
+            return cast(block.get(name, '').rstrip('x'))
+        except ValueError:
+            return None
+
+    out_time_us = number('out_time_us', int)
+    if out_time_us is None:
+        # 旧版本 ffmpeg 的 out_time_ms 实际单位也是微秒
+        out_time_us = number('out_time_ms', int)
+    return {
+        'frame': number('frame', int),
+        'fps': number('fps'),
+        'out_time': out_time_us / 1000000 if out_time_us is not None else None,
+        'speed': number('speed'),
+        'total_size': number('total_size', int),
+        'progress': block['progress'],
+    }
+
+
+def parse_rendition(spec: str) -> Dict:
+    """解析命令行中的输出配置，如 codec=h264,crf=23,resolution=1080p,output=/videos/h264
+
+    未指定的项在转码时使用主输出的参数；crf 转换为整数。格式错误时抛出 ValueError。
+    """
+    rendition = {}
+    for item in spec.split(','):
+        key, sep, value = item.partition('=')
+        key, value = key.strip(), value.strip()
+        if not sep or not value:
+            raise ValueError(f"输出配置格式错误: {item!r}（应为 key=value）")
+        if key not in VideoForge.RENDITION_KEYS:
+            raise ValueError(f"未知的输出配置项: {key}（可选 {', '.join(VideoForge.RENDITION_KEYS)}）")
+        rendition[key] = value
+    if 'crf' in rendition:
+        try:
+            rendition['crf'] = int(rendition['crf'])
+        except ValueError:
+            raise ValueError(f"CRF 必须是整数: {rendition['crf']}") from None
+    return rendition
+
+
+def parse_deadline(value: str, now: Optional[datetime] = None) -> datetime:
+    """解析截止时间：HH:MM 表示下一次到达该时刻（今天已过则为明天），也可以是完整的日期时间
+
+    带时区的日期时间（如 2026-10-18T22:00+02:00）换算为本地时间。
+    格式错误或时间已过时抛出 ValueError。
+    """
+    now = now or datetime.now()
+    value = value.strip()
+    try:
+        clock = datetime.strptime(value, '%H:%M')
+    except ValueError:
+        try:
+            deadline = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"截止时间格式错误: {value!r}（应为 HH:MM 或 YYYY-MM-DD HH:MM）") from None
+        if deadline.tzinfo is not None:
+            deadline = deadline.astimezone().replace(tzinfo=None)
+        if deadline <= now:
+            raise ValueError(f"截止时间已过: {value}")
+        return deadline
+    deadline = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if deadline <= now:
+        deadline += timedelta(days=1)
+    return deadline
+
+
+def _parse_rate(value) -> float:
+    """解析 '30000/1001' 形式的帧率；无效值（如 0/0）返回 0.0"""
+    num, _, den = str(value or '0').partition('/')
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _frame_rate(value) -> Optional[str]:
+    """规范化 '30000/1001' 形式的帧率（约分）；无效值（如 0/0）返回 None"""
+    try:
+        rate = Fraction(str(value))
+    except (ValueError, ZeroDivisionError):
+        return None
+    return f"{rate.numerator}/{rate.denominator}" if rate > 0 else None
+
+
+def _int_or(value, default=0):
+    """ffprobe 的数值字段可能缺失或为 N/A"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class FFprobeProbe:
+    """通过 ffprobe 子进程探测，只请求 VideoInfo 用到的字段
+
+    ffprobe 每次调用只能打开一个输入，多个文件由 probe_many 并发调用来批量探测。
+    """
+
+    name = 'ffprobe'
+
+    ENTRIES = ('format=duration,size'
+               ':stream=codec_type,codec_name,width,height,bit_rate,r_frame_rate,avg_frame_rate,'
+               'pix_fmt,time_base,sample_rate,channels')
+
+    def command(self, video_path: str) -> List[str]:
+        return ['ffprobe', '-v', 'error', '-show_entries', self.ENTRIES, '-of', 'json', video_path]
+
+    def probe(self, video_path: str, timeout: Optional[float] = None) -> Optional[VideoInfo]:
+        """探测一个文件；没有视频流时返回 None，失败时抛出异常"""
+        process = subprocess.Popen(self.command(video_path), stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            try:
+                # 挂起的网络挂载上进程可能无法立即退出，不要无限等待
+                process.communicate(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            raise TimeoutError(f"ffprobe 超过 {timeout} 秒未返回")
+        if process.returncode != 0:
+            raise RuntimeError(stderr.strip() or f"ffprobe 返回码 {process.returncode}")
+        return self.parse(stdout)
+
+    @staticmethod
+    def parse(stdout: str) -> Optional[VideoInfo]:
+        """解析 ffprobe JSON 输出；没有视频流时返回 None"""
+        info = json.loads(stdout)
+        streams = info.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        if not video_stream:
+            return None
+
+        fmt = info.get('format', {})
+        try:
+            duration = float(fmt.get('duration', 0))
+        except ValueError:
+            duration = 0.0
+        frame_rate = (_frame_rate(video_stream.get('r_frame_rate'))
+                      or _frame_rate(video_stream.get('avg_frame_rate')))
+        return {
+            'width': video_stream.get('width'),
+            'height': video_stream.get('height'),
+            'codec': video_stream.get('codec_name'),
+            'bit_rate': _int_or(video_stream.get('bit_rate')),
+            'duration': duration,
+            'size': _int_or(fmt.get('size')),
+            'fps': _parse_rate(frame_rate),
+            'frame_rate': frame_rate,
+            'pix_fmt': video_stream.get('pix_fmt'),
+            'time_base': video_stream.get('time_base'),
+            'audio_codec': audio_stream.get('codec_name') if audio_stream else None,
+            'audio_sample_rate': _int_or(audio_stream.get('sample_rate')) if audio_stream else None,
+            'audio_channels': audio_stream.get('channels') if audio_stream else None
+        }
+
+
+class PyAVProbe:
+    """通过 PyAV（libav）在进程内探测，只读取容器头，不启动子进程
+
+    返回的字段与 FFprobeProbe 相同：编码名使用 libav 的编码 ID 名称（hevc、h264 ...），
+    与 ffprobe 的 codec_name 一致，而不是具体解码器的名称。
+    """
+
+    name = 'pyav'
+
+    def probe(self, video_path: str, timeout: Optional[float] = None) -> Optional[VideoInfo]:
+        """探测一个文件；没有视频流时返回 None，失败时抛出异常"""
+        with av.open(video_path, timeout=timeout) as container:
+            video = next(iter(container.streams.video), None)
+            if video is None:
+                return None
+            audio = next(iter(container.streams.audio), None)
+
+            ctx = video.codec_context
+            rate = getattr(video, 'base_rate', None) or video.average_rate
+            time_base = video.time_base
+            info = {
+                'width': ctx.width,
+                'height': ctx.height,
+                'codec': self._codec_name(ctx),
+                'bit_rate': int(video.bit_rate or ctx.bit_rate or 0),
+                'duration': container.duration / av.time_base if container.duration else 0.0,
+                'size': os.path.getsize(video_path),
+                'fps': float(rate) if rate else 0.0,
+                'frame_rate': f"{rate.numerator}/{rate.denominator}" if rate else None,
+                'pix_fmt': ctx.pix_fmt,
+                'time_base': f"{time_base.numerator}/{time_base.denominator}" if time_base else None,
+                'audio_codec': None,
+                'audio_sample_rate': None,
+                'audio_channels': None
+            }
+            if audio is not None:
+                actx = audio.codec_context
+                channels = getattr(actx, 'channels', None)
+                if channels is None and actx.layout is not None:
+                    channels = actx.layout.nb_channels
+                info.update(audio_codec=self._codec_name(actx),
+                            audio_sample_rate=int(actx.sample_rate or 0),
+                            audio_channels=channels)
+            return info
+
+    @staticmethod
+    def _codec_name(ctx) -> Optional[str]:
+        codec = ctx.codec
+        return getattr(codec, 'canonical_name', None) or codec.name
+
+
+class ProbeCache:
+    """ffprobe 结果的持久化缓存（SQLite）
+
+    以 (绝对路径, 文件大小, mtime_ns) 作为键：文件大小或修改时间变化后，
+    旧记录自动失效，下次读取时重新探测并覆盖。
+    """
+
+    # 缓存内容格式变化时递增，旧缓存会被整体丢弃
+    VERSION = 4
+
+    # get() 未命中时的返回值（None 本身是合法的缓存值：文件没有视频流）
+    MISS = object()
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.VERSION:
+            self._conn.execute('DROP TABLE IF EXISTS probe_cache')
+            self._conn.execute(f'PRAGMA user_version={self.VERSION}')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS probe_cache ('
+            ' path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,'
+            ' info TEXT, updated REAL)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path: str, st: Optional[os.stat_result] = None) -> Tuple[str, int, int]:
+        path = os.path.abspath(path)
+        if st is None:
+            st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns
+
+    def get(self, path: str, st: Optional[os.stat_result] = None):
+        """读取缓存；未命中或已失效时返回 ProbeCache.MISS"""
+        try:
+            key = self._key(path, st)
+        except OSError:
+            return self.MISS
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, info FROM probe_cache WHERE path = ?', (key[0],)
+            ).fetchone()
+        if row is None or (row[0], row[1]) != key[1:]:
+            return self.MISS
+        return json.loads(row[2])
+
+    def get_many(self, paths: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """批量读取缓存，只返回仍然有效的记录（键为传入的路径）"""
+        keys = {}
+        for path in paths:
+            try:
+                keys[path] = self._key(path)
+            except OSError:
+                continue
+
+        rows = {}
+        abs_paths = [key[0] for key in keys.values()]
+        with self._lock:
+            # SQLite 默认单条语句最多 999 个参数
+            for i in range(0, len(abs_paths), 500):
+                chunk = abs_paths[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in self._conn.execute(
+                    f'SELECT path, size, mtime_ns, info FROM probe_cache WHERE path IN ({placeholders})',
+                    chunk
+                ):
+                    rows[row[0]] = row[1:]
+
+        result = {}
+        for path, key in keys.items():
+            row = rows.get(key[0])
+            if row is not None and (row[0], row[1]) == key[1:]:
+                result[path] = json.loads(row[2])
+        return result
+
+    def put(self, path: str, info: Optional[Dict], st: Optional[os.stat_result] = None):
+        """写入（或覆盖）一条缓存记录"""
+        try:
+            key = self._key(path, st)
+        except OSError:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO probe_cache (path, size, mtime_ns, info, updated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (*key, json.dumps(info), time.time())
+            )
+            self._conn.commit()
+
+    def invalidate(self, path: str):
+        """删除指定文件的缓存记录"""
+        with self._lock:
+            self._conn.execute('DELETE FROM probe_cache WHERE path = ?', (os.path.abspath(path),))
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """清理源文件已不存在或已变化的记录，返回删除数量"""
+        with self._lock:
+            rows = self._conn.execute('SELECT path, size, mtime_ns FROM probe_cache').fetchall()
+        stale = []
+        for path, size, mtime_ns in rows:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append((path,))
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                stale.append((path,))
+        with self._lock:
+            self._conn.executemany('DELETE FROM probe_cache WHERE path = ?', stale)
+            self._conn.commit()
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BitratePredictor:
+    """从已完成的转码结果中学习输出码率（SQLite）
+
+    每次完整编码结束后记录 (源编码, 源码率, 分辨率, 帧率, CRF, 速度预设) → 输出视频码率，
+    并按分桶增量维护均值和方差（Welford 算法）。预测时先查细分桶，样本不足时退回
+    只按目标编码/CRF/预设/分辨率划分的粗分桶，仍不足则返回 None（由调用方使用码率表）。
+    预测区间是下一个文件输出码率的 95% 预测区间（t 分布），而不是均值的置信区间。
+    """
+
+    # t 分布的 97.5% 分位数（自由度 1-30）
+    T_975 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+             2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+             2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+    @classmethod
+    def t_975(cls, df: int) -> float:
+        """双侧 95% 区间的 t 值；自由度超过 30 时用 1.96 + 2.5/df 近似"""
+        if df <= len(cls.T_975):
+            return cls.T_975[df - 1]
+        return 1.96 + 2.5 / df
+
+    def __init__(self, db_path: str, min_samples: int = 5):
+        self.db_path = str(db_path)
+        self.min_samples = min_samples
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS samples ('
+            ' ts REAL, source_codec TEXT, source_bitrate INTEGER, width INTEGER, height INTEGER,'
+            ' fps REAL, codec TEXT, crf INTEGER, preset TEXT, output_short_side INTEGER,'
+            ' duration REAL, output_bitrate REAL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            ' bucket TEXT PRIMARY KEY, n INTEGER, mean REAL, m2 REAL)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def bucket_keys(info: Dict, codec: str, crf: int, preset: str, output_short_side: int) -> List[str]:
+        """返回从细到粗的分桶键"""
+        tier = next((t for t in (2160, 1440, 1080, 720) if output_short_side >= t), 480)
+        fps = 60 if (info.get('fps') or 0) > 31 else 30
+        bitrate = info.get('bit_rate') or 0
+        # 源码率按半个倍频程分桶（…, 2, 2.8, 4, 5.7, 8 Mbps, …）
+        bitrate_bucket = round(math.log2(bitrate / 1000000) * 2) / 2 if bitrate > 0 else 'na'
+        coarse = f"{codec}|crf{crf}|{preset}|{tier}"
+        fine = f"{coarse}|{(info.get('codec') or '').lower()}|{fps}fps|br{bitrate_bucket}"
+        return [fine, coarse]
+
+    def record(self, info: Dict, codec: str, crf: int, preset: str,
+               output_short_side: int, output_bitrate: float):
+        """记录一次完成的编码结果"""
+        keys = self.bucket_keys(info, codec, crf, preset, output_short_side)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), info.get('codec'), info.get('bit_rate'), info.get('width'),
+                 info.get('height'), info.get('fps'), codec, crf, preset, output_short_side,
+                 info.get('duration'), output_bitrate)
+            )
+            for key in keys:
+                row = self._conn.execute(
+                    'SELECT n, mean, m2 FROM buckets WHERE bucket = ?', (key,)
+                ).fetchone()
+                n, mean, m2 = row if row else (0, 0.0, 0.0)
+                n += 1
+                delta = output_bitrate - mean
+                mean += delta / n
+                m2 += delta * (output_bitrate - mean)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO buckets (bucket, n, mean, m2) VALUES (?, ?, ?, ?)',
+                    (key, n, mean, m2)
+                )
+            self._conn.commit()
+
+    def predict(self, info: Dict, codec: str, crf: int, preset: str,
+                output_short_side: int) -> Optional[Dict]:
+        """预测输出视频码率
+
+        Returns:
+            {'bitrate', 'low', 'high', 'samples', 'bucket'}；low/high 为 95% 预测区间，
+            样本不足时返回 None
+        """
+        for key in self.bucket_keys(info, codec, crf, preset, output_short_side):
+            with self._lock:
+                row = self._conn.execute(
+                    'SELECT n, mean, m2 FROM buckets WHERE bucket = ?', (key,)
+                ).fetchone()
+            if not row or row[0] < max(2, self.min_samples):
+                continue
+            n, mean, m2 = row
+            # 单个新样本的预测区间：mean ± t·s·√(1 + 1/n)
+            half_width = self.t_975(n - 1) * math.sqrt(m2 / (n - 1)) * math.sqrt(1 + 1 / n)
+            return {
+                'bitrate': mean,
+                'low': max(0.0, mean - half_width),
+                'high': mean + half_width,
+                'samples': n,
+                'bucket': key
+            }
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ContentIndex:
+    """内容指纹 → 已生成输出的索引（SQLite）
+
+    指纹由文件大小和开头、中间、结尾各一块数据的哈希组成，只读取三小块数据；
+    同一内容被复制、改名或移动到其他目录后仍能识别。每条输出记录以 (指纹, 转码参数) 为键，
+    输出文件被删除或修改（大小、mtime 变化）后记录自动失效。源文件的指纹按
+    (路径, 大小, mtime_ns) 缓存，重复运行时不必重新读取。
+    """
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sources ('
+            ' path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, fingerprint TEXT)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            ' fingerprint TEXT, params TEXT, source TEXT, output TEXT,'
+            ' size INTEGER, mtime_ns INTEGER, ts REAL, PRIMARY KEY (fingerprint, params))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outputs_output ON outputs (output)')
+        self._conn.commit()
+
+    @classmethod
+    def fingerprint(cls, path: str, size: Optional[int] = None) -> str:
+        """文件大小 + 开头/中间/结尾各 BLOCK_SIZE 字节的 BLAKE2b 哈希"""
+        if size is None:
+            size = os.path.getsize(path)
+        digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+        offsets = sorted({0, max(0, size // 2 - cls.BLOCK_SIZE // 2), max(0, size - cls.BLOCK_SIZE)})
+        with open(path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                digest.update(f.read(cls.BLOCK_SIZE))
+        return f"{size}-{digest.hexdigest()}"
+
+    def source_fingerprint(self, path: str) -> str:
+        """源文件的指纹（文件未变化时使用缓存）"""
+        key = os.path.abspath(path)
+        st = os.stat(key)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fingerprint FROM sources WHERE path = ? AND size = ? AND mtime_ns = ?',
+                (key, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+        fingerprint = self.fingerprint(key, st.st_size)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                               (key, st.st_size, st.st_mtime_ns, fingerprint))
+            self._conn.commit()
+        return fingerprint
+
+    def lookup(self, fingerprint: str, params: str) -> Optional[Dict]:
+        """相同内容、相同参数的已有输出
+
+        Returns:
+            {'source', 'output'}；没有记录或输出已被删除/修改时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT source, output, size, mtime_ns FROM outputs WHERE fingerprint = ? AND params = ?',
+                (fingerprint, params)
+            ).fetchone()
+        if not row:
+            return None
+        source, output, size, mtime_ns = row
+        try:
+            st = os.stat(output)
+        except OSError:
+            st = None
+        if st is None or (size is not None and (st.st_size, st.st_mtime_ns) != (size, mtime_ns)):
+            with self._lock:
+                self._conn.execute('DELETE FROM outputs WHERE fingerprint = ? AND params = ?',
+                                   (fingerprint, params))
+                self._conn.commit()
+            return None
+        if size is None:
+            # 记录时输出还在从暂存区移动，首次使用时补上大小和 mtime
+            with self._lock:
+                self._conn.execute(
+                    'UPDATE outputs SET size = ?, mtime_ns = ? WHERE fingerprint = ? AND params = ?',
+                    (st.st_size, st.st_mtime_ns, fingerprint, params)
+                )
+                self._conn.commit()
+        return {'source': source, 'output': output}
+
+    def record(self, fingerprint: str, params: str, source: str, output: str):
+        """记录生成的输出（同一路径上的旧记录失效：目标已被新内容覆盖）"""
+        output = os.path.abspath(output)
+        try:
+            st = os.stat(output)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        with self._lock:
+            self._conn.execute('DELETE FROM outputs WHERE output = ?', (output,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (fingerprint, params, os.path.abspath(source), output, size, mtime_ns, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobJournal:
+    """批量转码任务日志（追加写入的 JSON Lines）
+
+    每行记录一个文件的状态变化：pending、running、done、skipped、failed。
+    以最后一条记录为准；done/skipped 记录同时保存源文件大小和 mtime_ns，
+    源文件变化后不再视为已完成。进程崩溃时最后一行可能不完整，读取时忽略。
+    """
+
+    STATES = ('pending', 'running', 'done', 'skipped', 'failed')
+    FINISHED = ('done', 'skipped')
+
+    def __init__(self, journal_path: str):
+        self.journal_path = str(journal_path)
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+        self._load()
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的行
+                if isinstance(record, dict) and record.get('path'):
+                    self._states[record['path']] = record
+
+    def compact(self):
+        """只保留每个文件的最后一条记录，原子地重写日志文件"""
+        with self._lock:
+            self._file.close()
+            tmp_path = f"{self.journal_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in self._states.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def record(self, path: str, state: str, **fields):
+        """追加一条状态记录；终态（done/skipped/failed）会立即 fsync"""
+        assert state in self.STATES, state
+        path = os.path.abspath(path)
+        record = {'path': path, 'state': state, 'ts': time.time()}
+        if state in self.FINISHED:
+            try:
+                st = os.stat(path)
+                record['size'] = st.st_size
+                record['mtime_ns'] = st.st_mtime_ns
+            except OSError:
+                pass
+        record.update(fields)
+        with self._lock:
+            self._states[path] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            if state not in ('pending', 'running'):
+                os.fsync(self._file.fileno())
+
+    def state_of(self, path: str) -> Optional[Dict]:
+        """返回文件的最后一条记录"""
+        with self._lock:
+            return self._states.get(os.path.abspath(path))
+
+    def is_finished(self, path: str, st: Optional[os.stat_result] = None) -> bool:
+        """文件上次已完成（done/skipped），且源文件之后没有变化"""
+        record = self.state_of(path)
+        if not record or record['state'] not in self.FINISHED:
+            return False
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return False
+        if (record.get('size'), record.get('mtime_ns')) != (st.st_size, st.st_mtime_ns):
+            return False
+        # done 的输出文件必须仍然存在
+        output = record.get('output')
+        return record['state'] != 'done' or not output or os.path.exists(output)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ScratchStager:
+    """网络存储的本地暂存区：后台预取输入，输出先写本地再异步移动到目标位置
+
+    暂存区总大小受 max_bytes 限制，输入副本和输出都计入。已用完的输入副本保留到空间不足时，
+    按最近最少使用（LRU）顺序删除；已预取但还未使用、或正在使用的副本不会被删除。
+    放不下的输入不暂存，直接读原路径；放不下的输出直接写目标位置。
+    预取和移动各用一个后台线程，避免多个大文件同时争抢网络带宽。
+    """
+
+    def __init__(self, scratch_dir: str, max_bytes: int, logger: logging.Logger):
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix='videoforge-scratch-', dir=scratch_dir)
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self._lock = threading.Lock()
+        # 源路径 -> {'local', 'size', 'pins', 'pending', 'future'}，按最近使用时间排序
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._used = 0
+        # 本地输出路径 -> 预留的字节数（输出写完交给移动线程前）
+        self._outputs: Dict[str, int] = {}
+        self._names = itertools.count()
+        self._copier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='VideoForge-prefetch')
+        self._mover = ThreadPoolExecutor(max_workers=1, thread_name_prefix='VideoForge-move')
+        self._moves = []
+
+    def _local_path(self, kind: str, path: str) -> str:
+        """每个文件一个编号子目录，保留原文件名（日志和进度中显示的仍是原名）"""
+        directory = os.path.join(self.root, kind, f"{next(self._names):06d}")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, os.path.basename(path))
+
+    def _reserve(self, size: int) -> bool:
+        """按 LRU 删除未使用的副本直到放得下 size 字节（调用方持有 _lock）"""
+        for src in list(self._entries):
+            if self._used + size <= self.max_bytes:
+                break
+            entry = self._entries[src]
+            if entry['pins'] == 0:
+                self._discard(src)
+        return self._used + size <= self.max_bytes
+
+    def _discard(self, src: str):
+        entry = self._entries.pop(src)
+        self._used -= entry['size']
+        shutil.rmtree(os.path.dirname(entry['local']), ignore_errors=True)
+
+    def _add(self, src: str, pending: bool) -> Optional[Dict]:
+        """登记一个待复制的副本并预留空间，放不下时返回 None（调用方持有 _lock）"""
+        try:
+            size = os.path.getsize(src)
+        except OSError:
+            return None
+        if not self._reserve(size):
+            return None
+        entry = {'local': self._local_path('in', src), 'size': size, 'pins': 1,
+                 'pending': pending, 'future': None}
+        self._entries[src] = entry
+        self._used += size
+        return entry
+
+    def prefetch(self, src: str):
+        """后台复制输入（已暂存或空间不足时忽略）"""
+        with self._lock:
+            if src in self._entries:
+                return
+            entry = self._add(src, pending=True)
+            if entry:
+                entry['future'] = self._copier.submit(shutil.copyfile, src, entry['local'])
+
+    def acquire(self, src: str) -> str:
+        """返回可供 ffmpeg 读取的路径：预取完成的本地副本，或同步复制；放不下时返回原路径"""
+        with self._lock:
+            entry = self._entries.get(src)
+            if entry is None:
+                entry = self._add(src, pending=False)
+                if entry is None:
+                    self.logger.info(f"📥 暂存区空间不足，直接读取: {os.path.basename(src)}")
+                    return src
+                entry['future'] = self._copier.submit(shutil.copyfile, src, entry['local'])
+            elif entry['pending']:
+                entry['pending'] = False  # 预取时已持有引用
+            else:
+                entry['pins'] += 1
+            self._entries.move_to_end(src)
+            future = entry['future']
+        try:
+            future.result()
+        except OSError as e:
+            self.logger.warning(f"⚠️  暂存输入失败 {src}: {e}，直接读取")
+            with self._lock:
+                if self._entries.get(src) is entry:
+                    self._discard(src)
+            return src
+        return entry['local']
+
+    def release(self, src: str):
+        """输入用完，副本留在暂存区等待 LRU 清理"""
+        with self._lock:
+            entry = self._entries.get(src)
+            if entry:
+                entry['pins'] = max(0, entry['pins'] - 1)
+                self._entries.move_to_end(src)
+
+    def output_path(self, dst: str, size: int = 0) -> Optional[str]:
+        """本地输出路径（保留扩展名，ffmpeg 据此选择容器），按预估大小 size 预留空间
+
+        放不下时返回 None，由调用方直接写目标位置。
+        """
+        with self._lock:
+            if not self._reserve(size):
+                self.logger.info(f"📤 暂存区空间不足，直接输出: {os.path.basename(dst)}")
+                return None
+            local = self._local_path('out', dst)
+            self._outputs[local] = size
+            self._used += size
+        return local
+
+    def discard_output(self, local: str):
+        """输出没有生成（失败或跳过）：删除本地目录并归还预留的空间"""
+        with self._lock:
+            self._used -= self._outputs.pop(local, 0)
+        shutil.rmtree(os.path.dirname(local), ignore_errors=True)
+
+    def move_async(self, local: str, partial: str, dst: str, callback: Callable[[Optional[str]], None]):
+        """后台把本地输出移动到目标目录：先写目标目录下的临时文件，再原子重命名
+
+        完成后调用 callback(error)，成功时 error 为 None。
+        """
+        size = os.path.getsize(local)
+        with self._lock:
+            # 预留按预估大小，改为实际大小直到移动完成
+            self._used += size - self._outputs.pop(local, 0)
+
+        def move():
+            error = None
+            try:
+                shutil.move(local, partial)
+                os.replace(partial, dst)
+            except OSError as e:
+                error = str(e)
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+            shutil.rmtree(os.path.dirname(local), ignore_errors=True)
+            with self._lock:
+                self._used -= size
+            callback(error)
+
+        self._moves.append(self._mover.submit(move))
+
+    def close(self):
+        """等待所有移动完成，删除暂存区"""
+        for future in self._moves:
+            future.result()
+        self._copier.shutdown(wait=True, cancel_futures=True)
+        self._mover.shutdown(wait=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class DeadlinePlanner:
+    """截止时间模式：按实测编码速度为后续任务选择编码速度预设
+
+    工作量按时长 × 像素数计（与 LPT 调度相同）。每个完整编码的任务结束后，用实际速度
+    （工作量 / ffmpeg 编码耗时，不含等待资源、暂存和移动）更新该预设的速度，并折算为
+    medium 下的速度（均为指数滑动平均）。跳过、换封装或失败的任务结束时只移除其工作量。
+    每个任务开始时，从最慢（压缩率最好）到最快依次估算剩余工作量的完成时间，
+    选择能在截止时间前（留出 margin 比例的余量）完成的最慢预设；都来不及时使用最快的预设。
+    还没有任何实测数据时使用基准预设。
+    """
+
+    PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow')
+
+    # 各预设相对 medium 的大致编码速度（x264 与 x265 量级相近），没有实测数据的预设据此换算
+    SPEED = {'ultrafast': 8.0, 'superfast': 5.5, 'veryfast': 4.0, 'faster': 2.5, 'fast': 1.6,
+             'medium': 1.0, 'slow': 0.6, 'slower': 0.3, 'veryslow': 0.12}
+
+    def __init__(self, deadline: datetime, costs: Dict[str, float], workers: int,
+                 base_preset: str = 'medium', presets: Iterable[str] = None,
+                 durations: Dict[str, float] = None, margin: float = 0.1, smoothing: float = 0.3):
+        self.deadline = deadline
+        # 截止时间换算为单调时钟，之后的计算不受系统时间调整影响
+        self._deadline_at = time.monotonic() + (deadline - datetime.now()).total_seconds()
+        self.workers = max(1, workers)
+        self.base_preset = base_preset if base_preset in self.SPEED else 'medium'
+        allowed = set(presets or self.PRESETS)
+        self.presets = [p for p in self.PRESETS if p in allowed] or [self.base_preset]
+        self.margin = margin
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._pending = dict(costs)
+        self._durations = dict(durations or {})
+        # 路径 -> {'cost', 'preset', 'started'}
+        self._running: Dict[str, Dict] = {}
+        self._rates: Dict[str, float] = {}
+        self._normalized: Optional[float] = None
+
+    def _rate(self, preset: str) -> Optional[float]:
+        """单个任务在 preset 下的速度（工作量/秒），没有实测数据时返回 None"""
+        if preset in self._rates:
+            return self._rates[preset]
+        if self._normalized is None:
+            return None
+        return self._normalized * self.SPEED.get(preset, 1.0)
+
+    def _seconds_needed(self, preset: str, now: float) -> Optional[float]:
+        """未开始的任务都用 preset 时，完成剩余工作量还需要的秒数"""
+        rate = self._rate(preset)
+        if not rate:
+            return None
+        work_seconds = sum(self._pending.values()) / rate
+        for job in self._running.values():
+            job_rate = self._rate(job['preset']) or rate
+            work_seconds += max(0.0, job['cost'] / job_rate - (now - job['started']))
+        parallel = max(1, min(self.workers, len(self._pending) + len(self._running)))
+        return work_seconds / parallel
+
+    def _select(self, now: float) -> str:
+        if self._normalized is None:
+            return self.base_preset
+        available = (self._deadline_at - now) * (1 - self.margin)
+        for preset in reversed(self.presets):
+            if self._seconds_needed(preset, now) <= available:
+                return preset
+        return self.presets[0]
+
+    def start(self, path: str, now: Optional[float] = None) -> str:
+        """任务开始，返回它使用的预设"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            preset = self._select(now)
+            self._running[path] = {'cost': self._pending.pop(path, 0.0), 'preset': preset, 'started': now}
+            return preset
+
+    def complete(self, path: str, encode_seconds: Optional[float] = None,
+                 now: Optional[float] = None) -> Dict:
+        """任务结束，从剩余工作量中移除
+
+        encode_seconds 为完整编码成功时 ffmpeg 的编码耗时，用于更新速度；其他任务（跳过、换封装、
+        复用、失败）传 None，工作量按 0 计，不影响速度估计。
+
+        Returns:
+            {'preset': 该任务使用的预设, 'next': 下一个任务的预设, 'finish': 预计完成时间（没有实测数据时为 None）,
+             'late': 是否预计超过截止时间, 'remaining_files', 'remaining_duration'}
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            job = self._running.pop(path, None)
+            self._durations.pop(path, None)
+            if job and encode_seconds and encode_seconds > 0 and job['cost'] > 0:
+                rate = job['cost'] / encode_seconds
+                preset = job['preset']
+                previous = self._rates.get(preset)
+                self._rates[preset] = rate if previous is None else previous + self.smoothing * (rate - previous)
+                normalized = rate / self.SPEED.get(preset, 1.0)
+                self._normalized = (normalized if self._normalized is None else
+                                    self._normalized + self.smoothing * (normalized - self._normalized))
+            next_preset = self._select(now)
+            seconds = self._seconds_needed(next_preset, now)
+            finish = None
+            if seconds is not None:
+                finish = self.deadline + timedelta(seconds=now + seconds - self._deadline_at)
+            return {
+                'preset': job['preset'] if job else None,
+                'next': next_preset,
+                'finish': finish,
+                'late': finish is not None and finish > self.deadline,
+                'remaining_files': len(self._pending) + len(self._running),
+                'remaining_duration': sum(self._durations.values())
+            }
+
+
+class Metrics:
+    """进程内指标：计数器、仪表和直方图，可导出为 Prometheus 文本格式和 JSON
+
+    指标需先用 describe() 声明；标签以关键字参数传入。另外保留最近若干个文件的处理记录，
+    只出现在 JSON 快照中。
+    """
+
+    KINDS = ('counter', 'gauge', 'histogram')
+
+    def __init__(self, prefix: str = 'videoforge', recent: int = 200):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Dict] = {}
+        self._values: Dict[str, Dict[Tuple, object]] = {}
+        self.recent_files = deque(maxlen=recent)
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Iterable[float] = None):
+        assert kind in self.KINDS, kind
+        self._meta[name] = {'kind': kind, 'help': help_text,
+                            'buckets': sorted(buckets) if buckets else None}
+        self._values.setdefault(name, {})
+
+    @staticmethod
+    def _labels(labels: Dict) -> Tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][self._labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._labels(labels)
+        buckets = self._meta[name]['buckets']
+        with self._lock:
+            series = self._values[name]
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def record_file(self, **fields):
+        with self._lock:
+            self.recent_files.append(fields)
+
+    @staticmethod
+    def _format_bound(bound: float) -> str:
+        return str(int(bound)) if float(bound).is_integer() else f'{bound:g}'
+
+    @staticmethod
+    def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+        pairs = key + extra
+        if not pairs:
+            return ''
+        escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（node_exporter textfile collector）"""
+        lines = []
+        with self._lock:
+            for name, meta in self._meta.items():
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full} {meta['help']}")
+                lines.append(f"# TYPE {full} {meta['kind']}")
+                for key, value in sorted(self._values[name].items()):
+                    if meta['kind'] != 'histogram':
+                        lines.append(f"{full}{self._format_labels(key)} {value:g}")
+                        continue
+                    for bound, count in zip(meta['buckets'], value['buckets']):
+                        lines.append(f"{full}_bucket{self._format_labels(key, (('le', self._format_bound(bound)),))} {count}")
+                    lines.append(f"{full}_bucket{self._format_labels(key, (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{full}_sum{self._format_labels(key)} {value['sum']:g}")
+                    lines.append(f"{full}_count{self._format_labels(key)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict:
+        """JSON 快照：{指标名: [{'labels': {...}, 'value' 或直方图数据}], 'recent_files': [...]}"""
+        result = {}
+        with self._lock:
+            for name, meta in self._meta.items():
+                entries = []
+                for key, value in sorted(self._values[name].items()):
+                    entry = {'labels': dict(key)}
+                    if meta['kind'] == 'histogram':
+                        entry.update(buckets=dict(zip((self._format_bound(b) for b in meta['buckets']), value['buckets'])),
+                                     sum=value['sum'], count=value['count'])
+                    else:
+                        entry['value'] = value
+                    entries.append(entry)
+                result[name] = {'type': meta['kind'], 'help': meta['help'], 'series': entries}
+            result['recent_files'] = list(self.recent_files)
+        return result
+
+
+class Tracer:
+    """分阶段计时（span），输出 Chrome trace 格式（chrome://tracing、Perfetto 可直接打开）
+
+    未启用时 span() 返回共享的空上下文，iter() 原样返回迭代器，几乎没有开销。
+    """
+
+    _NULL_SPAN = contextlib.nullcontext()
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._events: List[Dict] = []
+        self._threads: Dict[int, str] = {}
+
+    def _record(self, name: str, start_ns: int, end_ns: int, args: Dict):
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': 'videoforge',
+            'ph': 'X',
+            'ts': (start_ns - self._origin) / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': thread.ident
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+            self._threads.setdefault(thread.ident, thread.name)
+
+    @contextlib.contextmanager
+    def _span(self, name: str, args: Dict):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter_ns(), args)
+
+    def span(self, name: str, **args):
+        """记录一个阶段：with tracer.span('probe', path=...):"""
+        if not self.enabled:
+            return self._NULL_SPAN
+        return self._span(name, {k: v for k, v in args.items() if v is not None})
+
+    def iter(self, name: str, iterable: Iterable) -> Iterable:
+        """把迭代器每次取下一个元素的耗时记录为一个 span（例如目录扫描）"""
+        if not self.enabled:
+            return iterable
+        return self._iter(name, iterable)
+
+    def _iter(self, name: str, iterable: Iterable) -> Iterable:
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter_ns()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._record(name, start, time.perf_counter_ns(), {'done': True})
+                return
+            self._record(name, start, time.perf_counter_ns(), {})
+            yield item
+
+    def save(self, path: str):
+        """写出 Chrome trace JSON（包含线程名）"""
+        with self._lock:
+            metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                         'args': {'name': name}} for tid, name in self._threads.items()]
+            trace = {'traceEvents': metadata + self._events, 'displayTimeUnit': 'ms'}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+
+
+def traced(name: str, target_arg: int = 0):
+    """VideoForge 方法装饰器：启用追踪时把调用记录为一个 span，第 target_arg 个参数（路径）记为 target"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not self.tracer.enabled:
+                return func(self, *args, **kwargs)
+            target = str(args[target_arg]) if len(args) > target_arg else None
+            with self.tracer.span(name, target=target):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# setup_logging() / 外部程序检查在整个进程中共享
+_logging_lock = threading.Lock()
+_tool_check_lock = threading.Lock()
+_tool_checks: Dict[Tuple, bool] = {}
+
+
+def setup_logging(log_dir: str = None, level: int = logging.INFO) -> logging.Logger:
+    """配置 'VideoForge' 日志（按天的日志文件、错误日志和控制台输出）
+    
+    整个进程只配置一次：重复调用（如每个请求创建一个 VideoForge 实例）直接返回同一个 logger，
+    不会重复添加处理器或打开文件。日志目录默认为程序目录下的 logs/。
+    """
+    logger = logging.getLogger('VideoForge')
+    with _logging_lock:
+        if getattr(logger, '_videoforge_configured', False):
+            return logger
+        
+        log_dir = Path(log_dir) if log_dir else Path(__file__).resolve().parent / 'logs'
+        log_dir.mkdir(parents=True, exist_ok=True)
+        log_file = log_dir / f"videoforge_{datetime.now().strftime('%Y%m%d')}.log"
+        error_log = log_dir / "errors.log"
+        
+        # 配置日志格式
+        formatter = logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        logger.setLevel(level)
+        
+        # 文件处理器
+        fh = logging.FileHandler(log_file, encoding='utf-8')
+        fh.setLevel(level)
+        fh.setFormatter(formatter)
+        
+        # 错误日志处理器
+        eh = logging.FileHandler(error_log, encoding='utf-8')
+        eh.setLevel(logging.ERROR)
+        eh.setFormatter(formatter)
+        
+        # 控制台处理器
+        ch = logging.StreamHandler()
+        ch.setLevel(level)
+        ch.setFormatter(formatter)
+        
+        logger.addHandler(fh)
+        logger.addHandler(eh)
+        logger.addHandler(ch)
+        logger._videoforge_configured = True
+    return logger
+
+
+@functools.lru_cache(maxsize=16)
+def _read_config_file(path: str, mtime_ns: int) -> str:
+    """读取配置文件内容（按路径和 mtime 缓存，文件修改后重新读取）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 
 class VideoForge:
@@ -35,21 +1471,116 @@ class VideoForge:
     # 支持的视频扩展名
     DEFAULT_EXTENSIONS = ['.mp4', '.MP4', '.avi', '.AVI', '.mov', '.MOV', '.mkv', '.MKV']
     
-    def __init__(self, config_file: Optional[str] = None):
-        """初始化 VideoForge"""
-        self.config = self._load_config(config_file)
-        self._setup_logging()
+    # 可直接复制进 MP4/MOV 容器的音频编码，其余音频需要转为 AAC
+    MP4_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac'}
+    
+    # 可直接复制进 MP4/MOV 容器的视频编码
+    MP4_VIDEO_CODECS = {'h264', 'hevc', 'h265', 'av1', 'vp9', 'mpeg4', 'mpeg2video', 'mjpeg'}
+    
+    # 处理方式：跳过、仅换封装、仅转音频、完整视频编码
+    ACTIONS = ('skip', 'remux', 'audio', 'encode')
+    ACTION_NAMES = {'skip': '跳过', 'remux': '换封装', 'audio': '仅转音频', 'encode': '完整编码'}
+    
+    # 多输出（rendition）配置项，未指定的项使用主输出的参数
+    RENDITION_KEYS = ('name', 'codec', 'quality', 'preset', 'crf', 'resolution', 'output')
+    
+    # 批量转码任务日志文件名（位于输出目录）
+    JOURNAL_NAME = '.videoforge_journal.jsonl'
+    
+    # 刚启动的任务内存占用还未反映到 MemAvailable 中，这段时间内按预留值扣除（秒）
+    MEMORY_SETTLE_SECONDS = 15
+    
+    def __init__(self, config_file: Optional[str] = None, config: Optional[Dict] = None,
+                 logger: Optional[logging.Logger] = None):
+        """初始化 VideoForge
+        
+        构造本身不读文件、不配置日志、不启动子进程，可以在长期运行的服务中按需创建多个实例：
+        配置在首次访问 config 时加载，日志在首次使用 logger 时通过 setup_logging() 配置（进程内只配置一次）。
+        
+        Args:
+            config_file: JSON 配置文件路径
+            config: 覆盖配置项的字典（优先于配置文件）
+            logger: 使用调用方的 logger（不创建 logs/ 目录，也不添加任何处理器）
+        """
+        self._config_file = config_file
+        self._config_overrides = dict(config or {})
+        self._config: Optional[Dict] = None
+        self._logger = logger
+        self._init_lock = threading.Lock()
+        # 分阶段计时（enable_tracing() 开启）
+        self.tracer = Tracer()
         self.stats = {
             'total_files': 0,
             'processed': 0,
             'skipped': 0,
             'skipped_smart': 0,  # 智能跳过的数量（码率已足够低）
             'skipped_larger': 0,  # 预估转码后会变大而跳过的数量
+            'skipped_reused': 0,  # 内容相同、直接复用已有输出的数量
             'failed': 0,
             'total_size_before': 0,
-            'total_size_after': 0
+            'total_size_after': 0,
+            'actions': {action: 0 for action in self.ACTIONS},  # 各处理方式的文件数
+            'admission_waits': 0,  # 因磁盘/内存/负载不足而等待的任务数
+            'admission_rejected': 0,  # 磁盘空间不足而放弃的任务数
+            'load_pauses': 0,  # 因负载过高被暂停（SIGSTOP）的次数
+            'renditions': {}  # 多输出时各输出的统计（按输出名称）
         }
+        # 多个工作线程会同时更新统计信息
+        self._stats_lock = threading.Lock()
+        # ffprobe 结果缓存和码率预测模型（首次使用时打开）
+        self._probe_cache = None
+        self._predictor = None
+        self._content_index = None
+        self._store_lock = threading.Lock()
+        # 转码进度：回调列表、正在运行的任务及状态文件写入时间
+        self._progress_callbacks: List[Callable[[Dict], None]] = []
+        self._active_jobs: Dict[str, Dict] = {}
+        self._progress_lock = threading.Lock()
+        self._status_written = 0.0
+        # 批量任务的工作量统计（按时长 × 像素数），用于估算整批剩余时间
+        self._batch: Optional[Dict] = None
+        # 资源准入控制：各任务预留的磁盘/内存、运行中的 ffmpeg 进程、因负载暂停的进程
+        self._admission = threading.Condition()
+        self._reservations: Dict[str, Dict] = {}
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._paused: List[int] = []
+        # 批量任务被中断（Ctrl+C 等）后不再启动新的 ffmpeg
+        self._stopping = threading.Event()
+        self._load_monitor: Optional[threading.Thread] = None
+        # 指标（定期写出为 Prometheus 文本文件和 JSON 快照）
+        self.metrics = self._create_metrics()
+        self._metrics_written = 0.0
+        self._metrics_lock = threading.Lock()
+        self._probe_backends = {}
+        # asyncio API 的并发上限（每个事件循环一组信号量）
+        self._async_semaphores = weakref.WeakKeyDictionary()
         
+    @property
+    def config(self) -> Dict:
+        """配置字典（首次访问时加载，之后可以直接修改）"""
+        if self._config is None:
+            with self._init_lock:
+                if self._config is None:
+                    config = self._load_config(self._config_file)
+                    config.update(self._config_overrides)
+                    self._config = config
+        return self._config
+    
+    @config.setter
+    def config(self, value: Dict):
+        self._config = value
+    
+    @property
+    def logger(self) -> logging.Logger:
+        """日志记录器（未注入时首次使用才调用 setup_logging()）"""
+        if self._logger is None:
+            self._logger = setup_logging()
+        return self._logger
+    
+    @logger.setter
+    def logger(self, value: logging.Logger):
+        self._logger = value
+    
     def _load_config(self, config_file: Optional[str]) -> Dict:
         """加载配置文件"""
         default_config = {
@@ -58,101 +1589,985 @@ class VideoForge:
             'default_preset': 'medium',
             'video_extensions': self.DEFAULT_EXTENSIONS,
             'skip_existing': False,
-            'max_threads': 1
+            'max_threads': 1,
+            'exclude': [],  # 扫描时排除的 glob 模式
+            'probe_cache': True,
+            'probe_cache_path': None,  # 默认 logs/probe_cache.sqlite
+            'probe_concurrency': 8,  # 并发 ffprobe 进程数
+            'probe_timeout': 60,  # 单个文件探测超时（秒）
+            'probe_backend': 'auto',  # auto（有 PyAV 时进程内探测）、pyav 或 ffprobe
+            'status_file': None,  # 机器可读的进度状态文件（JSON）
+            'status_interval': 1.0,  # 状态文件最短写入间隔（秒）
+            'segment_min_duration': 600,  # 分段并行编码的最短视频时长（秒）
+            'skip_action': 'remux',  # 源视频已满足目标时：remux 换封装输出，skip 不输出
+            'verify_output': False,  # 转码后探测输出文件并校验时长
+            'predictor': True,  # 用历史转码结果预测输出码率
+            'predictor_path': None,  # 默认 logs/bitrate_model.sqlite
+            'predictor_min_samples': 5,  # 分桶样本数达到该值才使用预测结果
+            'sample_probe': False,  # 完整编码前先编码几个短样本，预测输出大小和速度
+            'sample_probe_min_duration': 600,  # 样本编码的最短视频时长（秒）
+            'sample_count': 3,  # 样本数量（均匀分布在整个视频中）
+            'sample_seconds': 10,  # 每个样本的时长（秒）
+            'sample_min_saving': 0.1,  # 预测节省比例低于该值时不做完整编码
+            'schedule': 'scan',  # 批量任务顺序：scan 按扫描顺序边扫边转，lpt 先探测再按工作量从大到小
+            'min_free_space': 1024,  # 输出磁盘在写入预估输出后至少保留的空间（MB），0 表示不检查
+            'memory_per_job': {'4K': 3072, '2K': 2048, '1080p': 1024, '720p': 512, 'SD': 256},  # 各输出分辨率编码任务预留内存（MB）
+            'min_free_memory': 512,  # 启动新任务后至少保留的可用内存（MB）
+            'max_load': None,  # 每核 1 分钟平均负载超过该值时暂停任务，None 表示不限制
+            'load_check_interval': 10,  # 负载检查间隔（秒）
+            'nice': 0,  # ffmpeg 进程的 nice 值
+            'ionice': None,  # ffmpeg 进程的 I/O 优先级：idle 或 best-effort[:0-7]
+            'metrics_file': None,  # Prometheus 文本格式指标文件（*.prom，供 node_exporter 采集）
+            'metrics_json': None,  # 指标 JSON 快照文件
+            'metrics_interval': 15,  # 指标文件最短写入间隔（秒）
+            'watch_settle': 30,  # 监听模式：文件大小和 mtime 保持不变多少秒后才处理
+            'watch_poll_interval': 10,  # 监听模式：轮询间隔（秒，inotify 不可用时）
+            'scratch_dir': None,  # 本地暂存目录（源和输出在网络存储上时使用）
+            'content_index': False,  # 按内容指纹复用已生成的输出（相同内容只转码一次）
+            'content_index_path': None,  # 默认 logs/content_index.sqlite
+            # 截止时间模式可选用的编码速度预设
+            'deadline_presets': ['veryfast', 'faster', 'fast', 'medium', 'slow', 'slower'],
+            'scratch_max_size': 50  # 暂存区大小上限（GB）
         }
         
         if config_file and os.path.exists(config_file):
-            with open(config_file, 'r', encoding='utf-8') as f:
-                user_config = json.load(f)
-                default_config.update(user_config)
+            # 同一个配置文件只解析内容，不重复读盘（每个实例得到独立的字典）
+            path = os.path.abspath(config_file)
+            user_config = json.loads(_read_config_file(path, os.stat(path).st_mtime_ns))
+            default_config.update(user_config)
         
         return default_config
     
-    def _setup_logging(self):
-        """设置日志"""
-        # 获取脚本所在目录的绝对路径
-        script_dir = Path(__file__).resolve().parent
-        log_dir = script_dir / 'logs'
-        log_dir.mkdir(exist_ok=True)
+    def enable_tracing(self):
+        """开启分阶段计时，日志写入也记录为 span（用 save_trace() 导出）"""
+        if self.tracer.enabled:
+            return
+        self.tracer.enabled = True
+        # 只包装 setup_logging() 创建的处理器，注入的 logger 不做修改
+        if not getattr(self.logger, '_videoforge_configured', False):
+            return
+        for handler in self.logger.handlers:
+            if getattr(handler, '_videoforge_traced', False):
+                continue
+            handle = handler.handle
+            
+            def traced_handle(record, _handle=handle):
+                with self.tracer.span('log'):
+                    return _handle(record)
+            handler.handle = traced_handle
+            handler._videoforge_traced = True
+    
+    def save_trace(self, path: str):
+        """导出 Chrome trace（chrome://tracing 或 https://ui.perfetto.dev 打开）"""
+        try:
+            self.tracer.save(path)
+            self.logger.info(f"🧭 追踪数据已保存: {path}")
+        except OSError as e:
+            self.logger.warning(f"⚠️  写入追踪文件失败 {path}: {e}")
+    
+    def check_ffmpeg(self, verify: bool = False) -> bool:
+        """检查 ffmpeg 和 ffprobe 是否可用
         
-        log_file = log_dir / f"videoforge_{datetime.now().strftime('%Y%m%d')}.log"
-        error_log = log_dir / "errors.log"
+        默认只在 PATH 中查找可执行文件，不启动子进程；verify=True 时再运行一次 -version 确认能执行。
+        结果按可执行文件路径在进程内缓存，重复调用几乎没有开销。
+        """
+        for tool in ('ffmpeg', 'ffprobe'):
+            path = shutil.which(tool)
+            if path is None:
+                self.logger.error(f"❌ {tool} 未安装或不在 PATH 中")
+                return False
+            if not verify:
+                continue
+            key = (path, os.stat(path).st_mtime_ns)
+            with _tool_check_lock:
+                ok = _tool_checks.get(key)
+                if ok is None:
+                    try:
+                        subprocess.run([path, '-version'], stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL, check=True, timeout=30)
+                        ok = True
+                    except (subprocess.SubprocessError, OSError):
+                        ok = False
+                    _tool_checks[key] = ok
+            if not ok:
+                self.logger.error(f"❌ {tool} 无法运行: {path}")
+                return False
+        return True
+    
+    def add_progress_callback(self, callback: Callable[[Dict], None]):
+        """注册转码进度回调
         
-        # 配置日志格式
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
+        回调参数为进度字典：input、output、percent、out_time、duration、
+        fps（编码帧率）、speed（相对实时的倍速）、eta（剩余秒数）、state（running/done/failed）。
+        多任务并发时回调会在不同工作线程中调用。
+        """
+        self._progress_callbacks.append(callback)
+    
+    def remove_progress_callback(self, callback: Callable[[Dict], None]):
+        """移除已注册的进度回调"""
+        if callback in self._progress_callbacks:
+            self._progress_callbacks.remove(callback)
+    
+    def _publish_progress(self, event: Dict, final: bool = False):
+        """分发进度事件：调用回调并按间隔刷新状态文件"""
+        for callback in list(self._progress_callbacks):
+            try:
+                callback(event)
+            except Exception as e:
+                self.logger.warning(f"⚠️  进度回调异常: {e}")
+        
+        with self._progress_lock:
+            if final:
+                self._active_jobs.pop(event['input'], None)
+            else:
+                self._active_jobs[event['input']] = event
+            now = time.monotonic()
+            if final or now - self._status_written >= self.config.get('status_interval', 1.0):
+                self._status_written = now
+                self._write_status_file()
+        self._write_metrics()
+    
+    @staticmethod
+    def _create_metrics() -> Metrics:
+        metrics = Metrics()
+        seconds = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+        metrics.describe('probe_seconds', 'histogram', '视频探测耗时（秒）', seconds)
+        metrics.describe('job_seconds', 'histogram', '单个文件处理耗时（秒）',
+                         (1, 10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 28800))
+        metrics.describe('encode_fps', 'histogram', '平均编码帧率',
+                         (1, 5, 10, 25, 50, 100, 200, 400, 800))
+        metrics.describe('encode_speed', 'histogram', '编码速度（相对实时的倍数）',
+                         (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64))
+        metrics.describe('input_bytes', 'histogram', '输入文件大小（字节）',
+                         tuple(2 ** n for n in range(20, 38, 2)))
+        metrics.describe('output_ratio', 'histogram', '输出大小 / 输入大小',
+                         (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1, 1.2, 1.5, 2))
+        metrics.describe('bytes_in_total', 'counter', '已处理的输入字节数')
+        metrics.describe('bytes_out_total', 'counter', '已写出的输出字节数')
+        metrics.describe('files_total', 'counter', '按结果和处理方式统计的文件数')
+        metrics.describe('skipped_total', 'counter', '按原因统计的跳过文件数')
+        metrics.describe('active_jobs', 'gauge', '正在运行的 ffmpeg 任务数')
+        metrics.describe('active_fps', 'gauge', '运行中任务的编码帧率之和')
+        metrics.describe('batch_eta_seconds', 'gauge', '整批任务预计剩余时间（秒，仅 LPT 调度）')
+        metrics.describe('last_update_timestamp', 'gauge', '指标最后更新时间（Unix 时间戳）')
+        return metrics
+    
+    def _write_metrics(self, force: bool = False):
+        """按间隔把指标写入 Prometheus 文本文件和 JSON 快照（原子替换）"""
+        prom_file = self.config.get('metrics_file')
+        json_file = self.config.get('metrics_json')
+        if not prom_file and not json_file:
+            return
+        with self._metrics_lock:
+            now = time.monotonic()
+            if not force and now - self._metrics_written < self.config.get('metrics_interval', 15):
+                return
+            self._metrics_written = now
+            
+            with self._progress_lock:
+                jobs = list(self._active_jobs.values())
+                batch = self._batch_progress() if self._batch else None
+            self.metrics.set('active_jobs', len(jobs))
+            self.metrics.set('active_fps', sum(job.get('fps') or 0 for job in jobs))
+            if batch and batch['eta'] is not None:
+                self.metrics.set('batch_eta_seconds', batch['eta'])
+            self.metrics.set('last_update_timestamp', time.time())
+            
+            outputs = []
+            if prom_file:
+                outputs.append((prom_file, self.metrics.render_prometheus()))
+            if json_file:
+                snapshot = self.metrics.snapshot()
+                snapshot['stats'] = self._stats_snapshot()
+                outputs.append((json_file, json.dumps(snapshot, ensure_ascii=False, indent=2)))
+            for path, content in outputs:
+                tmp_file = f"{path}.tmp"
+                try:
+                    with open(tmp_file, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                    os.replace(tmp_file, path)
+                except OSError as e:
+                    self.logger.warning(f"⚠️  写入指标文件失败 {path}: {e}")
+    
+    def _write_status_file(self):
+        """将当前任务进度和统计信息原子地写入状态文件（调用方持有 _progress_lock）"""
+        status_file = self.config.get('status_file')
+        if not status_file:
+            return
+        status = {
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'stats': self._stats_snapshot(),
+            'jobs': list(self._active_jobs.values())
+        }
+        if self._batch:
+            status['batch'] = self._batch_progress()
+        tmp_file = f"{status_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, status_file)
+        except OSError as e:
+            self.logger.warning(f"⚠️  写入状态文件失败 {status_file}: {e}")
+    
+    @traced('ffmpeg', target_arg=1)
+    def _run_ffmpeg(self, cmd: List[str], input_path: str, output_path: str,
+                    duration: float = 0,
+                    on_progress: Optional[Callable[..., None]] = None) -> Tuple[int, str]:
+        """运行 ffmpeg 并解析 -progress 输出
+        
+        stdout 逐行读取进度，stderr 由后台线程持续读取（只保留末尾若干行用于报错），
+        两个管道都不会被写满。on_progress(event, final=False) 指定时进度事件交给它处理
+        而不直接发布（分段编码时汇总到原文件）。
+        
+        Returns:
+            (returncode, stderr_tail)
+        """
+        cmd = self._with_priority(cmd[:-1] + ['-progress', 'pipe:1', '-nostats', cmd[-1]])
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            errors='replace'
         )
+        self._register_process(process)
         
-        # 主日志
-        self.logger = logging.getLogger('VideoForge')
-        self.logger.setLevel(logging.INFO)
+        stderr_tail = deque(maxlen=20)
         
-        # 文件处理器
-        fh = logging.FileHandler(log_file, encoding='utf-8')
-        fh.setLevel(logging.INFO)
-        fh.setFormatter(formatter)
+        def drain_stderr():
+            for line in process.stderr:
+                stderr_tail.append(line.rstrip())
         
-        # 错误日志处理器
-        eh = logging.FileHandler(error_log, encoding='utf-8')
-        eh.setLevel(logging.ERROR)
-        eh.setFormatter(formatter)
+        stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+        stderr_thread.start()
         
-        # 控制台处理器
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        ch.setFormatter(formatter)
+        publish = on_progress or self._publish_progress
+        event = self._progress_event(input_path, output_path, duration)
+        for progress in parse_ffmpeg_progress(process.stdout):
+            event = self._update_progress(event, progress)
+            publish(event)
+        
+        process.wait()
+        stderr_thread.join()
+        self._unregister_process(process)
+        publish(self._final_progress(event, process.returncode), final=True)
+        
+        return process.returncode, '\n'.join(stderr_tail)
+    
+    async def _run_ffmpeg_async(self, cmd: List[str], input_path: str, output_path: str,
+                                duration: float = 0,
+                                progress: Optional[asyncio.Queue] = None) -> Tuple[int, str]:
+        """_run_ffmpeg 的 asyncio 版本：子进程由事件循环管理，不占用线程
+        
+        进度事件同样分发给回调和状态文件，并写入 progress 队列。任务被取消时结束 ffmpeg
+        （最后一个事件的 state 为 cancelled）并重新抛出 CancelledError。
+        
+        Returns:
+            (returncode, stderr_tail)
+        """
+        cmd = self._with_priority(cmd[:-1] + ['-progress', 'pipe:1', '-nostats', cmd[-1]])
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._register_process(process)
+        
+        stderr_tail = deque(maxlen=20)
         
-        self.logger.addHandler(fh)
-        self.logger.addHandler(eh)
-        self.logger.addHandler(ch)
+        async def drain_stderr():
+            async for line in process.stderr:
+                stderr_tail.append(line.decode('utf-8', 'replace').rstrip())
+        
+        stderr_task = asyncio.ensure_future(drain_stderr())
+        event = self._progress_event(input_path, output_path, duration)
+        state = None
+        try:
+            block = {}
+            async for line in process.stdout:
+                parsed = _progress_line(block, line.decode('utf-8', 'replace'))
+                if parsed is None:
+                    continue
+                block = {}
+                event = self._update_progress(event, parsed)
+                self._publish_progress(event)
+                if progress is not None:
+                    progress.put_nowait(event)
+            await process.wait()
+            await stderr_task
+        except asyncio.CancelledError:
+            state = 'cancelled'
+            stderr_task.cancel()
+            await self._terminate_async(process)
+            raise
+        finally:
+            self._unregister_process(process)
+            event = self._final_progress(event, process.returncode, state)
+            self._publish_progress(event, final=True)
+            if progress is not None:
+                progress.put_nowait(event)
+        
+        return process.returncode, '\n'.join(stderr_tail)
     
-    def check_ffmpeg(self) -> bool:
-        """检查 FFmpeg 是否可用"""
+    async def _terminate_async(self, process: asyncio.subprocess.Process, timeout: float = 5):
+        """结束子进程：先 SIGTERM（ffmpeg 会停止写入并退出），超时后 SIGKILL"""
+        if process.returncode is not None:
+            return
+        with self._admission:
+            # 因负载过高被暂停的进程收不到 SIGTERM，先恢复
+            if process.pid in self._paused and hasattr(signal, 'SIGCONT'):
+                self._paused.remove(process.pid)
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(process.pid, signal.SIGCONT)
+        with contextlib.suppress(ProcessLookupError):
+            process.terminate()
         try:
-            subprocess.run(['ffmpeg', '-version'], 
-                         stdout=subprocess.PIPE, 
-                         stderr=subprocess.PIPE,
-                         check=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            self.logger.error("❌ FFmpeg 未安装或不在 PATH 中")
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+            await process.wait()
+    
+    def _async_semaphore(self, kind: str) -> asyncio.Semaphore:
+        """当前事件循环中共享的并发上限：probe 为 probe_concurrency，encode 为 max_threads"""
+        loop = asyncio.get_running_loop()
+        semaphores = self._async_semaphores.setdefault(loop, {})
+        if kind not in semaphores:
+            limit = self.config.get('probe_concurrency' if kind == 'probe' else 'max_threads')
+            semaphores[kind] = asyncio.Semaphore(max(1, int(limit or 1)))
+        return semaphores[kind]
+    
+    @staticmethod
+    def _progress_event(input_path: str, output_path: str, duration: float) -> Dict:
+        """新任务的初始进度事件"""
+        return {
+            'input': input_path,
+            'output': output_path,
+            'state': 'running',
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'duration': duration,
+            'percent': 0.0,
+            'out_time': 0.0,
+            'fps': None,
+            'speed': None,
+            'eta': None
+        }
+    
+    @staticmethod
+    def _update_progress(event: Dict, progress: Dict) -> Dict:
+        """用一个 -progress 块更新进度事件（返回新字典，已发布的事件不会被修改）"""
+        out_time = progress['out_time'] or event['out_time']
+        speed = progress['speed']
+        duration = event['duration']
+        event = dict(event, out_time=out_time, fps=progress['fps'], speed=speed)
+        if duration > 0:
+            event['percent'] = min(100.0, out_time / duration * 100)
+            if speed:
+                event['eta'] = max(0.0, (duration - out_time) / speed)
+        return event
+    
+    @staticmethod
+    def _final_progress(event: Dict, returncode: int, state: str = None) -> Dict:
+        """任务结束时的进度事件"""
+        event = dict(event, state=state or ('done' if returncode == 0 else 'failed'))
+        if event['state'] == 'done':
+            event['percent'] = 100.0
+            event['eta'] = 0.0
+        return event
+    
+    @staticmethod
+    def _job_cost(info: Optional[VideoInfo]) -> float:
+        """任务工作量估算：时长 × 像素数（未知时按 1080p 计）"""
+        if not info:
+            return 0.0
+        pixels = (info.get('width') or 1920) * (info.get('height') or 1080)
+        return (info.get('duration') or 0) * pixels
+    
+    def _batch_progress(self) -> Dict:
+        """整批任务的进度和剩余时间（调用方持有 _progress_lock）
+        
+        已完成工作量加上运行中任务按进度折算的工作量，除以已用时间得到实测吞吐，
+        剩余工作量按该吞吐外推。
+        """
+        batch = self._batch
+        work = batch['done_work'] + sum(
+            batch['costs'].get(job['input'], 0) * job.get('percent', 0) / 100
+            for job in self._active_jobs.values()
+        )
+        elapsed = time.monotonic() - batch['started']
+        eta = None
+        if work > 0 and elapsed > 0:
+            eta = max(0.0, (batch['total_work'] - work) * elapsed / work)
+        return {
+            'done': batch['done'],
+            'total': batch['total'],
+            'percent': work / batch['total_work'] * 100 if batch['total_work'] else 0.0,
+            'elapsed': elapsed,
+            'eta': eta
+        }
+    
+    def _with_priority(self, cmd: List[str]) -> List[str]:
+        """按配置用 nice / ionice 包装命令（工具不存在时忽略）"""
+        prefix = []
+        nice = int(self.config.get('nice') or 0)
+        if nice and shutil.which('nice'):
+            prefix += ['nice', '-n', str(nice)]
+        ionice = self.config.get('ionice')
+        if ionice and shutil.which('ionice'):
+            io_class, _, level = str(ionice).partition(':')
+            if io_class == 'idle':
+                prefix += ['ionice', '-c', '3']
+            elif io_class == 'best-effort':
+                prefix += ['ionice', '-c', '2'] + (['-n', level] if level else [])
+            else:
+                self.logger.warning(f"⚠️  不支持的 ionice 设置: {ionice}（可选 idle、best-effort[:0-7]）")
+        return prefix + cmd
+    
+    def _register_process(self, process: subprocess.Popen):
+        with self._admission:
+            self._processes[process.pid] = process
+            if self._stopping.is_set():
+                # 中断后才启动的进程立即结束，调用方按失败处理
+                with contextlib.suppress(ProcessLookupError):
+                    process.terminate()
+    
+    def _terminate_processes(self):
+        """结束所有运行中的 ffmpeg（被暂停的先恢复，否则收不到 SIGTERM）"""
+        with self._admission:
+            processes = list(self._processes.values())
+            paused, self._paused = self._paused, []
+        for process in processes:
+            with contextlib.suppress(ProcessLookupError):
+                if process.pid in paused and hasattr(signal, 'SIGCONT'):
+                    os.kill(process.pid, signal.SIGCONT)
+                process.terminate()
+    
+    def _unregister_process(self, process: subprocess.Popen):
+        with self._admission:
+            self._processes.pop(process.pid, None)
+            if process.pid in self._paused:
+                self._paused.remove(process.pid)
+            self._admission.notify_all()
+    
+    @staticmethod
+    def _memory_available() -> Optional[int]:
+        """系统可用内存（字节），无法获取时返回 None（非 Linux）"""
+        try:
+            with open('/proc/meminfo', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+    
+    def _load_per_cpu(self) -> Optional[float]:
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (OSError, AttributeError):
+            return None
+    
+    def _staged_output_size(self, info: Optional[VideoInfo], codec: str, quality: str,
+                            crf: int = None, preset: str = None, resolution: str = None) -> int:
+        """暂存区为输出预留的大小：还不知道处理方式，取换封装（约等于源文件）和编码预估中较大者"""
+        crf, preset = self._resolve_quality(quality, crf, preset)
+        return max(self._projected_output_size(info, 'remux', codec, crf, preset, resolution),
+                   self._projected_output_size(info, 'encode', codec, crf, preset, resolution))
+    
+    def _projected_output_size(self, info: Optional[VideoInfo], action: str, codec: str,
+                               crf: int, preset: str, resolution: str) -> int:
+        """预估输出大小：换封装按源文件大小，编码按预测模型或码率表"""
+        input_size = (info or {}).get('size') or 0
+        duration = (info or {}).get('duration') or 0
+        if action != 'encode' or not duration:
+            return input_size
+        short_side = self._output_short_side(min(info.get('width') or 0, info.get('height') or 0), resolution)
+        prediction = self.predictor.predict(info, codec, crf, preset, short_side) if self.predictor else None
+        bitrate = prediction['high'] if prediction else self._table_target_bitrate(codec, crf, short_side)
+        # 加上约 10% 的音频和容器开销
+        return int(bitrate * 1.1 * duration / 8)
+    
+    def _job_memory(self, info: Optional[VideoInfo], action: str, resolution: str) -> int:
+        """任务预留内存（字节）：按输出分辨率等级查 memory_per_job"""
+        if action != 'encode' or not info:
+            return 128 * 1024 * 1024
+        short_side = self._output_short_side(min(info.get('width') or 0, info.get('height') or 0), resolution)
+        tier, _ = self._get_resolution_tier(short_side, short_side)
+        table = self.config.get('memory_per_job') or {}
+        return int(table.get(tier, 512)) * 1024 * 1024
+    
+    @traced('admission')
+    def _acquire_resources(self, input_path: str, output_path: str, info: Optional[VideoInfo],
+                           action: str, codec: str, crf: int, preset: str,
+                           resolution: str, need_disk: int = None,
+                           need_memory: int = None, destination: str = None) -> Optional[str]:
+        """资源准入：启动任务前检查输出磁盘空间、可用内存和系统负载
+        
+        资源不足且还有其他任务在运行时等待它们结束后重新检查；没有其他任务时，
+        磁盘空间不足直接放弃该任务，内存或负载不足仍然启动（等待也不会好转）。
+        
+        Args:
+            need_disk / need_memory: 直接指定预留的磁盘和内存（多输出任务按各输出之和）；
+                                     need_disk 为 0 时不检查磁盘
+            destination: 输出先写入暂存区时的最终目标路径，其所在磁盘同样需要放得下输出
+        
+        Returns:
+            放弃任务的原因；获准启动时返回 None
+        """
+        if need_disk is None:
+            need_disk = self._projected_output_size(info, action, codec, crf, preset, resolution)
+        if need_memory is None:
+            need_memory = self._job_memory(info, action, resolution)
+        min_free_space = float(self.config.get('min_free_space') or 0) * 1024 * 1024
+        min_free_memory = float(self.config.get('min_free_memory') or 0) * 1024 * 1024
+        max_load = self.config.get('max_load')
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        destination_dir = os.path.dirname(os.path.abspath(destination)) if destination else None
+        name = os.path.basename(input_path)
+        waited = False
+        
+        with self._admission:
+            while True:
+                problem = None
+                others = bool(self._reservations)
+                
+                if min_free_space and need_disk:
+                    for directory in dict.fromkeys(filter(None, (output_dir, destination_dir))):
+                        problem = self._disk_problem(directory, need_disk, min_free_space) or None
+                        if problem:
+                            break
+                    if problem and not others:
+                        self.logger.error(f"❌ 放弃任务 {name}: {problem}")
+                        self._inc_stat('admission_rejected')
+                        return problem
+                
+                available = self._memory_available()
+                if problem is None and others and available is not None:
+                    settling = sum(r['memory'] for r in self._reservations.values()
+                                   if time.monotonic() - r['started'] < self.MEMORY_SETTLE_SECONDS)
+                    if available - settling - need_memory < min_free_memory:
+                        problem = (f"可用内存不足: {self._format_size(available)}，"
+                                   f"本任务预留 {self._format_size(need_memory)}")
+                
+                load = self._load_per_cpu() if max_load else None
+                if problem is None and others and load is not None and load > max_load:
+                    problem = f"系统负载过高: 每核 {load:.2f} > {max_load}"
+                
+                if problem is None:
+                    break
+                if not waited:
+                    waited = True
+                    self._inc_stat('admission_waits')
+                    self.logger.info(f"⏳ 等待资源 {name}: {problem}")
+                self._admission.wait(timeout=self.config.get('load_check_interval', 10))
+            
+            self._reservations[input_path] = {
+                'output_dir': output_dir,
+                'destination_dir': destination_dir,
+                'partial': self._partial_path(output_path),
+                'disk': need_disk,
+                'memory': need_memory,
+                'started': time.monotonic()
+            }
+            if max_load and (self._load_monitor is None or not self._load_monitor.is_alive()):
+                self._load_monitor = threading.Thread(target=self._monitor_load,
+                                                      name='VideoForge-load', daemon=True)
+                self._load_monitor.start()
+        return None
+    
+    def _disk_problem(self, directory: str, need_disk: int, min_free_space: float) -> str:
+        """directory 所在磁盘放不下本任务时返回原因（调用方持有 _admission）"""
+        pending_disk = 0
+        for r in self._reservations.values():
+            if r['output_dir'] == directory:
+                # 运行中任务的临时输出还会继续增长，扣除它们尚未写入的部分
+                try:
+                    written = os.path.getsize(r['partial'])
+                except OSError:
+                    written = 0
+                pending_disk += max(0, r['disk'] - written)
+            elif r.get('destination_dir') == directory:
+                # 暂存任务的输出结束后才移动过来
+                pending_disk += r['disk']
+        free = shutil.disk_usage(directory).free
+        if free - pending_disk - need_disk < min_free_space:
+            return (f"磁盘空间不足（{directory}）: 可用 {self._format_size(free)}，"
+                    f"运行中任务预留 {self._format_size(pending_disk)}，"
+                    f"本任务预计 {self._format_size(need_disk)}")
+        return ""
+    
+    def _release_resources(self, input_path: str):
+        with self._admission:
+            self._reservations.pop(input_path, None)
+            self._admission.notify_all()
+    
+    def _monitor_load(self):
+        """负载过高时暂停（SIGSTOP）最近启动的 ffmpeg，回落后按暂停顺序恢复（SIGCONT）
+        
+        至少保留一个进程运行，保证批量任务始终有进展；没有任务时线程退出。
+        """
+        if not hasattr(signal, 'SIGSTOP'):
+            return
+        max_load = float(self.config['max_load'])
+        interval = self.config.get('load_check_interval', 10)
+        next_check = 0.0
+        while True:
+            with self._admission:
+                if not self._reservations:
+                    self._resume_all()
+                    return
+                # 任务结束时会提前唤醒，未到检查时间只检查是否还有任务
+                if time.monotonic() < next_check:
+                    self._admission.wait(timeout=next_check - time.monotonic())
+                    continue
+                next_check = time.monotonic() + interval
+                load = self._load_per_cpu()
+                running = [pid for pid in self._processes if pid not in self._paused]
+                try:
+                    if load is not None and load > max_load and len(running) > 1:
+                        pid = running[-1]
+                        os.kill(pid, signal.SIGSTOP)
+                        self._paused.append(pid)
+                        self._inc_stat('load_pauses')
+                        self.logger.info(f"⏸️  负载过高（每核 {load:.2f} > {max_load}），暂停 ffmpeg 进程 {pid}")
+                    elif self._paused and (load is None or load < max_load * 0.8):
+                        pid = self._paused.pop(0)
+                        os.kill(pid, signal.SIGCONT)
+                        self.logger.info(f"▶️  负载回落（每核 {load:.2f}），恢复 ffmpeg 进程 {pid}")
+                except ProcessLookupError:
+                    pass
+                self._admission.wait(timeout=interval)
+    
+    def _resume_all(self):
+        """恢复所有被暂停的进程（调用方持有 _admission）"""
+        for pid in self._paused:
+            try:
+                os.kill(pid, signal.SIGCONT)
+            except ProcessLookupError:
+                pass
+        self._paused.clear()
+    
+    def _inc_stat(self, key: str, value: int = 1):
+        """线程安全地累加统计计数"""
+        with self._stats_lock:
+            self.stats[key] += value
+    
+    def _record_action(self, action: str, rendition: str = None):
+        """记录一个文件的处理方式"""
+        with self._stats_lock:
+            self.stats['actions'][action] += 1
+            if rendition:
+                self._rendition_stats(rendition)['actions'][action] += 1
+    
+    def _rendition_stats(self, rendition: str) -> Dict:
+        """单个输出的统计字典，首次使用时创建（调用方持有 _stats_lock）"""
+        return self.stats['renditions'].setdefault(rendition, {
+            'processed': 0,
+            'skipped': 0,
+            'failed': 0,
+            'total_size_before': 0,
+            'total_size_after': 0,
+            'actions': {action: 0 for action in self.ACTIONS}
+        })
+    
+    def _inc_rendition_stat(self, rendition: str, key: str, value: int = 1):
+        """线程安全地累加单个输出的统计计数"""
+        with self._stats_lock:
+            self._rendition_stats(rendition)[key] += value
+    
+    def _stats_snapshot(self) -> Dict:
+        """统计信息的深拷贝（写状态文件和指标快照时使用）"""
+        with self._stats_lock:
+            return json.loads(json.dumps(self.stats))
+    
+    def _open_store(self, attr: str, config_key: str, default_name: str, factory: Callable):
+        """首次使用时打开 logs/ 下的 SQLite 存储；配置禁用或打开失败时返回 None"""
+        if not self.config.get(config_key):
+            return None
+        with self._store_lock:
+            if getattr(self, attr) is None:
+                db_path = self.config.get(f'{config_key}_path')
+                if not db_path:
+                    db_path = Path(__file__).resolve().parent / 'logs' / default_name
+                try:
+                    setattr(self, attr, factory(db_path))
+                except sqlite3.Error as e:
+                    self.logger.warning(f"⚠️  无法打开 {db_path}: {e}，已禁用 {config_key}")
+                    self.config[config_key] = False
+                    return None
+            return getattr(self, attr)
+    
+    @property
+    def probe_cache(self) -> Optional[ProbeCache]:
+        """ffprobe 结果缓存，配置中禁用时为 None"""
+        return self._open_store('_probe_cache', 'probe_cache', 'probe_cache.sqlite', ProbeCache)
+    
+    @property
+    def predictor(self) -> Optional[BitratePredictor]:
+        """输出码率预测模型，配置中禁用时为 None"""
+        return self._open_store(
+            '_predictor', 'predictor', 'bitrate_model.sqlite',
+            lambda path: BitratePredictor(path, self.config.get('predictor_min_samples', 5))
+        )
+    
+    @property
+    def content_index(self) -> Optional[ContentIndex]:
+        """内容指纹索引，配置中未启用时为 None"""
+        return self._open_store('_content_index', 'content_index', 'content_index.sqlite', ContentIndex)
+    
+    @traced('get_video_info')
+    def get_video_info(self, video_path: str, use_cache: bool = True,
+                       timeout: Optional[float] = None) -> Optional[VideoInfo]:
+        """获取视频信息（优先读取探测缓存）
+        
+        Args:
+            timeout: ffprobe 超时时间（秒），超时视为探测失败
+        """
+        cache, st, cached = self._probe_cache_lookup(video_path, use_cache)
+        if cached is not ProbeCache.MISS:
+            return cached
+        
+        info = self._probe_video(video_path, timeout)
+        if cache is not None and st is not None and info is not ProbeCache.MISS:
+            cache.put(video_path, info, st)
+        return None if info is ProbeCache.MISS else info
+    
+    def _probe_cache_lookup(self, video_path: str, use_cache: bool = True) -> Tuple:
+        """查询探测缓存
+        
+        Returns:
+            (cache, stat 结果, 缓存的信息)；未命中时信息为 ProbeCache.MISS
+        """
+        cache = self.probe_cache if use_cache else None
+        st = None
+        if cache is not None:
+            try:
+                st = os.stat(video_path)
+            except OSError:
+                pass
+            else:
+                return cache, st, cache.get(video_path, st)
+        return cache, st, ProbeCache.MISS
+    
+    async def get_video_info_async(self, video_path: str, use_cache: bool = True,
+                                   timeout: Optional[float] = None) -> Optional[VideoInfo]:
+        """get_video_info 的 asyncio 版本
+        
+        ffprobe 以 asyncio 子进程运行；同一事件循环中同时运行的 ffprobe 数量受 probe_concurrency 限制，
+        缓存命中时不占用名额。
+        """
+        cache, st, cached = self._probe_cache_lookup(video_path, use_cache)
+        if cached is not ProbeCache.MISS:
+            return cached
+        
+        async with self._async_semaphore('probe'):
+            info = await self._probe_video_async(video_path, timeout)
+        if cache is not None and st is not None and info is not ProbeCache.MISS:
+            cache.put(video_path, info, st)
+        return None if info is ProbeCache.MISS else info
+    
+    async def _probe_video_async(self, video_path: str, timeout: Optional[float] = None):
+        """_probe_video 的 asyncio 版本（超时或取消时结束 ffprobe）
+        
+        PyAV 后端的探测是阻塞调用，放到默认线程池中运行。
+        """
+        backend = self.probe_backend
+        if not isinstance(backend, FFprobeProbe):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._probe_video, video_path, timeout
+            )
+        
+        started = time.monotonic()
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *backend.command(video_path),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"ffprobe 超过 {timeout} 秒未返回") from None
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', 'replace').strip()
+                                   or f"ffprobe 返回码 {process.returncode}")
+            self.metrics.observe('probe_seconds', time.monotonic() - started, result='ok', backend=backend.name)
+            return backend.parse(stdout.decode('utf-8', 'replace'))
+        except Exception as e:
+            self.metrics.observe('probe_seconds', time.monotonic() - started, result='error', backend=backend.name)
+            self.logger.error(f"获取视频信息失败 {video_path}: {e}")
+            return ProbeCache.MISS
+        finally:
+            # 超时或任务被取消：挂起的网络挂载上进程可能无法立即退出，不等待
+            if process is not None and process.returncode is None:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+    
+    @traced('probe')
+    def _probe_video(self, video_path: str, timeout: Optional[float] = None):
+        """用配置的探测后端获取视频信息
+        
+        Returns:
+            信息字典；文件没有视频流时返回 None；探测失败时返回 ProbeCache.MISS（不写入缓存）
+        """
+        started = time.monotonic()
+        backend = self.probe_backend
+        try:
+            info = backend.probe(video_path, timeout)
+            self.metrics.observe('probe_seconds', time.monotonic() - started, result='ok', backend=backend.name)
+            return info
+        except Exception as e:
+            self.metrics.observe('probe_seconds', time.monotonic() - started, result='error', backend=backend.name)
+            self.logger.error(f"获取视频信息失败 {video_path}: {e}")
+            return ProbeCache.MISS
+    
+    @property
+    def probe_backend(self):
+        """当前配置（probe_backend）对应的探测后端，FFprobeProbe 或 PyAVProbe"""
+        name = self.config.get('probe_backend') or 'auto'
+        backend = self._probe_backends.get(name)
+        if backend is None:
+            backend = self._probe_backends[name] = self._create_probe_backend(name)
+        return backend
+    
+    def _create_probe_backend(self, name: str):
+        if name not in ('auto', 'pyav', 'ffprobe'):
+            self.logger.warning(f"⚠️  未知的探测后端: {name}（可选 auto、pyav、ffprobe），使用 auto")
+            name = 'auto'
+        if name != 'ffprobe' and av is not None:
+            return PyAVProbe()
+        if name == 'pyav':
+            self.logger.warning("⚠️  未安装 PyAV（pip install av），使用 ffprobe 探测")
+        return FFprobeProbe()
+    
+    def probe_many(self, paths: Iterable[str], concurrency: Optional[int] = None,
+                   timeout: Optional[float] = None):
+        """并发探测多个文件，按完成顺序逐个产出 (path, info)
+        
+        同时在途的任务数受 concurrency 限制，paths 可以是惰性迭代器；
+        单个文件超时只会让该文件的结果为 None，不会阻塞其余文件。PyAV 等进程内后端
+        卡在不可中断的读取上（挂起的 NFS/SMB）时，超过期限的文件直接产出 None，
+        卡住的线程留在原线程池中，其余文件换用新的线程池继续探测。
+        
+        Args:
+            concurrency: 并发 ffprobe 数量（默认使用配置中的 probe_concurrency）
+            timeout: 单个文件的探测超时（默认使用配置中的 probe_timeout）
+        """
+        concurrency = max(1, int(concurrency or self.config.get('probe_concurrency') or 1))
+        if timeout is None:
+            timeout = self.config.get('probe_timeout')
+        # 探测后端自身的超时之外再多等 1 秒，之后放弃该文件
+        limit = timeout + 1.0 if timeout else None
+        
+        def new_executor() -> ThreadPoolExecutor:
+            return ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='VideoForge-probe')
+        
+        executor = new_executor()
+        abandoned = []  # 有线程卡住的旧线程池
+        pending = {}    # future -> (path, [开始运行的时间])
+        path_iter = iter(paths)
+        
+        def probe(path: str, started: List[float]):
+            started.append(time.monotonic())
+            return self.get_video_info(path, timeout=timeout)
+        
+        def submit(path: str):
+            started = []
+            pending[executor.submit(probe, path, started)] = (path, started)
+        
+        def submit_next() -> bool:
+            for path in path_iter:
+                submit(path)
+                return True
             return False
+        
+        def next_deadline() -> Optional[float]:
+            if limit is None:
+                return None
+            now = time.monotonic()
+            waits = [started[0] + limit - now for _, started in pending.values() if started]
+            return max(0.0, min(waits, default=limit))
+        
+        try:
+            for _ in range(concurrency * 2):
+                if not submit_next():
+                    break
+            
+            while pending:
+                done, _ = wait(pending, timeout=next_deadline(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, _ = pending.pop(future)
+                    submit_next()
+                    try:
+                        info = future.result()
+                    except Exception as e:
+                        self.logger.error(f"获取视频信息失败 {path}: {e}")
+                        info = None
+                    yield path, info
+                
+                if limit is None:
+                    continue
+                now = time.monotonic()
+                expired = [future for future, (_, started) in pending.items()
+                           if started and now - started[0] > limit and not future.done()]
+                if not expired:
+                    continue
+                # 卡住的线程无法中断：旧线程池留给它们，尚未开始的任务转到新线程池
+                abandoned.append(executor)
+                executor = new_executor()
+                for future in list(pending):
+                    if future.cancel():
+                        submit(pending.pop(future)[0])
+                for future in expired:
+                    path, _ = pending.pop(future)
+                    submit_next()
+                    self.logger.error(f"获取视频信息失败 {path}: 超过 {timeout} 秒未返回")
+                    yield path, None
+        finally:
+            # 卡死在不可中断 I/O 上的线程无法回收，不等待它们
+            for pool in abandoned + [executor]:
+                pool.shutdown(wait=False, cancel_futures=True)
     
-    def get_video_info(self, video_path: str) -> Optional[Dict]:
-        """获取视频信息"""
+    async def probe_many_async(self, paths: Iterable[str], concurrency: Optional[int] = None,
+                               timeout: Optional[float] = None):
+        """probe_many 的 asyncio 版本：异步生成器，按完成顺序产出 (path, info)
+        
+            async for path, info in forge.probe_many_async(paths):
+                ...
+        
+        同时在途的任务数受 concurrency 限制（paths 可以是惰性迭代器），实际运行的 ffprobe
+        还受共享的 probe_concurrency 限制。提前退出循环时取消剩余的探测。
+        """
+        concurrency = max(1, int(concurrency or self.config.get('probe_concurrency') or 1))
+        if timeout is None:
+            timeout = self.config.get('probe_timeout')
+        
+        pending = {}
+        path_iter = iter(paths)
+        
+        def submit_next() -> bool:
+            for path in path_iter:
+                pending[asyncio.ensure_future(self.get_video_info_async(path, timeout=timeout))] = path
+                return True
+            return False
+        
         try:
-            cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_format',
-                '-show_streams',
-                '-print_format', 'json',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            info = json.loads(result.stdout)
-            
-            # 提取关键信息
-            video_stream = next((s for s in info.get('streams', []) 
-                               if s.get('codec_type') == 'video'), None)
-            
-            if not video_stream:
-                return None
-            
-            return {
-                'width': video_stream.get('width'),
-                'height': video_stream.get('height'),
-                'codec': video_stream.get('codec_name'),
-                'bit_rate': int(video_stream.get('bit_rate', 0)),
-                'duration': float(info.get('format', {}).get('duration', 0)),
-                'size': int(info.get('format', {}).get('size', 0)),
-                'fps': eval(video_stream.get('r_frame_rate', '0/1'))
-            }
-        except Exception as e:
-            self.logger.error(f"获取视频信息失败 {video_path}: {e}")
-            return None
+            while len(pending) < concurrency and submit_next():
+                pass
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path = pending.pop(task)
+                    submit_next()
+                    yield path, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
     
     def _get_resolution_tier(self, width: int, height: int) -> Tuple[str, int]:
         """根据视频宽高判断分辨率等级（使用短边判断，兼容横屏/竖屏）
@@ -175,29 +2590,94 @@ class VideoForge:
         else:  # 低于720p
             return 'SD', shorter_side
     
+    @traced('should_skip_video')
     def should_skip_video(self, input_path: str, codec: str, quality: str, 
-                         crf: int = None, resolution: str = None) -> Tuple[bool, str]:
+                         crf: int = None, resolution: str = None,
+                         info: Optional[VideoInfo] = None,
+                         preset: str = None) -> Tuple[bool, str]:
         """判断是否应该跳过视频处理
         
+        目标码率优先使用码率预测模型（历史转码结果），样本不足时使用内置码率表。
+        使用预测模型时按 95% 预测区间的上限判断：只有输出码率偏高时仍能达到节省要求才转码，
+        样本离散（区间宽）时倾向于跳过。
+        
+        Args:
+            info: 已探测的视频信息（不传则探测 input_path）
+        
         Returns:
             (should_skip, reason): (是否跳过, 跳过原因)
         """
         # 获取视频信息
-        info = self.get_video_info(input_path)
+        if info is None:
+            info = self.get_video_info(input_path)
         if not info:
             return False, ""
         
-        # 获取目标 CRF
-        if quality in self.QUALITY_PRESETS and crf is None:
-            target_crf = self.QUALITY_PRESETS[quality]['crf']
-        else:
-            target_crf = crf or 23
+        # 获取目标 CRF 和速度预设
+        target_crf, target_preset = self._resolve_quality(quality, crf, preset)
         
         # 获取分辨率等级（使用短边判断）
         width = info.get('width', 1920)
         height = info.get('height', 1080)
         tier_name, shorter_side = self._get_resolution_tier(width, height)
         
+        target_bitrate = self._table_target_bitrate(codec, target_crf, shorter_side)
+        target_desc = f"{target_bitrate/1000000:.1f} Mbps"
+        
+        # 有足够历史样本时，用学习到的码率代替码率表
+        prediction = None
+        if self.predictor is not None:
+            prediction = self.predictor.predict(
+                info, codec, target_crf, target_preset,
+                self._output_short_side(min(width, height), resolution)
+            )
+        if prediction:
+            target_bitrate = prediction['high']
+            target_desc = (f"{target_bitrate/1000000:.1f} Mbps（预测上限；{prediction['samples']} 个历史样本，"
+                           f"均值 {prediction['bitrate']/1000000:.1f}，"
+                           f"95% 预测区间 {prediction['low']/1000000:.1f}-{prediction['high']/1000000:.1f}）")
+        
+        current_codec = info.get('codec', '').lower()
+        current_bitrate = info.get('bit_rate', 0)
+        current_size = info.get('size', 0)
+        duration = info.get('duration', 0)
+        
+        # 目标编码名称
+        target_codec_names = []
+        if codec == 'h265':
+            target_codec_names = ['hevc', 'h265']
+        else:
+            target_codec_names = ['h264', 'avc']
+        
+        # 检查是否已经是目标编码
+        is_target_codec = current_codec in target_codec_names
+        
+        # 检查分辨率是否需要调整（使用短边判断）
+        needs_resolution_change = self._needs_resolution_change(shorter_side, resolution)
+        
+        # 判断1: 已经是目标编码且码率足够低
+        if is_target_codec and current_bitrate > 0 and current_bitrate <= target_bitrate:
+            if not needs_resolution_change:
+                reason = (f"已是 {current_codec.upper()} 且码率 "
+                         f"{current_bitrate/1000000:.1f} Mbps ≤ 目标 {target_desc}")
+                return True, reason
+        
+        # 判断2: 预估转码后文件会变大（需要缩小分辨率时仍然编码，换封装无法缩放）
+        if duration > 0 and not needs_resolution_change:
+            # 预估转码后的文件大小（字节）
+            # 公式: (目标码率 * 时长) / 8 * 1.1 (预留10%音频和容器开销)
+            estimated_size = (target_bitrate * duration / 8) * 1.1
+            
+            # 如果预估大小 >= 原文件大小的 95%，则跳过（避免转码后反而变大）
+            if estimated_size >= current_size * 0.95:
+                reason = (f"预估转码后 {self._format_size(int(estimated_size))} "
+                         f">= 原文件 {self._format_size(current_size)} 的 95%，跳过转码")
+                return True, reason
+        
+        return False, ""
+    
+    def _table_target_bitrate(self, codec: str, target_crf: int, shorter_side: int) -> float:
+        """内置码率表：根据目标编码、CRF 和短边估算目标视频码率（bps）"""
         # 根据分辨率和 CRF 估算目标码率
         # 基准值基于短边，与横竖屏无关
         if codec == 'h264':
@@ -229,79 +2709,401 @@ class VideoForge:
                 base_bitrate = {2160: 3500000, 1440: 1800000, 1080: 900000, 720: 600000}
                 target_bitrate = base_bitrate.get(shorter_side, 900000 * (shorter_side / 1080))
         
-        current_codec = info.get('codec', '').lower()
-        current_bitrate = info.get('bit_rate', 0)
-        current_size = info.get('size', 0)
-        duration = info.get('duration', 0)
+        return target_bitrate
+    
+    @staticmethod
+    def _output_short_side(shorter_side: int, resolution: str = None) -> int:
+        """缩放后输出视频的短边"""
+        limits = {'4K': 2160, '2K': 1440, '1080p': 1080, '720p': 720}
+        if resolution in limits:
+            return min(shorter_side, limits[resolution])
+        return shorter_side
+    
+    @staticmethod
+    def _needs_resolution_change(shorter_side: int, resolution: str = None) -> bool:
+        """分辨率等级（短边）高于目标分辨率、需要缩小时返回 True"""
+        limits = {'4K': 2160, '2K': 1440, '1080p': 1080, '720p': 720}
+        return resolution in limits and shorter_side > limits[resolution]
+    
+    def _needs_audio_transcode(self, info: Optional[VideoInfo], output_path: str) -> bool:
+        """源音频无法直接复制进输出容器时返回 True"""
+        if not info or not info.get('audio_codec'):
+            return False
+        if os.path.splitext(output_path)[1].lower() not in ('.mp4', '.m4v', '.mov'):
+            return False
+        return info['audio_codec'].lower() not in self.MP4_AUDIO_CODECS
+    
+    @classmethod
+    def _needs_video_transcode(cls, info: Optional[VideoInfo], output_path: str) -> bool:
+        """源视频流无法直接复制进输出容器时返回 True（只能重新编码）"""
+        if not info or not info.get('codec'):
+            return False
+        if os.path.splitext(output_path)[1].lower() not in ('.mp4', '.m4v', '.mov'):
+            return False
+        return info['codec'].lower() not in cls.MP4_VIDEO_CODECS
+    
+    @traced('decide_action')
+    def decide_action(self, input_path: str, output_path: str, codec: str, quality: str,
+                      crf: int = None, resolution: str = None,
+                      smart_skip: bool = True,
+                      info: Optional[VideoInfo] = None,
+                      preset: str = None, threads: int = 0) -> Tuple[str, str]:
+        """决定单个文件的处理方式
         
-        # 目标编码名称
-        target_codec_names = []
-        if codec == 'h265':
-            target_codec_names = ['hevc', 'h265']
-        else:
-            target_codec_names = ['h264', 'avc']
+        - skip:   源视频已满足目标，且配置为不输出（skip_action=skip）
+        - remux:  源视频已满足目标，只需 -c copy 换封装（按磁盘速度完成）
+        - audio:  视频流可以直接复制，但音频无法放入输出容器，只转码音频
+        - encode: 完整视频编码
         
-        # 检查是否已经是目标编码
-        is_target_codec = current_codec in target_codec_names
+        启用 sample_probe 时，码率表判断需要编码的长视频会先编码几个短样本，
+        预测节省不足 sample_min_saving 则按已满足目标处理。
         
-        # 检查分辨率是否需要调整（使用短边判断）
-        needs_resolution_change = False
-        if resolution and resolution != 'original':
-            if resolution == '4K' and shorter_side > 2160:
-                needs_resolution_change = True
-            elif resolution == '2K' and shorter_side > 1440:
-                needs_resolution_change = True
-            elif resolution == '1080p' and shorter_side > 1080:
-                needs_resolution_change = True
-            elif resolution == '720p' and shorter_side > 720:
-                needs_resolution_change = True
+        Returns:
+            (action, reason)
+        """
+        if not smart_skip:
+            return 'encode', "已禁用智能跳过"
         
-        # 判断1: 已经是目标编码且码率足够低
-        if is_target_codec and current_bitrate > 0 and current_bitrate <= target_bitrate:
-            if not needs_resolution_change:
-                reason = (f"已是 {current_codec.upper()} 且码率 "
-                         f"{current_bitrate/1000000:.1f} Mbps ≤ 目标 {target_bitrate/1000000:.1f} Mbps")
-                return True, reason
+        if info is None:
+            info = self.get_video_info(input_path)
+        should_skip, skip_reason = self.should_skip_video(
+            input_path, codec, quality, crf, resolution, info=info, preset=preset
+        )
+        if not should_skip:
+            should_skip, skip_reason = self._sample_probe_decision(
+                input_path, output_path, codec, quality, crf, preset, resolution, threads, info
+            )
+            if not should_skip:
+                return 'encode', skip_reason or "需要重新编码"
         
-        # 判断2: 预估转码后文件会变大
-        if duration > 0:
-            # 预估转码后的文件大小（字节）
-            # 公式: (目标码率 * 时长) / 8 * 1.1 (预留10%音频和容器开销)
-            estimated_size = (target_bitrate * duration / 8) * 1.1
-            
-            # 如果预估大小 >= 原文件大小的 95%，则跳过（避免转码后反而变大）
-            if estimated_size >= current_size * 0.95:
-                reason = (f"预估转码后 {self._format_size(int(estimated_size))} "
-                         f">= 原文件 {self._format_size(current_size)} 的 95%，跳过转码")
-                return True, reason
+        if self.config.get('skip_action') == 'skip':
+            return 'skip', skip_reason
         
-        return False, ""
+        # 换封装要求视频流能直接放入输出容器，否则只能重新编码
+        if self._needs_video_transcode(info, output_path):
+            return 'encode', f"{skip_reason}；视频 {info['codec']} 无法直接放入输出容器，需重新编码"
+        if self._needs_audio_transcode(info, output_path):
+            return 'audio', f"{skip_reason}；音频 {info['audio_codec']} 需转为 AAC"
+        return 'remux', skip_reason
+    
+    def _sample_probe_decision(self, input_path: str, output_path: str, codec: str, quality: str,
+                               crf: int, preset: str, resolution: str, threads: int,
+                               info: Optional[VideoInfo]) -> Tuple[bool, str]:
+        """用样本编码判断完整编码是否值得
+
+        Returns:
+            (should_skip, reason)；未启用或不适用时返回 (False, "")
+        """
+        if not self.config.get('sample_probe') or not info:
+            return False, ""
+        duration = info.get('duration') or 0
+        if duration < self.config.get('sample_probe_min_duration', 600):
+            return False, ""
+        # 需要缩小分辨率时只能编码（换封装无法缩放），样本结果不影响决策
+        _, shorter_side = self._get_resolution_tier(info.get('width', 1920), info.get('height', 1080))
+        if self._needs_resolution_change(shorter_side, resolution):
+            return False, ""
+        
+        target_crf, target_preset = self._resolve_quality(quality, crf, preset)
+        # 样本编码同样受内存和负载准入限制（样本很小，不预留磁盘）
+        problem = self._acquire_resources(input_path, output_path, info, 'encode', codec,
+                                          target_crf, target_preset, resolution, need_disk=0)
+        if problem:
+            return False, ""
+        try:
+            sample = self.sample_encode(input_path, output_path, codec, target_crf, target_preset,
+                                        resolution, threads, info)
+        finally:
+            self._release_resources(input_path)
+        if not sample:
+            return False, ""
+        
+        input_size = info.get('size') or os.path.getsize(input_path)
+        min_saving = self.config.get('sample_min_saving', 0.1)
+        should_skip, saving = self._sample_skip(info, output_path, input_size,
+                                                sample['projected_size'], min_saving)
+        summary = (f"样本编码预测 {self._format_size(input_size)} → "
+                   f"{self._format_size(sample['projected_size'])}，"
+                   f"预计编码耗时 {self._format_duration(sample['encode_time'])}（{sample['speed']:.2f}x）")
+        self.logger.info(f"🧪 {os.path.basename(input_path)}: {summary}")
+        
+        if should_skip:
+            return True, f"{summary}，节省不足 {min_saving * 100:.0f}%"
+        if saving < min_saving:
+            return False, f"{summary}；{(info.get('codec') or '').lower()} 无法直接放入输出容器"
+        return False, summary
+    
+    @classmethod
+    def _sample_skip(cls, info: VideoInfo, output_path: str, input_size: int,
+                     projected_size: int, min_saving: float) -> Tuple[bool, float]:
+        """按样本外推的输出大小判断是否值得完整编码
+        
+        Returns:
+            (should_skip, saving)：预计节省比例不足 min_saving 时跳过；视频流无法直接放入
+            输出容器时，即使节省不多也只能重新编码
+        """
+        saving = 1 - projected_size / input_size if input_size else 0.0
+        if saving >= min_saving:
+            return False, saving
+        if cls._needs_video_transcode(info, output_path):
+            return False, saving
+        return True, saving
+    
+    @traced('sample_encode')
+    def sample_encode(self, input_path: str, output_path: str, codec: str, crf: int, preset: str,
+                      resolution: str = None, threads: int = 0,
+                      info: Optional[VideoInfo] = None) -> Optional[Dict]:
+        """编码几个均匀分布的短样本，外推完整编码的输出大小和速度
+        
+        样本只编码视频流；音频大小按源文件总码率减去视频码率估算
+        （需要转为 AAC 时按 192 kbps 估算）。
+        
+        Returns:
+            {'video_bitrate', 'projected_size', 'speed', 'encode_time', 'samples'}；
+            视频过短或样本编码失败时返回 None
+        """
+        if info is None:
+            info = self.get_video_info(input_path)
+        duration = info.get('duration') if info else 0
+        count = max(1, int(self.config.get('sample_count', 3)))
+        length = float(self.config.get('sample_seconds', 10))
+        # 样本总时长超过视频一半时，直接完整编码更划算
+        if not duration or count * length * 2 > duration:
+            return None
+        
+        encoded_bytes = 0
+        encoded_seconds = 0.0
+        elapsed = 0.0
+        with tempfile.TemporaryDirectory(prefix='videoforge-sample-') as tmp:
+            for i in range(count):
+                start = duration * (i + 0.5) / count - length / 2
+                sample_path = os.path.join(tmp, f'sample{i}.mkv')
+                cmd = ['ffmpeg', '-v', 'error', '-ss', f'{max(0.0, start):.3f}', '-i', input_path,
+                       '-t', f'{length:g}', '-map', '0:v:0', '-an', '-sn', '-dn']
+                cmd.extend(self._video_encode_args(codec, crf, preset, resolution, threads))
+                cmd.extend(['-y', sample_path])
+                
+                started = time.monotonic()
+                process = subprocess.run(self._with_priority(cmd), capture_output=True, text=True)
+                elapsed += time.monotonic() - started
+                if process.returncode != 0 or not os.path.exists(sample_path):
+                    self.logger.warning(f"⚠️  样本编码失败 {os.path.basename(input_path)}: "
+                                        f"{process.stderr.strip()[-500:]}")
+                    return None
+                encoded_bytes += os.path.getsize(sample_path)
+                encoded_seconds += length
+        
+        return dict(self._project_sample(info, encoded_bytes, encoded_seconds, elapsed,
+                                         self._needs_audio_transcode(info, output_path)),
+                    samples=count)
+    
+    @staticmethod
+    def _project_sample(info: VideoInfo, encoded_bytes: int, encoded_seconds: float, elapsed: float,
+                        audio_transcode: bool) -> Dict:
+        """由样本编码的结果外推完整编码的输出大小和速度
+        
+        音频大小按源文件总码率减去视频码率估算，需要转为 AAC 时按 192 kbps 估算。
+        
+        Returns:
+            {'video_bitrate', 'projected_size', 'speed', 'encode_time'}
+        """
+        duration = info['duration']
+        video_bitrate = encoded_bytes * 8 / encoded_seconds
+        if audio_transcode:
+            audio_bitrate = 192000
+        else:
+            total_bitrate = (info.get('size') or 0) * 8 / duration
+            audio_bitrate = max(0, total_bitrate - (info.get('bit_rate') or total_bitrate))
+        speed = encoded_seconds / elapsed if elapsed > 0 else 0
+        return {
+            'video_bitrate': video_bitrate,
+            'projected_size': int((video_bitrate + audio_bitrate) * duration / 8),
+            'speed': speed,
+            'encode_time': duration / speed if speed > 0 else 0
+        }
     
     def transcode_video(self, input_path: str, output_path: str, 
                        codec: str = 'h265', quality: str = 'medium',
                        preset: str = None, crf: int = None,
                        resolution: str = None, 
-                       smart_skip: bool = True) -> bool:
+                       smart_skip: bool = True,
+                       threads: int = 0,
+                       segments: int = 0,
+                       info: Optional[VideoInfo] = None,
+                       renditions: List[Dict] = None) -> bool:
         """转码单个视频文件
         
+        输出先写入同目录下的临时文件，转码成功后再原子地重命名为目标文件，
+        中途崩溃不会留下看似完整的输出。
+        
         Args:
             smart_skip: 智能跳过（如果源视频已经是目标编码且码率更低）
+            threads: 单个任务的编码线程数（0 表示由 ffmpeg 自动决定）
+            segments: 大于 1 时，将时长超过 segment_min_duration 的视频切分为
+                      segments 段并行编码后无损拼接
+            info: 已探测的视频信息（不传则探测一次，之后的决策和统计都复用它）
+            renditions: 多个输出配置（name、codec、quality、preset、crf、resolution、output），
+                        未指定的项使用上面的参数；所有输出由一条 ffmpeg 命令生成，源视频只解码一次
         """
+        if renditions:
+            try:
+                outputs = self._resolve_renditions(renditions, output_path, codec, quality,
+                                                   preset, crf, resolution, input_path=input_path)
+            except ValueError as e:
+                self.logger.error(f"❌ {e}")
+                return False
+            results = self._transcode_renditions(input_path, outputs, smart_skip=smart_skip,
+                                                 threads=threads, info=info)
+            return all(result['state'] != 'failed' for result in results)
         
-        # 智能跳过检查
-        if smart_skip:
-            should_skip, skip_reason = self.should_skip_video(
-                input_path, codec, quality, crf, resolution
-            )
-            if should_skip:
-                self.logger.info(
-                    f"⏭️  智能跳过: {os.path.basename(input_path)} ({skip_reason})"
-                )
-                self.stats['skipped'] += 1
-                self.stats['skipped_smart'] += 1
-                return True  # 返回 True 表示"成功"（跳过也算成功）
+        result = self._transcode_file(
+            input_path, output_path, codec=codec, quality=quality, preset=preset,
+            crf=crf, resolution=resolution, smart_skip=smart_skip, threads=threads,
+            segments=segments, info=info
+        )
+        return result['state'] != 'failed'
+    
+    async def transcode_video_async(self, input_path: str, output_path: str,
+                                    codec: str = 'h265', quality: str = 'medium',
+                                    preset: str = None, crf: int = None,
+                                    resolution: str = None,
+                                    smart_skip: bool = True,
+                                    threads: int = 0,
+                                    info: Optional[VideoInfo] = None,
+                                    progress: Optional[asyncio.Queue] = None) -> bool:
+        """transcode_video 的 asyncio 版本
         
-        # 获取质量预设
+        ffmpeg 以 asyncio 子进程运行，不占用线程；同一事件循环中同时运行的编码数受 max_threads 限制。
+        任务被取消时结束 ffmpeg、删除临时输出并重新抛出 CancelledError。
+        资源准入与同步版本相同（在线程池中等待）；不支持分段编码和多输出。
+        
+        Args:
+            progress: 进度事件（与 add_progress_callback 收到的相同）写入该队列，
+                      结束事件的 state 为 done/failed/cancelled
+        """
+        result = await self._transcode_file_async(
+            input_path, output_path, codec=codec, quality=quality, preset=preset,
+            crf=crf, resolution=resolution, smart_skip=smart_skip, threads=threads,
+            info=info, progress=progress
+        )
+        return result['state'] != 'failed'
+    
+    async def transcode_progress(self, input_path: str, output_path: str, **kwargs):
+        """以异步迭代器的形式转码，产出进度事件
+        
+            async for event in forge.transcode_progress('in.mov', 'out.mp4', codec='h264'):
+                print(event.get('percent'))
+        
+        参数与 transcode_video_async 相同。最后产出一次结果
+        {'state': 'done'/'skipped'/'failed', 'action', 'reason'}；提前退出循环时取消转码。
+        """
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(self._transcode_file_async(input_path, output_path,
+                                                                progress=queue, **kwargs))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+    
+    async def _transcode_file_async(self, input_path: str, output_path: str,
+                                    codec: str = 'h265', quality: str = 'medium',
+                                    preset: str = None, crf: int = None,
+                                    resolution: str = None,
+                                    smart_skip: bool = True,
+                                    threads: int = 0,
+                                    info: Optional[VideoInfo] = None,
+                                    progress: Optional[asyncio.Queue] = None) -> Dict:
+        """_transcode_file 的 asyncio 版本"""
+        loop = asyncio.get_running_loop()
+        if info is None:
+            info = await self.get_video_info_async(input_path)
+        
+        # 探测失败时 decide_action 会同步重试 ffprobe，样本编码也会阻塞，都放到默认线程池中
+        action, reason = await loop.run_in_executor(None, functools.partial(
+            self.decide_action, input_path, output_path, codec, quality, crf, resolution,
+            smart_skip, info=info, preset=preset, threads=threads
+        ))
+        self._record_action(action)
+        result = {'state': 'done', 'action': action, 'reason': reason}
+        
+        if action == 'skip':
+            return self._skip_file(input_path, result)
+        
+        crf, preset = self._resolve_quality(quality, crf, preset)
+        duration = info.get('duration', 0) if info else 0
+        partial_path = self._partial_path(output_path)
+        
+        async with self._async_semaphore('encode'):
+            # 资源准入：磁盘空间、内存和系统负载
+            problem = await self._acquire_resources_async(input_path, output_path, info, action,
+                                                          codec, crf, preset, resolution)
+            if problem:
+                self._inc_stat('failed')
+                self.metrics.inc('files_total', state='failed', action=action)
+                return dict(result, state='failed', reason=problem)
+            
+            started = time.monotonic()
+            try:
+                cmd = self._single_command(input_path, partial_path, result, codec, crf, preset,
+                                           resolution, threads, self._audio_args(info, output_path))
+                returncode, stderr_tail = await self._run_ffmpeg_async(cmd, input_path, output_path,
+                                                                       duration, progress)
+                finish = functools.partial(self._finish_transcode, input_path, output_path, info, result,
+                                           codec, crf, preset, resolution, returncode, stderr_tail, started)
+                if self.config.get('verify_output'):
+                    # 校验输出需要同步探测一次
+                    return await loop.run_in_executor(None, finish)
+                return finish()
+            except asyncio.CancelledError:
+                self.logger.warning(f"🛑 已取消: {os.path.basename(input_path)}")
+                self._remove_partial(partial_path)
+                self._record_job_metrics(input_path, info, action, 'cancelled', time.monotonic() - started)
+                raise
+            except Exception as e:
+                self.logger.error(f"❌ 转码异常 {input_path}: {e}")
+                self._inc_stat('failed')
+                self._remove_partial(partial_path)
+                self._record_job_metrics(input_path, info, action, 'failed', time.monotonic() - started)
+                return dict(result, state='failed')
+            finally:
+                self._release_resources(input_path)
+                self._write_metrics()
+    
+    async def _acquire_resources_async(self, input_path: str, *args) -> Optional[str]:
+        """_acquire_resources 的 asyncio 版本：在默认线程池中等待准入
+        
+        等待期间任务被取消时，线程中的准入结束后立即释放预留。
+        """
+        future = asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self._acquire_resources, input_path, *args)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            def release(done: asyncio.Future):
+                if not done.cancelled() and done.exception() is None and done.result() is None:
+                    self._release_resources(input_path)
+            future.add_done_callback(release)
+            raise
+    
+    @staticmethod
+    def _partial_path(output_path: str) -> str:
+        """转码过程中使用的临时输出路径（保留扩展名，ffmpeg 据此选择容器格式）"""
+        directory, name = os.path.split(output_path)
+        stem, ext = os.path.splitext(name)
+        return os.path.join(directory, f".{stem}.partial{ext}")
+    
+    def _resolve_quality(self, quality: str, crf: int = None, preset: str = None) -> Tuple[int, str]:
+        """根据质量预设补全 CRF 和编码速度预设"""
         if quality in self.QUALITY_PRESETS:
             quality_preset = self.QUALITY_PRESETS[quality]
             if crf is None:
@@ -311,94 +3113,733 @@ class VideoForge:
         else:
             crf = crf or 23
             preset = preset or 'medium'
-        
-        # 构建 ffmpeg 命令
+        return crf, preset
+    
+    def _video_encode_args(self, codec: str, crf: int, preset: str,
+                           resolution: str = None, threads: int = 0) -> List[str]:
+        """视频编码参数（编码器、CRF、速度预设、线程数、缩放）"""
         codec_lib = 'libx265' if codec == 'h265' else 'libx264'
         
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
+        args = [
             '-c:v', codec_lib,
             '-crf', str(crf),
             '-preset', preset,
-            '-c:a', 'copy',  # 音频直接复制
         ]
         
+        # 限制单个任务的线程数，避免多个并发任务争抢 CPU
+        if threads and threads > 0:
+            args.extend(['-threads', str(threads)])
+            if codec == 'h265':
+                args.extend(['-x265-params', f'pools={threads}'])
+        
         # 分辨率调整
-        if resolution and resolution != 'original':
-            if resolution == '1080p':
-                cmd.extend(['-vf', 'scale=-2:1080'])
-            elif resolution == '720p':
-                cmd.extend(['-vf', 'scale=-2:720'])
+        scale = self._scale_filter(resolution)
+        if scale:
+            args.extend(['-vf', scale])
+        
+        return args
+    
+    @staticmethod
+    def _scale_filter(resolution: str = None) -> Optional[str]:
+        """目标分辨率对应的缩放滤镜（不需要缩放时返回 None）"""
+        if resolution == '1080p':
+            return 'scale=-2:1080'
+        if resolution == '720p':
+            return 'scale=-2:720'
+        return None
+    
+    def _audio_args(self, info: Optional[VideoInfo], output_path: str) -> List[str]:
+        """音频能直接复制就复制，否则转为 AAC"""
+        if self._needs_audio_transcode(info, output_path):
+            return ['-c:a', 'aac', '-b:a', '192k']
+        return ['-c:a', 'copy']
+    
+    @traced('transcode_video')
+    def _transcode_file(self, input_path: str, output_path: str,
+                        codec: str = 'h265', quality: str = 'medium',
+                        preset: str = None, crf: int = None,
+                        resolution: str = None,
+                        smart_skip: bool = True,
+                        threads: int = 0,
+                        segments: int = 0,
+                        info: Optional[VideoInfo] = None,
+                        destination: str = None) -> Dict:
+        """转码单个视频文件
+        
+        destination: 输出写入暂存区时的最终目标路径（资源准入同时检查其所在磁盘）
+        
+        Returns:
+            {'state': 'done'/'skipped'/'failed', 'action': 处理方式, 'reason': 原因}
+        """
+        
+        # 每个文件只探测一次，决策、命令构建和统计都使用同一份信息
+        if info is None:
+            info = self.get_video_info(input_path)
+        
+        # 决定处理方式（跳过 / 换封装 / 仅转音频 / 完整编码）
+        action, reason = self.decide_action(
+            input_path, output_path, codec, quality, crf, resolution, smart_skip,
+            info=info, preset=preset, threads=threads
+        )
+        self._record_action(action)
+        result = {'state': 'done', 'action': action, 'reason': reason}
         
-        # 输出文件
-        cmd.extend(['-y', output_path])  # -y 覆盖已存在的文件
+        if action == 'skip':
+            return self._skip_file(input_path, result)
         
+        # 获取质量预设
+        crf, preset = self._resolve_quality(quality, crf, preset)
+        
+        # 时长用于计算进度百分比及分段
+        duration = info.get('duration', 0) if info else 0
+        
+        # 音频能直接复制就复制，否则转为 AAC
+        audio_args = self._audio_args(info, output_path)
+        
+        # 输出文件（先写临时文件，-y 覆盖上次中断留下的临时文件）
+        partial_path = self._partial_path(output_path)
+        
+        # 超长视频按关键帧切分后并行编码
+        segmented = action == 'encode' and segments > 1 and duration >= self.config.get('segment_min_duration', 600)
+        need_disk = None
+        if segmented:
+            # 切分出的片段（约等于源视频流）、编码后的片段和拼接输出同时存在于输出目录
+            need_disk = (info.get('size') or 0) + 2 * self._projected_output_size(
+                info, action, codec, crf, preset, resolution)
+        
+        # 资源准入：磁盘空间、内存和系统负载
+        problem = self._acquire_resources(input_path, output_path, info, action,
+                                          codec, crf, preset, resolution, need_disk=need_disk,
+                                          destination=destination)
+        if problem:
+            self._inc_stat('failed')
+            self.metrics.inc('files_total', state='failed', action=action)
+            return dict(result, state='failed', reason=problem)
+        
+        started = time.monotonic()
         try:
-            self.logger.info(f"🔄 开始转码: {os.path.basename(input_path)}")
-            self.logger.debug(f"命令: {' '.join(cmd)}")
+            if segmented:
+                self.logger.info(f"🔄 开始转码: {os.path.basename(input_path)}")
+                returncode, stderr_tail = self._transcode_segmented(
+                    input_path, output_path, partial_path, duration, segments,
+                    codec, crf, preset, resolution, threads, audio_args
+                )
+            else:
+                cmd = self._single_command(input_path, partial_path, result, codec, crf, preset,
+                                           resolution, threads, audio_args)
+                returncode, stderr_tail = self._run_ffmpeg(cmd, input_path, output_path, duration)
+            if action == 'encode':
+                # 只计 ffmpeg 本身的耗时（截止时间模式据此估计编码速度）
+                result['encode_seconds'] = time.monotonic() - started
             
-            # 执行转码
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
+            return self._finish_transcode(input_path, output_path, info, result, codec, crf, preset,
+                                          resolution, returncode, stderr_tail, started)
+                
+        except Exception as e:
+            self.logger.error(f"❌ 转码异常 {input_path}: {e}")
+            self._inc_stat('failed')
+            self._remove_partial(partial_path)
+            self._record_job_metrics(input_path, info, action, 'failed', time.monotonic() - started)
+            return dict(result, state='failed')
+        finally:
+            self._release_resources(input_path)
+            self._write_metrics()
+    
+    def _skip_file(self, input_path: str, result: Dict) -> Dict:
+        """记录智能跳过（跳过也算成功）"""
+        self.logger.info(
+            f"⏭️  智能跳过: {os.path.basename(input_path)} ({result['reason']})"
+        )
+        self._inc_stat('skipped')
+        self._inc_stat('skipped_smart')
+        self.metrics.inc('skipped_total', reason='smart')
+        self.metrics.inc('files_total', state='skipped', action=result['action'])
+        return dict(result, state='skipped')
+    
+    def _single_command(self, input_path: str, partial_path: str, result: Dict,
+                        codec: str, crf: int, preset: str, resolution: str,
+                        threads: int, audio_args: List[str]) -> List[str]:
+        """单个输出的 ffmpeg 命令（换封装 / 仅转音频 / 完整编码）"""
+        if result['action'] in ('remux', 'audio'):
+            self.logger.info(f"📦 {'换封装' if result['action'] == 'remux' else '转换音频'}: "
+                             f"{os.path.basename(input_path)} ({result['reason']})")
+            # 视频流直接复制，只处理容器和音频
+            cmd = ['ffmpeg', '-i', input_path, '-map', '0:v', '-map', '0:a?', '-c:v', 'copy']
+        else:
+            self.logger.info(f"🔄 开始转码: {os.path.basename(input_path)}")
+            cmd = ['ffmpeg', '-i', input_path]
+            cmd.extend(self._video_encode_args(codec, crf, preset, resolution, threads))
+        cmd.extend(audio_args)
+        cmd.extend(['-y', partial_path])
+        self.logger.debug(f"命令: {' '.join(cmd)}")
+        return cmd
+    
+    def _finish_transcode(self, input_path: str, output_path: str, info: Optional[VideoInfo],
+                          result: Dict, codec: str, crf: int, preset: str, resolution: str,
+                          returncode: int, stderr_tail: str, started: float) -> Dict:
+        """ffmpeg 结束后的处理：校验并重命名临时输出，记录统计、指标和码率样本"""
+        action = result['action']
+        partial_path = self._partial_path(output_path)
+        if returncode != 0:
+            self.logger.error(f"❌ 转码失败: {os.path.basename(input_path)}\n{stderr_tail}")
+            self._inc_stat('failed')
+            self._remove_partial(partial_path)
+            self._record_job_metrics(input_path, info, action, 'failed', time.monotonic() - started)
+            return dict(result, state='failed')
+        
+        # 可选：探测一次输出文件，确认时长与源文件一致
+        output_info = None
+        if self.config.get('verify_output'):
+            output_info = self.get_video_info(partial_path, use_cache=False)
+            problem = self._verify_output(info, output_info)
+            if problem:
+                self.logger.error(f"❌ 输出校验失败: {os.path.basename(input_path)} ({problem})")
+                self._inc_stat('failed')
+                self._remove_partial(partial_path)
+                return dict(result, state='failed', reason=problem)
+        
+        os.replace(partial_path, output_path)
+        if output_info is not None and self.probe_cache is not None:
+            self.probe_cache.put(output_path, output_info)
+        output_size = self._report_output(input_path, output_path, action, info, output_info)
+        if action == 'encode':
+            self._learn_bitrate(info, codec, crf, preset, resolution, output_size)
+        self._record_job_metrics(input_path, info, action, 'done',
+                                 time.monotonic() - started, output_size)
+        return result
+    
+    def _record_job_metrics(self, input_path: str, info: Optional[VideoInfo], action: str,
+                            state: str, elapsed: float, output_size: int = 0,
+                            rendition: str = None):
+        """记录单个文件的耗时、速度和大小指标"""
+        info = info or {}
+        input_size = info.get('size') or 0
+        duration = info.get('duration') or 0
+        self.metrics.inc('files_total', state=state, action=action)
+        self.metrics.observe('job_seconds', elapsed, action=action)
+        entry = {'path': input_path, 'action': action, 'state': state,
+                 'seconds': round(elapsed, 3), 'input_bytes': input_size}
+        if rendition:
+            entry['rendition'] = rendition
+        if state == 'done':
+            self.metrics.inc('bytes_in_total', input_size, action=action)
+            self.metrics.inc('bytes_out_total', output_size, action=action)
+            self.metrics.observe('input_bytes', input_size, action=action)
+            if input_size:
+                self.metrics.observe('output_ratio', output_size / input_size, action=action)
+            entry['output_bytes'] = output_size
+            if action == 'encode' and duration and elapsed > 0:
+                self.metrics.observe('encode_speed', duration / elapsed)
+                entry['speed'] = round(duration / elapsed, 3)
+                if info.get('fps'):
+                    self.metrics.observe('encode_fps', duration * info['fps'] / elapsed)
+                    entry['fps'] = round(duration * info['fps'] / elapsed, 2)
+        self.metrics.record_file(**entry)
+    
+    def _verify_output(self, info: Optional[VideoInfo], output_info: Optional[VideoInfo]) -> str:
+        """校验输出文件，返回问题描述（无问题返回空字符串）"""
+        if not output_info:
+            return "无法读取输出文件的视频流"
+        if info and info.get('duration'):
+            # 容器和编码器的填充会带来少量误差，允许 1 秒或 1%
+            diff = abs(output_info.get('duration', 0) - info['duration'])
+            if diff > max(1.0, info['duration'] * 0.01):
+                return (f"时长不一致: 源 {self._format_duration(info['duration'])}, "
+                        f"输出 {self._format_duration(output_info.get('duration', 0))}")
+        return ""
+    
+    @traced('report_output')
+    def _report_output(self, input_path: str, output_path: str, action: str = 'encode',
+                       info: Optional[VideoInfo] = None,
+                       output_info: Optional[VideoInfo] = None,
+                       rendition: str = None) -> int:
+        """记录转码前后的大小变化（优先使用已探测的大小，避免重复 stat），返回输出大小
+        
+        rendition: 多输出时的输出名称（日志中标注，并计入该输出的统计）
+        """
+        # 获取文件大小
+        input_size = info.get('size') if info else 0
+        input_size = input_size or os.path.getsize(input_path)
+        output_size = output_info.get('size') if output_info else 0
+        output_size = output_size or os.path.getsize(output_path)
+        
+        # 转码成功
+        ratio = (1 - output_size / input_size) * 100 if input_size > 0 else 0
+        label = f" [{rendition}]" if rendition else ""
+        
+        if action != 'encode':
+            # 视频流未重新编码，大小变化只来自容器和音频
+            self.logger.info(
+                f"✅ {'换封装' if action == 'remux' else '音频转换'}完成{label}: {os.path.basename(input_path)} "
+                f"({self._format_size(input_size)} → {self._format_size(output_size)})"
+            )
+        elif ratio >= 0:
+            self.logger.info(
+                f"✅ 转码完成{label}: {os.path.basename(input_path)} "
+                f"({self._format_size(input_size)} → {self._format_size(output_size)}, "
+                f"节省 {ratio:.1f}%)"
+            )
+        else:
+            # 即使变大也保留（因为前面已经预估过，这种情况应该很少）
+            self.logger.warning(
+                f"⚠️  转码后文件变大{label}: {os.path.basename(input_path)} "
+                f"({self._format_size(input_size)} → {self._format_size(output_size)}, "
+                f"增大 {abs(ratio):.1f}%)，但已完成转码"
             )
+            self._inc_stat('skipped_larger')
+        
+        self._inc_stat('total_size_before', input_size)
+        self._inc_stat('total_size_after', output_size)
+        self._inc_stat('processed')
+        if rendition:
+            self._inc_rendition_stat(rendition, 'total_size_before', input_size)
+            self._inc_rendition_stat(rendition, 'total_size_after', output_size)
+            self._inc_rendition_stat(rendition, 'processed')
+        return output_size
+    
+    def _learn_bitrate(self, info: Optional[VideoInfo], codec: str, crf: int, preset: str,
+                       resolution: str, output_size: int):
+        """把完成的编码结果记入码率预测模型"""
+        if self.predictor is None or not info or not info.get('duration'):
+            return
+        # 与码率表口径一致：扣除约 10% 的音频和容器开销，得到视频码率
+        output_bitrate = output_size * 8 / info['duration'] / 1.1
+        short_side = self._output_short_side(min(info.get('width') or 0, info.get('height') or 0), resolution)
+        try:
+            self.predictor.record(info, codec, crf, preset, short_side, output_bitrate)
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️  记录码率样本失败: {e}")
+    
+    @traced('transcode_segmented')
+    def _transcode_segmented(self, input_path: str, output_path: str, partial_path: str,
+                             duration: float, segments: int,
+                             codec: str, crf: int, preset: str,
+                             resolution: str = None, threads: int = 0,
+                             audio_args: List[str] = None) -> Tuple[int, str]:
+        """分段并行编码单个长视频
+        
+        1. 视频流按关键帧无损切分为约 segments 段（segment muxer，时间戳归零）
+        2. 各段由独立的 ffmpeg 进程并行编码（任务的线程预算平均分给同时编码的各段），
+           进度汇总后按原文件发布
+        3. concat demuxer 无损拼接视频，音频从原文件整段处理（audio_args，能复制就复制），保证连续且时间戳准确
+        
+        Returns:
+            (returncode, stderr_tail)
+        """
+        work_dir = tempfile.mkdtemp(prefix='.videoforge-seg-', dir=os.path.dirname(output_path) or '.')
+        try:
+            # 1. 按关键帧切分（只切视频流）
+            segment_time = duration / segments
+            split_cmd = [
+                'ffmpeg', '-i', input_path,
+                '-map', '0:v:0', '-c', 'copy',
+                '-f', 'segment',
+                '-segment_time', f"{segment_time:.3f}",
+                '-reset_timestamps', '1',
+                '-y', os.path.join(work_dir, 'src_%04d.mkv')
+            ]
+            self.logger.info(f"✂️  切分为约 {segments} 段（每段 {self._format_duration(segment_time)}）")
+            result = subprocess.run(split_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    universal_newlines=True, errors='replace')
+            if result.returncode != 0:
+                return result.returncode, result.stderr[-2000:]
             
-            # 实时输出进度（简化版）
-            for line in process.stderr:
-                if 'time=' in line:
-                    # 可以解析进度信息
-                    pass
+            sources = sorted(f for f in os.listdir(work_dir) if f.startswith('src_'))
+            if not sources:
+                return 1, "切分后没有生成任何片段"
+            
+            # 2. 并行编码各段
+            parallel = min(segments, len(sources))
+            seg_threads = self._segment_threads(threads, parallel)
+            
+            # 各段的进度汇总为原文件的进度（已编码时长相加，速度按正在编码的段相加）
+            parent = {'event': self._progress_event(input_path, output_path, duration)}
+            seg_events = {}
+            progress_lock = threading.Lock()
+            
+            def encode(name: str) -> Tuple[int, str]:
+                src = os.path.join(work_dir, name)
+                dst = os.path.join(work_dir, name.replace('src_', 'enc_'))
+                cmd = self._segment_command(src, dst, codec, crf, preset, resolution, seg_threads)
+                
+                def report(event: Dict, final: bool = False):
+                    with progress_lock:
+                        seg_events[name] = event
+                        running = [e for e in seg_events.values() if e['state'] == 'running']
+                        parent['event'] = self._update_progress(parent['event'], {
+                            'out_time': sum(e['out_time'] for e in seg_events.values()),
+                            'fps': sum(e['fps'] or 0 for e in running) or None,
+                            'speed': sum(e['speed'] or 0 for e in running) or None
+                        })
+                        self._publish_progress(parent['event'])
+                
+                return self._run_ffmpeg(cmd, src, dst, on_progress=report)
+            
+            with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='VideoForge-seg') as executor:
+                results = list(executor.map(encode, sources))
+            for returncode, stderr_tail in results:
+                if returncode != 0:
+                    self._publish_progress(self._final_progress(parent['event'], returncode), final=True)
+                    return returncode, stderr_tail
+            
+            # 3. 拼接视频，音频从原文件复制或转码（与单进程编码相同的 audio_args）
+            list_file = os.path.join(work_dir, 'segments.txt')
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for name in sources:
+                    f.write(f"file '{name.replace('src_', 'enc_')}'\n")
+            
+            concat_cmd = [
+                'ffmpeg',
+                '-f', 'concat', '-safe', '0', '-i', list_file,
+                '-i', input_path,
+                '-map', '0:v:0', '-map', '1:a?',
+                '-c:v', 'copy'
+            ] + (audio_args or ['-c:a', 'copy']) + ['-y', partial_path]
+            return self._run_ffmpeg(concat_cmd, input_path, output_path, duration)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _segment_threads(threads: int, parallel: int) -> int:
+        """每段的编码线程数：任务的线程预算（0 表示全部 CPU 核）平均分给同时编码的段"""
+        budget = threads or os.cpu_count() or 1
+        return max(1, budget // max(1, parallel))
+    
+    def _segment_command(self, src: str, dst: str, codec: str, crf: int, preset: str,
+                         resolution: str, threads: int) -> List[str]:
+        """单个片段的编码命令（只编码视频，音频在拼接时处理）"""
+        return (['ffmpeg', '-i', src, '-map', '0:v:0']
+                + self._video_encode_args(codec, crf, preset, resolution, threads)
+                + ['-an', '-y', dst])
+    
+    def _resolve_renditions(self, renditions: List[Dict], output: str, codec: str, quality: str,
+                            preset: str = None, crf: int = None,
+                            resolution: str = None, input_path: str = None) -> List[Dict]:
+        """补全多输出配置：未指定的项使用主输出的参数，名称默认取输出路径的文件名
+        
+        单文件转码时传入 input_path：output 是目录或没有扩展名时，输出为
+        <output>/<源文件名>.mp4（与目录转码一致）。
+        配置项未知、编码不支持或多个输出指向同一路径时抛出 ValueError。
+        """
+        defaults = {'codec': codec, 'quality': quality, 'preset': preset, 'crf': crf,
+                    'resolution': resolution, 'output': output}
+        resolved = []
+        for rendition in renditions:
+            unknown = set(rendition) - set(self.RENDITION_KEYS)
+            if unknown:
+                raise ValueError(f"未知的输出配置项: {', '.join(sorted(unknown))}")
+            r = dict(defaults, **{k: v for k, v in rendition.items() if v is not None})
+            if r['codec'] not in ('h264', 'h265'):
+                raise ValueError(f"不支持的编码格式: {r['codec']}")
+            r['output'] = str(r['output'])
+            if not r.get('name'):
+                r['name'] = os.path.basename(os.path.normpath(r['output']))
+            if input_path and (os.path.isdir(r['output']) or not os.path.splitext(r['output'])[1]):
+                r['output'] = os.path.join(r['output'], Path(input_path).stem + '.mp4')
+            resolved.append(r)
+        
+        outputs = [os.path.abspath(r['output']) for r in resolved]
+        for path in outputs:
+            if outputs.count(path) > 1:
+                raise ValueError(f"多个输出使用同一路径: {path}（为每个输出指定不同的 output）")
+        names = [r['name'] for r in resolved]
+        for i, r in enumerate(resolved):
+            if names.count(r['name']) > 1:
+                r['name'] = f"{r['name']}-{i + 1}"
+        return resolved
+    
+    def _rendition_command(self, input_path: str, outputs: List[Dict],
+                           info: Optional[VideoInfo], threads: int = 0) -> List[str]:
+        """一次解码、多路输出的 ffmpeg 命令
+        
+        需要编码的输出共用一次解码：视频流经 split 滤镜复制给各个编码器，需要缩放的分支单独缩放；
+        换封装/仅转音频的输出直接复制视频流。每个输出写入各自的临时文件。
+        """
+        encodes = [r for r in outputs if r['action'] == 'encode']
+        cmd = ['ffmpeg', '-i', input_path]
+        if encodes:
+            if len(encodes) > 1:
+                branches = [f's{i}' for i in range(len(encodes))]
+                graph = [f"[0:v:0]split={len(encodes)}" + ''.join(f'[{b}]' for b in branches)]
+            else:
+                branches = ['0:v:0']
+                graph = []
+            for i, (branch, r) in enumerate(zip(branches, encodes)):
+                graph.append(f"[{branch}]{self._scale_filter(r['resolution']) or 'null'}[v{i}]")
+            cmd.extend(['-filter_complex', ';'.join(graph)])
+        cmd.append('-y')
+        
+        # 任务的线程预算由同一进程中的各个编码器均分
+        encode_threads = max(1, threads // len(encodes)) if threads and encodes else threads
+        encoded = 0
+        for r in outputs:
+            if r['action'] == 'encode':
+                cmd.extend(['-map', f'[v{encoded}]', '-map', '0:a?'])
+                cmd.extend(self._video_encode_args(r['codec'], r['crf'], r['preset'],
+                                                   threads=encode_threads))
+                encoded += 1
+            else:
+                cmd.extend(['-map', '0:v', '-map', '0:a?', '-c:v', 'copy'])
+            cmd.extend(self._audio_args(info, r['output']))
+            cmd.append(self._partial_path(r['output']))
+        return cmd
+    
+    @traced('transcode_renditions')
+    def _transcode_renditions(self, input_path: str, renditions: List[Dict],
+                              smart_skip: bool = True, threads: int = 0,
+                              info: Optional[VideoInfo] = None) -> List[Dict]:
+        """用一条 ffmpeg 命令生成多个输出（源视频只读取和解码一次）
+        
+        每个输出单独决定处理方式（跳过 / 换封装 / 仅转音频 / 完整编码），统计按输出名称分别记录；
+        需要输出的部分合并为一条命令。多输出不使用分段编码。
+        
+        Args:
+            renditions: _resolve_renditions() 补全后的输出配置
+        
+        Returns:
+            每个输出一项：{'rendition', 'output', 'state', 'action', 'reason'}
+        """
+        if info is None:
+            info = self.get_video_info(input_path)
+        name = os.path.basename(input_path)
+        
+        results = []
+        active = []
+        for rendition in renditions:
+            action, reason = self.decide_action(
+                input_path, rendition['output'], rendition['codec'], rendition['quality'],
+                rendition['crf'], rendition['resolution'], smart_skip,
+                info=info, preset=rendition['preset'], threads=threads
+            )
+            self._record_action(action, rendition['name'])
+            result = {'rendition': rendition['name'], 'output': rendition['output'],
+                      'state': 'done', 'action': action, 'reason': reason}
+            results.append(result)
+            if action == 'skip':
+                self.logger.info(f"⏭️  智能跳过 [{rendition['name']}]: {name} ({reason})")
+                self._inc_rendition_stat(rendition['name'], 'skipped')
+                self.metrics.inc('skipped_total', reason='smart')
+                self.metrics.inc('files_total', state='skipped', action=action)
+                result['state'] = 'skipped'
+                continue
+            crf, preset = self._resolve_quality(rendition['quality'], rendition['crf'], rendition['preset'])
+            active.append((dict(rendition, crf=crf, preset=preset, action=action), result))
+        if not active:
+            # 全局统计按源文件计数：全部输出都跳过时才记一次跳过
+            self._inc_stat('skipped')
+            self._inc_stat('skipped_smart')
+            return results
+        
+        def fail(rendition: Dict, result: Dict, reason: str = None, elapsed: float = None):
+            self._inc_stat('failed')
+            self._inc_rendition_stat(rendition['name'], 'failed')
+            self._remove_partial(self._partial_path(rendition['output']))
+            if elapsed is None:
+                self.metrics.inc('files_total', state='failed', action=rendition['action'])
+            else:
+                self._record_job_metrics(input_path, info, rendition['action'], 'failed', elapsed,
+                                         rendition=rendition['name'])
+            result['state'] = 'failed'
+            if reason:
+                result['reason'] = reason
+        
+        def finish(rendition: Dict, result: Dict, elapsed: float):
+            partial_path = self._partial_path(rendition['output'])
+            output_info = None
+            if self.config.get('verify_output'):
+                output_info = self.get_video_info(partial_path, use_cache=False)
+                problem = self._verify_output(info, output_info)
+                if problem:
+                    self.logger.error(f"❌ 输出校验失败 [{rendition['name']}]: {name} ({problem})")
+                    fail(rendition, result, problem)
+                    return
             
-            process.wait()
+            os.replace(partial_path, rendition['output'])
+            if output_info is not None and self.probe_cache is not None:
+                self.probe_cache.put(rendition['output'], output_info)
+            output_size = self._report_output(input_path, rendition['output'], rendition['action'],
+                                              info, output_info, rendition=rendition['name'])
+            if rendition['action'] == 'encode':
+                self._learn_bitrate(info, rendition['codec'], rendition['crf'], rendition['preset'],
+                                    rendition['resolution'], output_size)
+            self._record_job_metrics(input_path, info, rendition['action'], 'done', elapsed,
+                                     output_size, rendition=rendition['name'])
+        
+        # 资源准入按全部输出的预估大小和内存之和（磁盘按第一个输出所在位置及其最终目标检查）
+        outputs = [rendition for rendition, _ in active]
+        first = outputs[0]
+        problem = self._acquire_resources(
+            input_path, first['output'], info, first['action'], first['codec'], first['crf'],
+            first['preset'], first['resolution'],
+            need_disk=sum(self._projected_output_size(info, r['action'], r['codec'], r['crf'],
+                                                      r['preset'], r['resolution']) for r in outputs),
+            need_memory=sum(self._job_memory(info, r['action'], r['resolution']) for r in outputs),
+            destination=first.get('target')
+        )
+        if problem:
+            for rendition, result in active:
+                fail(rendition, result, problem)
+            return results
+        
+        duration = info.get('duration', 0) if info else 0
+        summary = ', '.join(f"{r['name']}: {self.ACTION_NAMES[r['action']]}" for r in outputs)
+        self.logger.info(f"🔄 开始转码: {name} → {summary}")
+        started = time.monotonic()
+        pending = list(active)
+        try:
+            cmd = self._rendition_command(input_path, outputs, info, threads)
+            self.logger.debug(f"命令: {' '.join(cmd)}")
+            returncode, stderr_tail = self._run_ffmpeg(cmd, input_path, first['output'], duration)
+            elapsed = time.monotonic() - started
+            if returncode != 0:
+                self.logger.error(f"❌ 转码失败: {name}\n{stderr_tail}")
             
-            if process.returncode == 0:
-                # 获取文件大小
-                input_size = os.path.getsize(input_path)
-                output_size = os.path.getsize(output_path)
-                
-                # 转码成功
-                ratio = (1 - output_size / input_size) * 100 if input_size > 0 else 0
-                
-                if ratio >= 0:
-                    self.logger.info(
-                        f"✅ 转码完成: {os.path.basename(input_path)} "
-                        f"({self._format_size(input_size)} → {self._format_size(output_size)}, "
-                        f"节省 {ratio:.1f}%)"
-                    )
+            while pending:
+                rendition, result = pending[0]
+                if returncode == 0:
+                    finish(rendition, result, elapsed)
                 else:
-                    # 即使变大也保留（因为前面已经预估过，这种情况应该很少）
-                    self.logger.warning(
-                        f"⚠️  转码后文件变大: {os.path.basename(input_path)} "
-                        f"({self._format_size(input_size)} → {self._format_size(output_size)}, "
-                        f"增大 {abs(ratio):.1f}%)，但已完成转码"
-                    )
-                    self.stats['skipped_larger'] += 1
-                
-                self.stats['total_size_before'] += input_size
-                self.stats['total_size_after'] += output_size
-                self.stats['processed'] += 1
-                
-                return True
-            else:
-                self.logger.error(f"❌ 转码失败: {os.path.basename(input_path)}")
-                self.stats['failed'] += 1
-                return False
-                
+                    fail(rendition, result, elapsed=elapsed)
+                pending.pop(0)
         except Exception as e:
             self.logger.error(f"❌ 转码异常 {input_path}: {e}")
-            self.stats['failed'] += 1
-            return False
+            for rendition, result in pending:
+                fail(rendition, result, elapsed=time.monotonic() - started)
+        finally:
+            self._release_resources(input_path)
+            self._write_metrics()
+        return results
+    
+    def _transcode_indexed(self, input_path: str, output_path: str,
+                           codec: str = 'h265', quality: str = 'medium', **kwargs) -> Dict:
+        """启用内容索引时先查找相同内容的已有输出，找到则复用，否则转码并记录输出"""
+        fingerprint = self._source_fingerprint(input_path)
+        params = self._content_key(codec, quality, kwargs.get('preset'), kwargs.get('crf'),
+                                   kwargs.get('resolution'), kwargs.get('smart_skip', True))
+        result = self._reuse_output(fingerprint, params, output_path, os.path.basename(input_path))
+        if result:
+            return result
+        result = self._transcode_file(input_path, output_path, codec=codec, quality=quality, **kwargs)
+        if result['state'] == 'done':
+            self._index_output(fingerprint, params, input_path, output_path)
+        return result
+    
+    def _content_key(self, codec: str, quality: str, preset: str = None, crf: int = None,
+                     resolution: str = None, smart_skip: bool = True) -> str:
+        """内容索引中区分转码参数的键（参数不同的输出不能互相复用）"""
+        crf, preset = self._resolve_quality(quality, crf, preset)
+        return f"{codec}|crf{crf}|{preset}|{resolution or 'original'}|{'smart' if smart_skip else 'force'}"
+    
+    def _source_fingerprint(self, input_path: str) -> Optional[str]:
+        """源文件的内容指纹；未启用内容索引或读取失败时返回 None"""
+        index = self.content_index
+        if index is None:
+            return None
+        try:
+            return index.source_fingerprint(input_path)
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"⚠️  无法计算内容指纹 {input_path}: {e}")
+            return None
+    
+    def _reuse_output(self, fingerprint: Optional[str], params: str, output_path: str,
+                      label: str, rendition: str = None) -> Optional[Dict]:
+        """内容索引中有相同内容、相同参数的输出时，硬链接（不支持时复制）到 output_path
+        
+        Returns:
+            {'state': 'skipped', 'action': 'reuse', 'reason'}；没有可复用的输出时返回 None
+        """
+        index = self.content_index
+        if not fingerprint or index is None:
+            return None
+        try:
+            entry = index.lookup(fingerprint, params)
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️  内容索引查询失败: {e}")
+            return None
+        if entry is None:
+            return None
+        
+        if os.path.abspath(entry['output']) == os.path.abspath(output_path):
+            method = '输出已存在'
+        else:
+            partial_path = self._partial_path(output_path)
+            self._remove_partial(partial_path)
+            try:
+                try:
+                    os.link(entry['output'], partial_path)
+                    method = '硬链接'
+                except OSError:
+                    # 跨文件系统或不支持硬链接
+                    shutil.copyfile(entry['output'], partial_path)
+                    method = '复制'
+                os.replace(partial_path, output_path)
+            except OSError as e:
+                self.logger.warning(f"⚠️  无法复用 {entry['output']}: {e}，重新转码")
+                self._remove_partial(partial_path)
+                return None
+        
+        reason = f"与 {entry['source']} 内容相同，{method}"
+        self.logger.info(f"🔁 复用输出: {label} ({reason})")
+        if rendition:
+            self._inc_rendition_stat(rendition, 'skipped')
+        else:
+            self._inc_stat('skipped')
+            self._inc_stat('skipped_reused')
+        self.metrics.inc('skipped_total', reason='reuse')
+        return {'state': 'skipped', 'action': 'reuse', 'reason': reason}
+    
+    def _index_output(self, fingerprint: Optional[str], params: str, input_path: str, output_path: str):
+        """把生成的输出记入内容索引"""
+        index = self.content_index
+        if not fingerprint or index is None:
+            return
+        try:
+            index.record(fingerprint, params, input_path, output_path)
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️  内容索引写入失败: {e}")
+    
+    def _remove_partial(self, partial_path: str):
+        """删除失败任务留下的临时输出"""
+        try:
+            os.remove(partial_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"⚠️  无法删除临时文件 {partial_path}: {e}")
     
+    @traced('transcode_directory')
     def transcode_directory(self, input_dir: str, output_dir: str,
                           codec: str = 'h265', quality: str = 'medium',
                           extensions: List[str] = None,
                           skip_existing: bool = False,
                           dry_run: bool = False,
+                          max_workers: int = None,
+                          exclude: List[str] = None,
+                          resume: bool = False,
+                          schedule: str = None,
+                          scratch_dir: str = None,
+                          renditions: List[Dict] = None,
+                          deadline=None,
                           **kwargs) -> Dict:
-        """批量转码目录"""
+        """批量转码目录
+        
+        默认边扫描边转码：扫描到的文件直接进入任务队列，不必等整个目录树遍历完。
+        每个文件的状态写入输出目录下的任务日志（.videoforge_journal.jsonl）。
+        
+        Args:
+            max_workers: 同时运行的 ffmpeg 任务数（默认使用配置中的 max_threads）
+            exclude: 排除的 glob 模式（默认使用配置中的 exclude）
+            resume: 根据任务日志跳过上次已完成（且源文件未变化）的文件，无需重新探测
+            schedule: scan 按扫描顺序；lpt 先扫描并并发探测全部文件，按工作量
+                      （时长 × 像素数）从大到小分发，并估算整批剩余时间（默认使用配置中的 schedule）
+            scratch_dir: 本地暂存目录：后台预取下一个任务的输入，输出先写本地再异步移动到
+                         输出目录（默认使用配置中的 scratch_dir，不设置则直接读写）
+            renditions: 多个输出配置（name、codec、quality、preset、crf、resolution、output 目录），
+                        未指定的项使用主输出的参数；每个源文件只解码一次，用一条 ffmpeg 命令生成
+                        全部输出，各输出分别决定是否跳过并分别统计。任务日志写在 output_dir 中
+            deadline: 截止时间（datetime 或 "HH:MM"）：先探测全部文件，之后按实测编码速度为每个任务
+                      选择编码速度预设，尽量在截止时间前完成（不支持多输出）
+        """
         
         input_path = Path(input_dir)
         output_path = Path(output_dir)
@@ -410,143 +3851,931 @@ class VideoForge:
         # 扩展名过滤
         if extensions is None:
             extensions = self.config['video_extensions']
-        else:
-            extensions = ['.' + ext.lstrip('.') for ext in extensions]
+        if exclude is None:
+            exclude = self.config.get('exclude')
         
-        # 收集所有视频文件
-        video_files = []
-        for ext in extensions:
-            video_files.extend(input_path.rglob(f'*{ext}'))
+        if renditions:
+            try:
+                renditions = self._resolve_renditions(
+                    renditions, output_dir, codec, quality,
+                    kwargs.pop('preset', None), kwargs.pop('crf', None), kwargs.pop('resolution', None)
+                )
+            except ValueError as e:
+                self.logger.error(f"❌ {e}")
+                return self.stats
+            self.logger.info("🎞️  多输出: " + '; '.join(
+                f"{r['name']} ({r['codec']}, {r['quality']}"
+                f"{', CRF ' + str(r['crf']) if r['crf'] else ''}"
+                f"{', ' + r['resolution'] if r['resolution'] else ''}) → {r['output']}"
+                for r in renditions))
         
-        self.stats['total_files'] = len(video_files)
+        if isinstance(deadline, str):
+            try:
+                deadline = parse_deadline(deadline)
+            except ValueError as e:
+                self.logger.error(f"❌ {e}")
+                return self.stats
+        if deadline and renditions:
+            self.logger.warning("⚠️  多输出时不支持截止时间模式，忽略截止时间")
+            deadline = None
+        planner = None
         
-        if self.stats['total_files'] == 0:
-            self.logger.warning(f"⚠️  未找到视频文件")
-            return self.stats
+        def rendition_targets(rel_path: Path) -> List[Dict]:
+            """各输出中与源文件对应的目标文件"""
+            return [dict(r, output=str((Path(r['output']) / rel_path).with_suffix('.mp4')))
+                    for r in renditions]
         
-        self.logger.info(f"📊 找到 {self.stats['total_files']} 个视频文件")
+        self.logger.info(f"📂 扫描目录: {input_dir}")
         
         if dry_run:
             self.logger.info("🔍 预览模式 (不会实际处理)")
         
-        # 处理每个视频
-        for idx, video_file in enumerate(video_files, 1):
-            # 计算相对路径
-            rel_path = video_file.relative_to(input_path)
-            target_file = output_path / rel_path
+        journal = None
+        if not dry_run:
+            output_path.mkdir(parents=True, exist_ok=True)
+            journal = JobJournal(output_path / self.JOURNAL_NAME)
+            journal.compact()
+            if resume:
+                self.logger.info(f"♻️  断点续传: 任务日志 {journal.journal_path}")
+        
+        # 并发任务数，以及每个任务的线程预算（所有任务线程总和约等于 CPU 核数）
+        workers = max(1, int(max_workers or self.config.get('max_threads') or 1))
+        if workers > 1 and not kwargs.get('threads'):
+            kwargs['threads'] = max(1, (os.cpu_count() or 1) // workers)
+        if workers > 1 and not dry_run:
+            self.logger.info(f"⚙️  并发任务数: {workers}，每个任务线程数: {kwargs['threads']}")
+        
+        if schedule is None:
+            schedule = self.config.get('schedule', 'scan')
+        if scratch_dir is None:
+            scratch_dir = self.config.get('scratch_dir')
+        stager = None
+        if scratch_dir and not dry_run:
+            max_bytes = int(float(self.config.get('scratch_max_size', 50)) * 1024 ** 3)
+            stager = ScratchStager(scratch_dir, max_bytes, self.logger)
+            self.logger.info(f"📥 本地暂存: {stager.root}（上限 {self._format_size(max_bytes)}）")
+        
+        def iter_jobs():
+            scan = self.tracer.iter('scan', iter_video_files(input_path, extensions, exclude))
+            for idx, video_file in enumerate(scan, 1):
+                self._inc_stat('total_files')
+                # 计算相对路径
+                rel_path = video_file.relative_to(input_path)
+                target_file = output_path / rel_path
+                
+                # 修改扩展名为 .mp4
+                target_file = target_file.with_suffix('.mp4')
+                
+                # 创建目标目录
+                target_file.parent.mkdir(parents=True, exist_ok=True)
+                
+                # 上次已完成的文件（只比较大小和 mtime，不重新探测）
+                if resume and journal.is_finished(str(video_file)):
+                    self.logger.info(f"⏭️  跳过 [{idx}]: {rel_path} (上次已完成)")
+                    self._inc_stat('skipped')
+                    self.metrics.inc('skipped_total', reason='resume')
+                    continue
+                
+                # 检查是否跳过（多输出时全部输出都已存在才跳过）
+                targets = [Path(r['output']) for r in rendition_targets(rel_path)] if renditions else [target_file]
+                if skip_existing and all(target.exists() for target in targets):
+                    self.logger.info(f"⏭️  跳过 [{idx}]: {rel_path} (已存在)")
+                    self._inc_stat('skipped')
+                    self.metrics.inc('skipped_total', reason='exists')
+                    continue
+                
+                if dry_run:
+                    self.logger.info(f"📹 处理 [{idx}]: {rel_path}")
+                    for target in targets:
+                        self.logger.info(f"   → {target}" if renditions else
+                                         f"   → {target.relative_to(output_path)}")
+                    continue
+                
+                journal.record(str(video_file), 'pending')
+                yield idx, video_file, target_file, None
+        
+        def run_job(job):
+            idx, video_file, target_file, info = job
+            self.logger.info(f"📹 处理 [{idx}]: {video_file.relative_to(input_path)}")
+            journal.record(str(video_file), 'running', output=str(target_file))
             
-            # 修改扩展名为 .mp4
-            target_file = target_file.with_suffix('.mp4')
+            # 截止时间模式：按剩余工作量和实测速度为本任务选择速度预设
+            job_kwargs = kwargs
+            if planner:
+                job_kwargs = dict(kwargs, preset=planner.start(str(video_file)))
             
-            # 创建目标目录
-            target_file.parent.mkdir(parents=True, exist_ok=True)
+            result = None
+            try:
+                if renditions:
+                    result = run_renditions(video_file, target_file, info)
+                elif stager:
+                    result = run_staged(video_file, target_file, info, job_kwargs)
+                else:
+                    # 执行转码（启用内容索引时相同内容直接复用已有输出）
+                    result = self._transcode_indexed(
+                        str(video_file),
+                        str(target_file),
+                        codec=codec,
+                        quality=quality,
+                        info=info,
+                        **job_kwargs
+                    )
+                    journal.record(str(video_file), result['state'], output=str(target_file),
+                                   action=result['action'], reason=result['reason'])
+            finally:
+                if planner:
+                    # 只有成功的完整编码按 ffmpeg 耗时更新速度；其他任务（含异常）只移除工作量
+                    encode_seconds = result.get('encode_seconds') if result and result['state'] == 'done' else None
+                    self._log_deadline(planner, video_file.name,
+                                       planner.complete(str(video_file), encode_seconds))
             
-            # 检查是否跳过
-            if skip_existing and target_file.exists():
-                self.logger.info(f"⏭️  跳过 [{idx}/{self.stats['total_files']}]: {rel_path} (已存在)")
-                self.stats['skipped'] += 1
-                continue
+            if result['state'] == 'failed':
+                self.logger.warning(f"⚠️  处理失败，但继续处理下一个")
+            
+            if self._batch:
+                with self._progress_lock:
+                    self._batch['done'] += 1
+                    self._batch['done_work'] += self._batch['costs'].get(str(video_file), 0)
+                    progress = self._batch_progress()
+                if progress['eta'] is not None:
+                    self.logger.info(
+                        f"⏱️  批次进度 {progress['done']}/{progress['total']} ({progress['percent']:.1f}%)，"
+                        f"预计剩余 {self._format_duration(progress['eta'])}"
+                    )
+        
+        def run_staged(video_file: Path, target_file: Path, info: Optional[VideoInfo],
+                       job_kwargs: Dict) -> Dict:
+            """从本地副本转码，输出写入暂存区后交给后台移动；移动完成才记为完成"""
+            fingerprint = self._source_fingerprint(str(video_file))
+            params = self._content_key(codec, quality, job_kwargs.get('preset'), job_kwargs.get('crf'),
+                                       job_kwargs.get('resolution'), job_kwargs.get('smart_skip', True))
+            result = self._reuse_output(fingerprint, params, str(target_file), video_file.name)
+            if result:
+                # 已预取的副本不再需要
+                stager.release(str(video_file))
+                journal.record(str(video_file), result['state'], output=str(target_file),
+                               action=result['action'], reason=result['reason'])
+                return result
             
-            self.logger.info(f"📹 处理 [{idx}/{self.stats['total_files']}]: {rel_path}")
+            # 探测原路径（命中探测缓存），本地副本只用于编码
+            if info is None:
+                info = self.get_video_info(str(video_file))
+            source = stager.acquire(str(video_file))
+            # 暂存区放不下输出时直接写目标位置
+            local_output = stager.output_path(str(target_file), self._staged_output_size(
+                info, codec, quality, job_kwargs.get('crf'), job_kwargs.get('preset'),
+                job_kwargs.get('resolution')))
+            try:
+                result = self._transcode_file(source, local_output or str(target_file), codec=codec,
+                                              quality=quality, info=info,
+                                              destination=str(target_file) if local_output else None,
+                                              **job_kwargs)
+            finally:
+                stager.release(str(video_file))
             
-            if dry_run:
-                self.logger.info(f"   → {target_file.relative_to(output_path)}")
-                continue
+            if local_output and result['state'] == 'done' and os.path.exists(local_output):
+                move_outputs(video_file, target_file, [(local_output, str(target_file), None)], result, info)
+            else:
+                if local_output:
+                    stager.discard_output(local_output)
+                journal.record(str(video_file), result['state'], output=str(target_file),
+                               action=result['action'], reason=result['reason'])
+                if result['state'] != 'done' or local_output:
+                    return result
+            # 输出可能还在移动中，记录的大小和 mtime 在首次复用时补上
+            self._index_output(fingerprint, params, str(video_file), str(target_file))
+            return result
+        
+        def move_outputs(video_file: Path, target_file: Path, moves: List[Tuple[str, str, Optional[str]]],
+                         result: Dict, info: Optional[VideoInfo]):
+            """后台把暂存区中的输出移动到目标位置，全部移动成功后才在任务日志中记为完成
             
-            # 执行转码
-            success = self.transcode_video(
-                str(video_file),
-                str(target_file),
-                codec=codec,
-                quality=quality,
-                **kwargs
-            )
+            moves: (本地输出, 目标路径, 输出名称)；移动失败的输出从已处理统计中撤回，改记为失败
+            """
+            errors = []
+            remaining = [len(moves)]
+            input_size = (info or {}).get('size') or os.path.getsize(video_file)
             
-            if not success:
-                self.logger.warning(f"⚠️  处理失败，但继续处理下一个")
+            # 回调都在暂存区唯一的移动线程中执行，无需加锁
+            def moved(target: str, rendition: Optional[str], output_size: int, error: Optional[str]):
+                if error:
+                    self.logger.error(f"❌ 移动输出失败 {target}: {error}")
+                    # 转码完成时已计入 processed 和大小统计
+                    for key, value in (('processed', -1), ('failed', 1),
+                                       ('total_size_before', -input_size),
+                                       ('total_size_after', -output_size)):
+                        self._inc_stat(key, value)
+                        if rendition:
+                            self._inc_rendition_stat(rendition, key, value)
+                    errors.append(f"移动输出失败: {error}")
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+                journal.record(str(video_file), 'failed' if errors else 'done', output=str(target_file),
+                               action=result['action'], reason='; '.join(errors) or result['reason'])
+            
+            for local_output, target, rendition in moves:
+                output_size = os.path.getsize(local_output)
+                stager.move_async(local_output, self._partial_path(target), target,
+                                  lambda error, target=target, rendition=rendition, size=output_size:
+                                  moved(target, rendition, size, error))
+        
+        def run_renditions(video_file: Path, target_file: Path, info: Optional[VideoInfo]) -> Dict:
+            """一次解码生成全部输出；任一输出失败则整个文件记为失败（下次续传时重做）"""
+            rel_path = video_file.relative_to(input_path)
+            fingerprint = self._source_fingerprint(str(video_file))
+            smart_skip = kwargs.get('smart_skip', True)
+            outputs = []
+            for rendition in rendition_targets(rel_path):
+                if skip_existing and os.path.exists(rendition['output']):
+                    self.logger.info(f"⏭️  跳过 [{rendition['name']}]: {rel_path} (已存在)")
+                    self._inc_rendition_stat(rendition['name'], 'skipped')
+                    continue
+                os.makedirs(os.path.dirname(rendition['output']), exist_ok=True)
+                rendition['params'] = self._content_key(rendition['codec'], rendition['quality'],
+                                                        rendition['preset'], rendition['crf'],
+                                                        rendition['resolution'], smart_skip)
+                if self._reuse_output(fingerprint, rendition['params'], rendition['output'],
+                                      f"[{rendition['name']}] {rel_path}", rendition=rendition['name']):
+                    continue
+                outputs.append(rendition)
+            if not outputs:
+                if stager:
+                    # 已预取的副本不再需要
+                    stager.release(str(video_file))
+                result = {'state': 'skipped', 'action': 'skip', 'reason': "全部输出已存在"}
+                self._inc_stat('skipped')
+                journal.record(str(video_file), 'skipped', output=str(target_file),
+                               action=result['action'], reason=result['reason'])
+                return result
+            
+            if info is None:
+                info = self.get_video_info(str(video_file))
+            source = str(video_file)
+            if stager:
+                source = stager.acquire(source)
+                staged = []
+                for r in outputs:
+                    # 暂存区放不下的输出直接写目标位置
+                    local_output = stager.output_path(r['output'], self._staged_output_size(
+                        info, r['codec'], r['quality'], r['crf'], r['preset'], r['resolution']))
+                    staged.append(dict(r, output=local_output, target=r['output']) if local_output else r)
+                outputs = staged
+            try:
+                results = self._transcode_renditions(source, outputs, info=info,
+                                                     smart_skip=smart_skip,
+                                                     threads=kwargs.get('threads', 0))
+            finally:
+                if stager:
+                    stager.release(str(video_file))
+            for r, rendition in zip(results, outputs):
+                if r['state'] == 'done':
+                    self._index_output(fingerprint, rendition['params'], str(video_file),
+                                       rendition.get('target', rendition['output']))
+            
+            states = {r['state'] for r in results}
+            result = {
+                'state': 'failed' if 'failed' in states else 'done' if 'done' in states else 'skipped',
+                'action': ','.join(f"{r['rendition']}:{r['action']}" for r in results),
+                'reason': '; '.join(f"{r['rendition']}: {r['reason']}" for r in results if r['reason'])
+            }
+            moves = [(r['output'], rendition['target'], r['rendition']) for r, rendition in zip(results, outputs)
+                     if 'target' in rendition and r['state'] == 'done' and result['state'] != 'failed']
+            for r, rendition in zip(results, outputs):
+                if 'target' in rendition and (r['output'], rendition['target'], r['rendition']) not in moves:
+                    stager.discard_output(r['output'])
+            if not moves:
+                journal.record(str(video_file), result['state'], output=str(target_file),
+                               action=result['action'], reason=result['reason'])
+            else:
+                move_outputs(video_file, target_file, moves, result, info)
+            return result
+        
+        jobs = iter_jobs()
+        if schedule == 'lpt' and not dry_run:
+            jobs = self._schedule_lpt(list(jobs), workers)
+        if deadline and not dry_run:
+            if schedule != 'lpt':
+                self.logger.info("⏰ 截止时间模式: 探测全部文件...")
+                jobs = self._probe_jobs(list(jobs))
+            base_preset = self._resolve_quality(quality, kwargs.get('crf'), kwargs.get('preset'))[1]
+            planner = self._deadline_planner(jobs, deadline, workers, base_preset)
+        if stager:
+            jobs = self._prefetch_ahead(jobs, stager, depth=workers)
+        
+        # 处理每个视频
+        try:
+            self._run_workers(jobs, run_job, workers)
+        finally:
+            if stager:
+                # 等待后台移动全部完成
+                stager.close()
+            self._write_metrics(force=True)
+            self._batch = None
+            with self._admission:
+                self._resume_all()
+            if journal:
+                journal.close()
+        
+        if self.stats['total_files'] == 0:
+            self.logger.warning(f"⚠️  未找到视频文件")
+            return self.stats
         
         # 输出统计信息
         self._print_stats()
         
         return self.stats
     
+    @staticmethod
+    def _prefetch_ahead(jobs: Iterable[Tuple], stager: ScratchStager, depth: int = 1) -> Iterable[Tuple]:
+        """提前 depth 个任务开始预取输入：交出第 N 个任务前，第 N+depth 个任务的输入已在后台复制"""
+        buffer = deque()
+        for job in jobs:
+            stager.prefetch(str(job[1]))
+            buffer.append(job)
+            if len(buffer) > depth:
+                yield buffer.popleft()
+        while buffer:
+            yield buffer.popleft()
+    
+    def _probe_jobs(self, jobs: List[Tuple]) -> List[Tuple]:
+        """并发探测全部任务的源文件，把信息填入任务元组"""
+        infos = dict(self.probe_many(str(job[1]) for job in jobs))
+        return [(idx, video_file, target_file, infos.get(str(video_file)))
+                for idx, video_file, target_file, _ in jobs]
+    
+    def _deadline_planner(self, jobs: List[Tuple], deadline: datetime, workers: int,
+                          base_preset: str) -> DeadlinePlanner:
+        """根据已探测的任务创建截止时间模式的预设规划"""
+        costs = {str(job[1]): self._job_cost(job[3]) for job in jobs}
+        durations = {str(job[1]): (job[3] or {}).get('duration') or 0 for job in jobs}
+        planner = DeadlinePlanner(deadline, costs, workers, base_preset,
+                                  presets=self.config.get('deadline_presets'), durations=durations)
+        time_left = max(0.0, (deadline - datetime.now()).total_seconds())
+        self.logger.info(
+            f"⏰ 截止时间 {deadline:%m-%d %H:%M}（还有 {self._format_duration(time_left)}）："
+            f"{len(jobs)} 个文件，总时长 {self._format_duration(sum(durations.values()))}，"
+            f"初始预设 {planner.base_preset}，可选 {'/'.join(planner.presets)}"
+        )
+        return planner
+    
+    def _log_deadline(self, planner: DeadlinePlanner, name: str, projection: Dict):
+        """记录任务使用的预设和整批的预计完成时间"""
+        message = f"⏰ {name} 使用预设 {projection['preset']}"
+        if projection['finish'] is not None and projection['remaining_files']:
+            late = "，⚠️ 来不及" if projection['late'] else ""
+            message += (f"，预计 {projection['finish']:%m-%d %H:%M} 完成（截止 {planner.deadline:%m-%d %H:%M}{late}），"
+                        f"剩余 {projection['remaining_files']} 个文件 / "
+                        f"{self._format_duration(projection['remaining_duration'])}，"
+                        f"下一个任务使用 {projection['next']}")
+        elif not projection['remaining_files']:
+            message += "，全部完成"
+        self.logger.info(message)
+    
+    def _schedule_lpt(self, jobs: List[Tuple], workers: int) -> List[Tuple]:
+        """最长处理时间优先（LPT）调度
+        
+        并发探测全部文件，按工作量从大到小排序。空闲的工作线程总是领取剩余任务中
+        最大的一个，长视频不会在最后才开始而拖长整批耗时。
+        """
+        self.logger.info(f"📋 LPT 调度: 探测 {len(jobs)} 个文件...")
+        jobs = self._probe_jobs(jobs)
+        costs = {str(job[1]): self._job_cost(job[3]) for job in jobs}
+        jobs.sort(key=lambda job: costs[str(job[1])], reverse=True)
+        
+        total_work = sum(costs.values())
+        total_duration = sum((job[3] or {}).get('duration') or 0 for job in jobs)
+        with self._progress_lock:
+            self._batch = {
+                'total': len(jobs),
+                'done': 0,
+                'costs': costs,
+                'total_work': total_work,
+                'done_work': 0.0,
+                'started': time.monotonic()
+            }
+        if jobs:
+            # 单个任务无法拆分到多个工作线程，整批耗时不会短于最大任务
+            largest = costs[str(jobs[0][1])] / total_work * 100 if total_work else 0
+            self.logger.info(
+                f"📋 LPT 调度: {len(jobs)} 个任务，总时长 {self._format_duration(total_duration)}，"
+                f"最大任务占总工作量 {largest:.1f}%（{workers} 个工作线程）"
+            )
+        return jobs
+    
+    def _create_watcher(self, root: str, exclude: List[str], polling: bool = False):
+        """优先使用 inotify，不可用时退回轮询"""
+        if not polling and sys.platform.startswith('linux'):
+            try:
+                watcher = InotifyWatcher(root, exclude)
+                self.logger.info(f"👀 使用 inotify 监听: {root}")
+                return watcher
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"⚠️  inotify 不可用（{e}），改用轮询")
+        self.logger.info(f"👀 轮询监听: {root}（间隔 {self.config.get('watch_poll_interval', 10)} 秒）")
+        return PollingWatcher(root, exclude)
+    
+    @traced('watch_directory')
+    def watch_directory(self, input_dir: str, output_dir: str,
+                        codec: str = 'h265', quality: str = 'medium',
+                        extensions: List[str] = None,
+                        exclude: List[str] = None,
+                        max_workers: int = None,
+                        settle: float = None,
+                        polling: bool = False,
+                        initial_scan: bool = False,
+                        **kwargs) -> Dict:
+        """监听目录，持续转码新出现的视频（Ctrl+C 停止）
+        
+        只处理监听期间新写入或移入的文件，不会反复扫描整个目录树；文件大小和 mtime
+        保持 settle 秒不变（上传/复制结束）后才进入队列。任务状态同样写入输出目录下的
+        任务日志，重启后已完成的文件不会重复处理。
+        
+        Args:
+            settle: 文件稳定等待时间（默认使用配置中的 watch_settle）
+            polling: 强制使用轮询而不是 inotify
+            initial_scan: 启动时先扫描一次已有文件（任务日志中已完成的跳过）
+        """
+        input_path = Path(input_dir)
+        output_path = Path(output_dir)
+        if not input_path.is_dir():
+            self.logger.error(f"❌ 输入目录不存在: {input_dir}")
+            return self.stats
+        
+        if extensions is None:
+            extensions = self.config['video_extensions']
+        if exclude is None:
+            exclude = self.config.get('exclude')
+        suffixes = {'.' + ext.lstrip('.').lower() for ext in extensions}
+        if settle is None:
+            settle = self.config.get('watch_settle', 30)
+        poll_interval = self.config.get('watch_poll_interval', 10)
+        
+        output_path.mkdir(parents=True, exist_ok=True)
+        journal = JobJournal(output_path / self.JOURNAL_NAME)
+        journal.compact()
+        
+        workers = max(1, int(max_workers or self.config.get('max_threads') or 1))
+        if workers > 1 and not kwargs.get('threads'):
+            kwargs['threads'] = max(1, (os.cpu_count() or 1) // workers)
+        
+        watcher = self._create_watcher(str(input_path), exclude, polling)
+        
+        def is_candidate(path: str) -> bool:
+            name = os.path.basename(path)
+            # 隐藏文件（包括临时输出 .xxx.partial.mp4）不处理
+            if name.startswith('.') or os.path.splitext(name)[1].lower() not in suffixes:
+                return False
+            rel = os.path.relpath(path, input_path).replace(os.sep, '/')
+            return not (exclude and path_excluded(rel, name, exclude))
+        
+        def iter_ready():
+            # path -> ((size, mtime_ns), 最后一次变化的时间)
+            pending: Dict[str, Optional[Tuple]] = {}
+            if initial_scan:
+                for video_file in iter_video_files(input_path, extensions, exclude):
+                    if not journal.is_finished(str(video_file)):
+                        pending[str(video_file)] = None
+            self.logger.info(f"👀 开始监听 {input_dir}（文件稳定 {settle} 秒后处理，Ctrl+C 停止）")
+            
+            while True:
+                timeout = min(poll_interval, max(1.0, settle / 2)) if pending else poll_interval
+                paths = watcher.read(timeout)
+                if paths is None:
+                    # 事件丢失，全量扫描一次补齐
+                    self.logger.warning("⚠️  inotify 事件队列溢出，重新扫描目录")
+                    paths = [str(p) for p in iter_video_files(input_path, extensions, exclude)
+                             if not journal.is_finished(str(p))]
+                for path in paths:
+                    if is_candidate(path):
+                        pending.setdefault(path, None)
+                
+                now = time.monotonic()
+                for path in list(pending):
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        pending.pop(path)
+                        continue
+                    signature = (st.st_size, st.st_mtime_ns)
+                    previous = pending[path]
+                    if previous is None or previous[0] != signature:
+                        pending[path] = (signature, now)
+                    elif now - previous[1] >= settle:
+                        del pending[path]
+                        yield Path(path)
+        
+        def run_job(video_file: Path):
+            if journal.is_finished(str(video_file)):
+                return
+            self._inc_stat('total_files')
+            rel_path = video_file.relative_to(input_path)
+            target_file = (output_path / rel_path).with_suffix('.mp4')
+            target_file.parent.mkdir(parents=True, exist_ok=True)
+            
+            self.logger.info(f"📹 新文件: {rel_path}")
+            journal.record(str(video_file), 'running', output=str(target_file))
+            result = self._transcode_indexed(str(video_file), str(target_file),
+                                             codec=codec, quality=quality, **kwargs)
+            journal.record(str(video_file), result['state'], output=str(target_file),
+                           action=result['action'], reason=result['reason'])
+            self._write_metrics(force=True)
+        
+        try:
+            self._run_workers(iter_ready(), run_job, workers)
+        except KeyboardInterrupt:
+            self.logger.info("🛑 停止监听")
+        finally:
+            watcher.close()
+            journal.close()
+            with self._admission:
+                self._resume_all()
+        
+        self._print_stats()
+        return self.stats
+    
+    def _run_workers(self, jobs: Iterable, handler: Callable, workers: int):
+        """用固定数量的工作线程并发执行任务
+        
+        任务通过有界队列分发，生产者不会一次性堆积全部任务；
+        workers <= 1 时直接在当前线程顺序执行。单个任务抛出的异常记录后继续处理下一个。
+        中断（Ctrl+C）或生产者异常时丢弃队列中尚未开始的任务、结束运行中的 ffmpeg，再重新抛出。
+        """
+        self._stopping.clear()
+        
+        def run(job):
+            try:
+                handler(job)
+            except Exception as e:
+                self.logger.error(f"❌ 任务异常: {e}")
+        
+        if workers <= 1:
+            try:
+                for job in jobs:
+                    run(job)
+            except BaseException:
+                self._stopping.set()
+                self._terminate_processes()
+                raise
+            return
+        
+        queue = Queue(maxsize=workers * 2)
+        
+        def worker():
+            while True:
+                job = queue.get()
+                if job is None:
+                    break
+                if not self._stopping.is_set():
+                    run(job)
+        
+        threads = [threading.Thread(target=worker, name=f'VideoForge-worker-{i}', daemon=True)
+                   for i in range(workers)]
+        for t in threads:
+            t.start()
+        
+        try:
+            for job in jobs:
+                queue.put(job)
+            for _ in threads:
+                queue.put(None)
+            for t in threads:
+                t.join()
+        except BaseException:
+            self._stopping.set()
+            dropped = 0
+            while True:
+                try:
+                    if queue.get_nowait() is not None:
+                        dropped += 1
+                except Empty:
+                    break
+            if dropped:
+                self.logger.info(f"🛑 已中断，放弃 {dropped} 个未开始的任务")
+            self._terminate_processes()
+            for _ in threads:
+                with contextlib.suppress(Exception):
+                    queue.put_nowait(None)
+            for t in threads:
+                t.join(timeout=30)
+            raise
+    
+    # 合并时按这些参数分组，参数不同的片段无法无损拼接
+    MERGE_SIGNATURE = ('codec', 'width', 'height', 'pix_fmt', 'frame_rate', 'time_base',
+                       'audio_codec', 'audio_sample_rate', 'audio_channels')
+    
+    # 合并时重新编码片段所用的编码器（按基准片段的编码选择）
+    MERGE_VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'mpeg4': 'mpeg4',
+                            'vp9': 'libvpx-vp9', 'av1': 'libaom-av1', 'mjpeg': 'mjpeg'}
+    MERGE_AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus',
+                            'ac3': 'ac3', 'flac': 'flac', 'pcm_s16le': 'pcm_s16le'}
+    
+    @classmethod
+    def _stream_signature(cls, info: VideoInfo) -> Tuple:
+        """合并兼容性签名：签名相同的片段可以直接 -c copy 拼接"""
+        signature = []
+        for key in cls.MERGE_SIGNATURE:
+            value = info.get(key)
+            if key == 'frame_rate':
+                # 比较 ffprobe 报告的有理数帧率；没有时（调用方提供的信息）由 fps 换算
+                value = _frame_rate(value) or (
+                    _frame_rate(Fraction(info['fps']).limit_denominator(1001)) if info.get('fps') else None)
+            signature.append(value)
+        return tuple(signature)
+    
+    @classmethod
+    def _merge_plan(cls, infos: List[VideoInfo]) -> Tuple[Tuple, List[int]]:
+        """选出多数片段的参数作为基准，返回 (基准签名, 需要重新编码的片段下标)
+        
+        文件数相同的分组取总时长更长的一组，时长也相同时取先出现的一组。
+        """
+        signatures = [cls._stream_signature(info) for info in infos]
+        counts = Counter(signatures)
+        durations = Counter()
+        for signature, info in zip(signatures, infos):
+            durations[signature] += info.get('duration') or 0
+        reference = max(counts, key=lambda sig: (counts[sig], durations[sig], -signatures.index(sig)))
+        return reference, [i for i, sig in enumerate(signatures) if sig != reference]
+    
+    def _describe_mismatch(self, info: VideoInfo, reference: Tuple) -> str:
+        """列出片段与基准参数不同的项"""
+        actual = self._stream_signature(info)
+        return ', '.join(f"{key} {a} ≠ {b}" for key, a, b in zip(self.MERGE_SIGNATURE, actual, reference)
+                         if a != b)
+    
+    def _conform_command(self, input_path: str, output_path: str, info: VideoInfo,
+                         reference: Dict, crf: int, preset: str) -> List[str]:
+        """把片段重新编码为与基准片段参数一致的 ffmpeg 命令"""
+        width, height = reference['width'], reference['height']
+        cmd = ['ffmpeg', '-i', input_path]
+        
+        # 基准片段有音频而该片段没有时，补一条静音音轨，保证拼接后音视频对齐
+        audio_input = '0:a:0'
+        if reference['audio_codec'] and not info.get('audio_codec'):
+            layout = {1: 'mono', 2: 'stereo', 6: '5.1'}.get(reference['audio_channels'], 'stereo')
+            cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={reference['audio_sample_rate']}:cl={layout}"]
+            audio_input = '1:a:0'
+        
+        filters = [
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
+            'setsar=1'
+        ]
+        if reference['frame_rate']:
+            filters.append(f"fps={reference['frame_rate']}")
+        if reference['pix_fmt']:
+            filters.append(f"format={reference['pix_fmt']}")
+        
+        cmd += ['-map', '0:v:0', '-vf', ','.join(filters),
+                '-c:v', self.MERGE_VIDEO_ENCODERS[reference['codec']]]
+        if reference['codec'] in ('h264', 'hevc'):
+            cmd += ['-crf', str(crf), '-preset', preset]
+        # 时间基不同的片段拼接后时间戳会错乱（MP4/MOV 可指定轨道时间刻度）
+        if (reference['time_base'] and '/' in reference['time_base']
+                and os.path.splitext(output_path)[1].lower() in ('.mp4', '.m4v', '.mov')):
+            cmd += ['-video_track_timescale', reference['time_base'].split('/')[1]]
+        
+        if reference['audio_codec']:
+            cmd += ['-map', audio_input, '-c:a', self.MERGE_AUDIO_ENCODERS[reference['audio_codec']],
+                    '-ar', str(reference['audio_sample_rate']), '-ac', str(reference['audio_channels']),
+                    '-shortest']
+        else:
+            cmd += ['-an']
+        return cmd + ['-y', output_path]
+    
+    @staticmethod
+    def _write_concat_list(list_file: str, paths: List[str]):
+        """写 concat demuxer 的文件列表（路径中的单引号需要转义）"""
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+    
+    @traced('merge_videos')
     def merge_videos(self, input_files: List[str], output_file: str,
                     reencode: bool = False, codec: str = 'h265',
                     quality: str = 'medium') -> bool:
-        """合并多个视频文件"""
+        """合并多个视频文件
         
-        if len(input_files) < 2:
-            self.logger.error("❌ 至少需要 2 个视频文件")
+        无损模式下先并发探测所有输入，按编码、分辨率、像素格式、帧率、时间基和音频参数分组，
+        只把与多数片段参数不同的片段重新编码为一致的参数，再整体 -c copy 拼接。
+        文件列表和重新编码的片段放在输出目录下本次合并专用的临时目录中。
+        """
+        
+        if not self._check_merge_inputs(input_files):
             return False
         
-        # 检查所有输入文件是否存在
-        for f in input_files:
-            if not os.path.exists(f):
-                self.logger.error(f"❌ 文件不存在: {f}")
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        partial_path = self._partial_path(output_file)
+        work_dir = tempfile.mkdtemp(prefix='.videoforge-merge-', dir=output_dir)
+        
+        try:
+            infos = None
+            if not reencode:
+                # 并发探测，按流参数分组
+                self.logger.info(f"🔍 分析 {len(input_files)} 个视频的流参数...")
+                probed = dict(self.probe_many(input_files))
+                infos = [probed.get(path) for path in input_files]
+            plan = self._merge_commands(input_files, output_file, work_dir, reencode, codec, quality, infos)
+            if plan is None:
                 return False
+            conforms, cmd = plan
+            
+            for part in conforms:
+                self.logger.info(f"🔄 重新编码片段: {os.path.basename(part['source'])} ({part['mismatch']})")
+                returncode, stderr_tail = self._run_ffmpeg(part['cmd'], part['source'], part['output'],
+                                                           part['duration'])
+                if returncode != 0:
+                    self.logger.error(f"❌ 片段重新编码失败: {part['source']}\n{stderr_tail}")
+                    return False
+            
+            if conforms:
+                self.logger.info(f"🔗 无损合并 {len(input_files)} 个片段...")
+            subprocess.run(cmd, check=True)
+            os.replace(partial_path, output_file)
+            
+            output_size = os.path.getsize(output_file)
+            self.logger.info(f"✅ 合并完成: {output_file} ({self._format_size(output_size)})")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"❌ 合并失败: {e}")
+            self._remove_partial(partial_path)
+            return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    async def merge_videos_async(self, input_files: List[str], output_file: str,
+                                 reencode: bool = False, codec: str = 'h265',
+                                 quality: str = 'medium',
+                                 progress: Optional[asyncio.Queue] = None) -> bool:
+        """merge_videos 的 asyncio 版本
+        
+        输入并发探测，片段重新编码和拼接以 asyncio 子进程运行（受 max_threads 限制），
+        进度事件写入 progress 队列。任务被取消时结束 ffmpeg、删除临时文件并重新抛出 CancelledError。
+        """
+        if not self._check_merge_inputs(input_files):
+            return False
+        
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        partial_path = self._partial_path(output_file)
+        work_dir = tempfile.mkdtemp(prefix='.videoforge-merge-', dir=output_dir)
         
         try:
-            if reencode:
-                # 重新编码合并
-                self.logger.info(f"🔄 合并并重新编码 {len(input_files)} 个视频...")
-                
-                # 创建临时文件列表
-                list_file = Path('temp_filelist.txt')
-                with open(list_file, 'w', encoding='utf-8') as f:
-                    for video in input_files:
-                        f.write(f"file '{os.path.abspath(video)}'\n")
-                
-                # 获取质量预设
-                quality_preset = self.QUALITY_PRESETS.get(quality, self.QUALITY_PRESETS['medium'])
-                codec_lib = 'libx265' if codec == 'h265' else 'libx264'
-                
-                cmd = [
-                    'ffmpeg',
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', str(list_file),
-                    '-c:v', codec_lib,
-                    '-crf', str(quality_preset['crf']),
-                    '-preset', quality_preset['preset'],
-                    '-c:a', 'copy',
-                    '-y', output_file
-                ]
-                
-                subprocess.run(cmd, check=True)
-                list_file.unlink()  # 删除临时文件
-                
-            else:
-                # 直接合并（无损）
-                self.logger.info(f"🔗 直接合并 {len(input_files)} 个视频（无损）...")
-                
-                # 创建文件列表
-                list_file = Path('temp_filelist.txt')
-                with open(list_file, 'w', encoding='utf-8') as f:
-                    for video in input_files:
-                        f.write(f"file '{os.path.abspath(video)}'\n")
-                
-                cmd = [
-                    'ffmpeg',
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', str(list_file),
-                    '-c', 'copy',
-                    '-y', output_file
-                ]
+            infos = None
+            if not reencode:
+                self.logger.info(f"🔍 分析 {len(input_files)} 个视频的流参数...")
+                probed = {path: info async for path, info in self.probe_many_async(input_files)}
+                infos = [probed.get(path) for path in input_files]
+            plan = self._merge_commands(input_files, output_file, work_dir, reencode, codec, quality, infos)
+            if plan is None:
+                return False
+            conforms, cmd = plan
+            
+            async with self._async_semaphore('encode'):
+                for part in conforms:
+                    self.logger.info(f"🔄 重新编码片段: {os.path.basename(part['source'])} ({part['mismatch']})")
+                    returncode, stderr_tail = await self._run_ffmpeg_async(
+                        part['cmd'], part['source'], part['output'], part['duration'], progress
+                    )
+                    if returncode != 0:
+                        self.logger.error(f"❌ 片段重新编码失败: {part['source']}\n{stderr_tail}")
+                        return False
                 
-                subprocess.run(cmd, check=True)
-                list_file.unlink()
+                if conforms:
+                    self.logger.info(f"🔗 无损合并 {len(input_files)} 个片段...")
+                duration = sum(info.get('duration') or 0 for info in infos) if infos else 0
+                list_file = cmd[cmd.index('-i') + 1]
+                returncode, stderr_tail = await self._run_ffmpeg_async(cmd, list_file, output_file,
+                                                                       duration, progress)
+            if returncode != 0:
+                raise RuntimeError(stderr_tail or f"ffmpeg 返回码 {returncode}")
+            os.replace(partial_path, output_file)
             
             output_size = os.path.getsize(output_file)
             self.logger.info(f"✅ 合并完成: {output_file} ({self._format_size(output_size)})")
             return True
-            
+        
+        except asyncio.CancelledError:
+            self.logger.warning(f"🛑 合并已取消: {output_file}")
+            self._remove_partial(partial_path)
+            raise
         except Exception as e:
             self.logger.error(f"❌ 合并失败: {e}")
+            self._remove_partial(partial_path)
+            return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _check_merge_inputs(self, input_files: List[str]) -> bool:
+        """合并前检查输入数量和文件是否存在"""
+        if len(input_files) < 2:
+            self.logger.error("❌ 至少需要 2 个视频文件")
             return False
+        
+        # 检查所有输入文件是否存在
+        for f in input_files:
+            if not os.path.exists(f):
+                self.logger.error(f"❌ 文件不存在: {f}")
+                return False
+        return True
+    
+    def _merge_commands(self, input_files: List[str], output_file: str, work_dir: str,
+                        reencode: bool, codec: str, quality: str,
+                        infos: Optional[List[Optional[VideoInfo]]]) -> Optional[Tuple[List[Dict], List[str]]]:
+        """规划合并：需要先重新编码的片段和最终的拼接命令
+        
+        Returns:
+            ([{'source', 'output', 'cmd', 'duration', 'mismatch'}, ...], 拼接命令)；
+            无法合并时返回 None（已记录错误）
+        """
+        crf, preset = self._resolve_quality(quality)
+        partial_path = self._partial_path(output_file)
+        list_file = os.path.join(work_dir, 'filelist.txt')
+        conforms = []
+        
+        if reencode:
+            # 重新编码合并
+            self.logger.info(f"🔄 合并并重新编码 {len(input_files)} 个视频...")
+            self._write_concat_list(list_file, input_files)
+            codec_lib = 'libx265' if codec == 'h265' else 'libx264'
+            
+            cmd = [
+                'ffmpeg',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', list_file,
+                '-c:v', codec_lib,
+                '-crf', str(crf),
+                '-preset', preset,
+                '-c:a', 'copy',
+                '-y', partial_path
+            ]
+            return conforms, cmd
+        
+        missing = [path for path, info in zip(input_files, infos) if not info]
+        if missing:
+            self.logger.error(f"❌ 无法读取视频信息: {', '.join(missing)}")
+            return None
+        
+        reference_sig, mismatched = self._merge_plan(infos)
+        reference = dict(zip(self.MERGE_SIGNATURE, reference_sig))
+        parts = list(input_files)
+        
+        if mismatched:
+            if (reference['codec'] not in self.MERGE_VIDEO_ENCODERS
+                    or (reference['audio_codec'] and reference['audio_codec'] not in self.MERGE_AUDIO_ENCODERS)):
+                self.logger.error(
+                    f"❌ 片段参数不一致，且无法编码为基准格式 "
+                    f"({reference['codec']}/{reference['audio_codec']})，请使用 --reencode"
+                )
+                return None
+            self.logger.info(
+                f"🧩 {len(input_files) - len(mismatched)}/{len(input_files)} 个片段参数一致"
+                f"（{reference['codec']} {reference['width']}x{reference['height']} "
+                f"{reference['pix_fmt']} {reference['frame_rate']} fps），"
+                f"重新编码其余 {len(mismatched)} 个"
+            )
+            ext = os.path.splitext(output_file)[1] or '.mp4'
+            for i in mismatched:
+                conformed = os.path.join(work_dir, f"part_{i:04d}{ext}")
+                conforms.append({
+                    'source': input_files[i],
+                    'output': conformed,
+                    'cmd': self._conform_command(input_files[i], conformed, infos[i], reference, crf, preset),
+                    'duration': infos[i].get('duration') or 0,
+                    'mismatch': self._describe_mismatch(infos[i], reference_sig)
+                })
+                parts[i] = conformed
+        else:
+            # 直接合并（无损）
+            self.logger.info(f"🔗 直接合并 {len(input_files)} 个视频（无损）...")
+        
+        self._write_concat_list(list_file, parts)
+        cmd = [
+            'ffmpeg',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_file,
+            '-map', '0:v:0',
+            '-map', '0:a:0?',
+            '-c', 'copy',
+            '-y', partial_path
+        ]
+        return conforms, cmd
     
-    def analyze_directory(self, directory: str, extensions: List[str] = None) -> Dict:
-        """分析目录中的视频"""
+    @traced('analyze_directory')
+    def analyze_directory(self, directory: str, extensions: List[str] = None,
+                          concurrency: Optional[int] = None,
+                          timeout: Optional[float] = None,
+                          exclude: List[str] = None) -> Dict:
+        """分析目录中的视频
+        
+        Args:
+            exclude: 排除的 glob 模式（默认使用配置中的 exclude）
+            concurrency: 并发探测数量（默认使用配置中的 probe_concurrency）
+            timeout: 单个文件的探测超时（默认使用配置中的 probe_timeout）
+        """
         
         dir_path = Path(directory)
         if not dir_path.exists():
@@ -555,31 +4784,21 @@ class VideoForge:
         
         if extensions is None:
             extensions = self.config['video_extensions']
-        else:
-            extensions = ['.' + ext.lstrip('.') for ext in extensions]
-        
-        # 收集视频文件
-        video_files = []
-        for ext in extensions:
-            video_files.extend(dir_path.rglob(f'*{ext}'))
-        
-        if not video_files:
-            self.logger.warning("⚠️  未找到视频文件")
-            return {}
+        if exclude is None:
+            exclude = self.config.get('exclude')
         
-        self.logger.info(f"📊 分析 {len(video_files)} 个视频文件...")
+        self.logger.info(f"📊 分析目录: {directory}")
         
         # 统计信息
         analysis = {
-            'total_files': len(video_files),
+            'total_files': 0,
             'total_size': 0,
             'codecs': {},
             'resolutions': {},
             'total_duration': 0
         }
         
-        for idx, video_file in enumerate(video_files, 1):
-            info = self.get_video_info(str(video_file))
+        def aggregate(info):
             if info:
                 analysis['total_size'] += info['size']
                 analysis['total_duration'] += info['duration']
@@ -591,11 +4810,50 @@ class VideoForge:
                 # 统计分辨率
                 resolution = f"{info['width']}x{info['height']}"
                 analysis['resolutions'][resolution] = analysis['resolutions'].get(resolution, 0) + 1
-            
-            if idx % 10 == 0:
-                print(f"  进度: {idx}/{len(video_files)}", end='\r')
         
-        print()  # 换行
+        cache = self.probe_cache
+        progress = {'done': 0, 'hits': 0, 'last_report': 0.0}
+        
+        def report():
+            progress['done'] += 1
+            now = time.monotonic()
+            if now - progress['last_report'] >= 0.5:
+                print(f"  进度: {progress['done']}/{analysis['total_files']}", end='\r')
+                progress['last_report'] = now
+        
+        def lookup(batch):
+            # 批量读取探测缓存，只把未命中的文件交给 ffprobe
+            cached = cache.get_many(batch) if cache else {}
+            for path in batch:
+                if path in cached:
+                    progress['hits'] += 1
+                    aggregate(cached[path])
+                    report()
+                else:
+                    yield path
+        
+        def iter_misses():
+            batch = []
+            for video_file in self.tracer.iter('scan', iter_video_files(dir_path, extensions, exclude)):
+                analysis['total_files'] += 1
+                batch.append(str(video_file))
+                if len(batch) >= 100:
+                    yield from lookup(batch)
+                    batch = []
+            yield from lookup(batch)
+        
+        # 边扫描边探测，结果完成一个汇总一个
+        for _, info in self.probe_many(iter_misses(), concurrency=concurrency, timeout=timeout):
+            aggregate(info)
+            report()
+        
+        print(f"  进度: {progress['done']}/{analysis['total_files']}")
+        
+        if analysis['total_files'] == 0:
+            self.logger.warning("⚠️  未找到视频文件")
+            return {}
+        if progress['hits']:
+            self.logger.info(f"💾 探测缓存命中 {progress['hits']}/{analysis['total_files']} 个文件")
         
         # 打印分析结果
         self.logger.info(f"\n{'='*60}")
@@ -641,7 +4899,28 @@ class VideoForge:
             self.logger.info(f"  - 智能跳过: {self.stats['skipped_smart']} (已是目标编码且码率更低)")
         if self.stats['skipped_larger'] > 0:
             self.logger.info(f"  - 预估会变大: {self.stats['skipped_larger']} (预估转码后文件不会更小)")
+        if self.stats['skipped_reused'] > 0:
+            self.logger.info(f"  - 复用已有输出: {self.stats['skipped_reused']} (相同内容已转码过)")
         self.logger.info(f"失败: {self.stats['failed']}")
+        if self.stats['admission_rejected'] > 0:
+            self.logger.info(f"  - 磁盘空间不足: {self.stats['admission_rejected']}")
+        if self.stats['admission_waits'] > 0 or self.stats['load_pauses'] > 0:
+            self.logger.info(f"资源控制: 等待资源 {self.stats['admission_waits']} 次，"
+                             f"负载过高暂停 {self.stats['load_pauses']} 次")
+        
+        actions = [f"{self.ACTION_NAMES[a]} {n}" for a, n in self.stats['actions'].items() if n > 0]
+        if actions:
+            self.logger.info(f"处理方式: {', '.join(actions)}")
+        
+        for name, stats in self.stats['renditions'].items():
+            line = f"  [{name}] 已处理 {stats['processed']}，跳过 {stats['skipped']}，失败 {stats['failed']}"
+            actions = [f"{self.ACTION_NAMES[a]} {n}" for a, n in stats['actions'].items() if n > 0]
+            if actions:
+                line += f"（{', '.join(actions)}）"
+            if stats['processed'] > 0:
+                line += (f"，{self._format_size(stats['total_size_before'])} → "
+                         f"{self._format_size(stats['total_size_after'])}")
+            self.logger.info(line)
         
         if self.stats['processed'] > 0:
             saved = self.stats['total_size_before'] - self.stats['total_size_after']
@@ -661,6 +4940,15 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
+    parser.add_argument('--config', help='配置文件路径（默认使用程序目录下的 config.json）')
+    parser.add_argument('--no-probe-cache', action='store_true', help='不使用 ffprobe 结果缓存')
+    parser.add_argument('--probe-backend', choices=['auto', 'pyav', 'ffprobe'],
+                        help='视频探测方式：auto 安装了 PyAV 时在进程内探测（默认），否则调用 ffprobe')
+    parser.add_argument('--trace', metavar='FILE', help='记录扫描、探测、决策、编码等各阶段耗时，输出 Chrome trace JSON')
+    parser.add_argument('--metrics-file', help='定期写入 Prometheus 文本格式指标（供 node_exporter textfile collector 采集）')
+    parser.add_argument('--metrics-json', help='定期写入指标 JSON 快照')
+    parser.add_argument('--status-file', help='实时写入转码进度的 JSON 状态文件')
+    
     subparsers = parser.add_subparsers(dest='command', help='命令')
     
     # transcode 命令
@@ -673,10 +4961,30 @@ def main():
     transcode_parser.add_argument('--crf', type=int, help='CRF 值 (18-28)')
     transcode_parser.add_argument('--resolution', choices=['4K', '2K', '1080p', '720p', 'original'], help='目标分辨率')
     transcode_parser.add_argument('--extensions', help='文件扩展名（逗号分隔）')
+    transcode_parser.add_argument('--exclude', action='append', help='排除匹配的文件或目录（glob，可重复指定）')
     transcode_parser.add_argument('--skip-existing', action='store_true', help='跳过已存在的文件')
+    transcode_parser.add_argument('--resume', action='store_true', help='断点续传：跳过任务日志中已完成的文件')
     transcode_parser.add_argument('--smart-skip', action='store_true', default=True, help='智能跳过（默认启用）：跳过已经是目标编码且码率更低的视频')
     transcode_parser.add_argument('--no-smart-skip', action='store_false', dest='smart_skip', help='禁用智能跳过')
+    transcode_parser.add_argument('--skip-action', choices=['remux', 'skip'], help='源视频已满足目标时的处理：remux 换封装输出（默认），skip 不输出')
     transcode_parser.add_argument('--dry-run', action='store_true', help='预览模式')
+    transcode_parser.add_argument('--verify', action='store_true', help='转码后探测输出文件，校验时长与源文件一致')
+    transcode_parser.add_argument('--threads', type=int, dest='max_workers', help='并发转码任务数（默认使用配置中的 max_threads）')
+    transcode_parser.add_argument('--job-threads', type=int, help='每个转码任务使用的线程数（默认按 CPU 核数均分）')
+    transcode_parser.add_argument('--segments', type=int, default=0, help='将长视频切分为 N 段并行编码后无损拼接')
+    transcode_parser.add_argument('--schedule', choices=['scan', 'lpt'], help='任务顺序：scan 边扫描边转码（默认），lpt 先探测全部文件，按工作量从大到小分发并估算整批剩余时间')
+    transcode_parser.add_argument('--nice', type=int, help='ffmpeg 进程的 nice 值（如 10）')
+    transcode_parser.add_argument('--ionice', help='ffmpeg 进程的 I/O 优先级: idle 或 best-effort[:0-7]')
+    transcode_parser.add_argument('--max-load', type=float, help='每核平均负载超过该值时暂停部分转码进程、推迟新任务')
+    transcode_parser.add_argument('--scratch', metavar='DIR', help='本地暂存目录：预取下一个输入，输出先写本地再异步移动（适合 NFS/SMB）')
+    transcode_parser.add_argument('--scratch-size', type=float, help='暂存区大小上限（GB，默认: 50）')
+    transcode_parser.add_argument('--deadline', metavar='HH:MM', help='截止时间：按实测编码速度为后续任务自动选择更快（或更慢）的编码速度预设，尽量在该时间前完成整批（目录转码）')
+    transcode_parser.add_argument('--content-index', action='store_true', help='按内容指纹复用已生成的输出：复制、改名或移动过的相同视频只转码一次')
+    transcode_parser.add_argument('--sample-probe', action='store_true', help='完整编码长视频前先编码几个短样本，预测节省不足时跳过编码')
+    transcode_parser.add_argument('--rendition', action='append', metavar='SPEC',
+                                  help='额外输出（可重复指定），如 codec=h264,crf=23,resolution=1080p,output=/videos/h264；'
+                                       '与主输出共用一次解码，未指定的项使用主输出的参数。'
+                                       'output 为目录（单文件转码时也可以是文件路径），输出 <目录>/<源文件名>.mp4')
     
     # merge 命令
     merge_parser = subparsers.add_parser('merge', help='合并视频')
@@ -690,6 +4998,29 @@ def main():
     analyze_parser = subparsers.add_parser('analyze', help='分析视频')
     analyze_parser.add_argument('input', help='输入目录')
     analyze_parser.add_argument('--extensions', help='文件扩展名（逗号分隔）')
+    analyze_parser.add_argument('--exclude', action='append', help='排除匹配的文件或目录（glob，可重复指定）')
+    analyze_parser.add_argument('--probe-jobs', type=int, help='并发 ffprobe 数量（默认: 8）')
+    analyze_parser.add_argument('--probe-timeout', type=float, help='单个文件探测超时秒数（默认: 60）')
+    
+    # watch 命令
+    watch_parser = subparsers.add_parser('watch', help='监听目录，持续转码新视频')
+    watch_parser.add_argument('input', help='监听的输入目录')
+    watch_parser.add_argument('-o', '--output', required=True, help='输出目录')
+    watch_parser.add_argument('--codec', choices=['h264', 'h265'], default='h265', help='编码格式')
+    watch_parser.add_argument('--quality', choices=['high', 'medium', 'low'], default='medium', help='质量预设')
+    watch_parser.add_argument('--preset', help='编码速度预设')
+    watch_parser.add_argument('--crf', type=int, help='CRF 值 (18-28)')
+    watch_parser.add_argument('--resolution', choices=['4K', '2K', '1080p', '720p', 'original'], help='目标分辨率')
+    watch_parser.add_argument('--extensions', help='文件扩展名（逗号分隔）')
+    watch_parser.add_argument('--exclude', action='append', help='排除匹配的文件或目录（glob，可重复指定）')
+    watch_parser.add_argument('--no-smart-skip', action='store_false', dest='smart_skip', help='禁用智能跳过')
+    watch_parser.add_argument('--threads', type=int, dest='max_workers', help='并发转码任务数')
+    watch_parser.add_argument('--job-threads', type=int, help='每个转码任务使用的线程数')
+    watch_parser.add_argument('--settle', type=float, help='文件停止变化多少秒后开始处理（默认: 30）')
+    watch_parser.add_argument('--poll-interval', type=float, help='轮询间隔秒数（默认: 10）')
+    watch_parser.add_argument('--polling', action='store_true', help='强制使用轮询（网络文件系统上 inotify 收不到其他主机的写入）')
+    watch_parser.add_argument('--content-index', action='store_true', help='按内容指纹复用已生成的输出')
+    watch_parser.add_argument('--initial-scan', action='store_true', help='启动时先处理目录中已有且未完成的文件')
     
     # 解析参数
     args = parser.parse_args()
@@ -698,8 +5029,54 @@ def main():
         parser.print_help()
         return
     
+    renditions = None
+    if getattr(args, 'rendition', None):
+        # 主输出（--codec/--quality/-o 等参数）作为第一个输出
+        try:
+            renditions = [{}] + [parse_rendition(spec) for spec in args.rendition]
+        except ValueError as e:
+            parser.error(str(e))
+    deadline = None
+    if getattr(args, 'deadline', None):
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            parser.error(str(e))
+    
     # 创建 VideoForge 实例
-    forge = VideoForge()
+    config_file = args.config
+    if config_file is None:
+        default_config = Path(__file__).resolve().parent / 'config.json'
+        if default_config.exists():
+            config_file = str(default_config)
+    forge = VideoForge(config_file)
+    if args.no_probe_cache:
+        forge.config['probe_cache'] = False
+    if args.probe_backend:
+        forge.config['probe_backend'] = args.probe_backend
+    if args.status_file:
+        forge.config['status_file'] = args.status_file
+    if args.metrics_file:
+        forge.config['metrics_file'] = args.metrics_file
+    if args.metrics_json:
+        forge.config['metrics_json'] = args.metrics_json
+    if args.trace:
+        forge.enable_tracing()
+        # 中途退出（Ctrl+C、sys.exit）时也写出已记录的部分
+        atexit.register(forge.save_trace, args.trace)
+    if getattr(args, 'skip_action', None):
+        forge.config['skip_action'] = args.skip_action
+    if getattr(args, 'verify', False):
+        forge.config['verify_output'] = True
+    if getattr(args, 'sample_probe', False):
+        forge.config['sample_probe'] = True
+    if getattr(args, 'content_index', False):
+        forge.config['content_index'] = True
+    for option in ('nice', 'ionice', 'max_load'):
+        if getattr(args, option, None) is not None:
+            forge.config[option] = getattr(args, option)
+    if getattr(args, 'scratch_size', None):
+        forge.config['scratch_max_size'] = args.scratch_size
     
     # 检查 ffmpeg
     if not forge.check_ffmpeg():
@@ -724,7 +5101,10 @@ def main():
                 preset=args.preset,
                 crf=args.crf,
                 resolution=args.resolution,
-                smart_skip=args.smart_skip
+                smart_skip=args.smart_skip,
+                threads=args.job_threads or 0,
+                segments=args.segments,
+                renditions=renditions
             )
         else:
             # 目录转码
@@ -739,7 +5119,16 @@ def main():
                 extensions=extensions,
                 skip_existing=args.skip_existing,
                 dry_run=args.dry_run,
-                smart_skip=args.smart_skip
+                smart_skip=args.smart_skip,
+                max_workers=args.max_workers,
+                exclude=args.exclude,
+                resume=args.resume,
+                schedule=args.schedule,
+                scratch_dir=args.scratch,
+                renditions=renditions,
+                deadline=deadline,
+                threads=args.job_threads or 0,
+                segments=args.segments
             )
     
     elif args.command == 'merge':
@@ -751,12 +5140,43 @@ def main():
             quality=args.quality
         )
     
+    elif args.command == 'watch':
+        extensions = None
+        if args.extensions:
+            extensions = [ext.strip() for ext in args.extensions.split(',')]
+        if args.poll_interval:
+            forge.config['watch_poll_interval'] = args.poll_interval
+        
+        forge.watch_directory(
+            args.input,
+            args.output,
+            codec=args.codec,
+            quality=args.quality,
+            preset=args.preset,
+            crf=args.crf,
+            resolution=args.resolution,
+            extensions=extensions,
+            exclude=args.exclude,
+            max_workers=args.max_workers,
+            settle=args.settle,
+            polling=args.polling,
+            initial_scan=args.initial_scan,
+            smart_skip=args.smart_skip,
+            threads=args.job_threads or 0
+        )
+    
     elif args.command == 'analyze':
         extensions = None
         if args.extensions:
             extensions = [ext.strip() for ext in args.extensions.split(',')]
         
-        forge.analyze_directory(args.input, extensions=extensions)
+        forge.analyze_directory(
+            args.input,
+            extensions=extensions,
+            concurrency=args.probe_jobs,
+            timeout=args.probe_timeout,
+            exclude=args.exclude
+        )
 
 
 if __name__ == '__main__':